@@ -4,12 +4,13 @@ REST API 路由
 from typing import Optional, Any
 from flask import request, current_app
 from utils.helpers import api_response, require_json, require_auth
-from services.auth_service import create_token, decode_token, check_password, hash_password
-from controllers import user_controller, friend_controller, message_controller
+from services.auth_service import create_token, check_password, hash_password, needs_rehash, PasswordHasherBusy
+from controllers import user_controller, friend_controller, message_controller, conversation_controller
 from controllers.group import (
     create_group,
     get_user_groups,
     get_group_members,
+    get_group_member_ids,
     get_member_role,
     invite_member,
     kick_member,
@@ -17,8 +18,16 @@ from controllers.group import (
 )
 from models.user import User
 from models.group import Group
-from services import file_service
+from services import file_service, auth_cache, tracing
+from services.sql_profiler import query_budget
 from services.notification_service import get_unread_summary
+from api.websocket import (
+    push_private_message,
+    push_group_message,
+    join_group_room,
+    leave_group_room,
+    close_group_room,
+)
 
 
 def current_user() -> Optional[Any]:
@@ -27,10 +36,10 @@ def current_user() -> Optional[Any]:
     if not auth or not auth.startswith("Bearer "):
         return None
     token = auth[7:]
-    payload = decode_token(token)
+    payload = auth_cache.get_claims(token)
     if not payload:
         return None
-    return user_controller.get_user_by_id(payload.get("user_id"))
+    return auth_cache.get_user(payload.get("user_id"))
 
 
 def register_routes(app):
@@ -44,7 +53,10 @@ def register_routes(app):
         password = data.get("password") or None
         if not password:
             return api_response(message="需要密码", code=400)
-        user, err = user_controller.create_user(nickname, link_id=link_id, password=password)
+        try:
+            user, err = user_controller.create_user(nickname, link_id=link_id, password=password)
+        except PasswordHasherBusy:
+            return api_response(message="服务繁忙，请稍后重试", code=503)
         if err:
             return api_response(message=err, code=400)
         assert user is not None, "User creation returned None"
@@ -65,8 +77,13 @@ def register_routes(app):
             return api_response(message="用户不存在", code=404)
         if not user.password_hash:
             return api_response(message="该账号未设置密码", code=401)
-        if not check_password(password, user.password_hash):
-            return api_response(message="通讯码或密码错误", code=401)
+        try:
+            if not check_password(password, user.password_hash):
+                return api_response(message="通讯码或密码错误", code=401)
+            if needs_rehash(user.password_hash):
+                user_controller.set_password(user, password)
+        except PasswordHasherBusy:
+            return api_response(message="服务繁忙，请稍后重试", code=503)
         assert user is not None, "User is not None at this point"
         token = create_token(user.id, user.link_id)
         return api_response(data={"user": user.to_dict(), "token": token})
@@ -104,6 +121,7 @@ def register_routes(app):
 
     # ---------- 好友 ----------
     @app.route("/api/friends", methods=["GET"])
+    @query_budget(4)
     @require_auth
     def friends(user):
         return api_response(data=friend_controller.get_friends(user.id))
@@ -181,25 +199,12 @@ def register_routes(app):
         return api_response(data=True)
 
     # ---------- 消息 ----------
-    def _emit_message(msg, receiver_ids):
-        """
-        推送消息给指定接收方
-        receiver_ids: 单个ID (int) 或 ID 列表 (list)
-        """
-        socketio = getattr(current_app, "socketio", None)
-        if not socketio:
-            return
-        
-        msg_dict = msg.to_dict()
-        
-        if isinstance(receiver_ids, int):
-            # 私聊：推送给接收方和发送方（多设备同步）
-            socketio.emit("new_message", msg_dict, to=f"user_{receiver_ids}", namespace='/')
-            socketio.emit("new_message", msg_dict, to=f"user_{msg.sender_id}", namespace='/')
-        elif isinstance(receiver_ids, list):
-            # 群聊：推送给所有成员
-            for receiver_id in receiver_ids:
-                socketio.emit("new_message", msg_dict, to=f"user_{receiver_id}", namespace='/')
+    def _history_page(messages, limit, before_id=None, after_id=None):
+        """历史消息分页响应：{ messages: [...], next_cursor: int|None }"""
+        return {
+            "messages": message_controller.serialize_messages(messages),
+            "next_cursor": message_controller.next_cursor(messages, limit, after_id=after_id, before_id=before_id),
+        }
 
     @app.route("/api/messages/private", methods=["POST"])
     @require_json()
@@ -224,19 +229,27 @@ def register_routes(app):
         if err:
             return api_response(message=err, code=400)
         assert msg is not None, "Message is not None"
-        # 推送消息
-        _emit_message(msg, receiver.id)
+        # 推送消息：接收方与发送方（多设备同步）；被采样的请求在载荷中带 trace_id
+        with tracing.span("serialize"):
+            msg_dict = tracing.inject(msg.to_dict())
+        push_private_message(receiver.id, msg_dict, sender_id=user.id)
         print(f"[WebSocket] 推送私聊消息 #{msg.id} 从 user_{user.id} 到 user_{receiver.id}")
-        return api_response(data=msg.to_dict())
+        return api_response(data=msg_dict)
 
     @app.route("/api/messages/private/<int:other_id>", methods=["GET"])
+    @query_budget(8)
     @require_auth
     def get_private(user, other_id):
         unread_only = request.args.get("unread_only", "").lower() == "true"
         limit = min(int(request.args.get("limit", 100)), 200)
         offset = max(0, int(request.args.get("offset", 0)))
-        messages = message_controller.get_private_messages(user.id, other_id, unread_only=unread_only, limit=limit, offset=offset)
-        return api_response(data=[m.to_dict() for m in messages])
+        before_id = request.args.get("before_id", type=int)
+        after_id = request.args.get("after_id", type=int)
+        messages = message_controller.get_private_messages(
+            user.id, other_id, unread_only=unread_only, limit=limit, offset=offset,
+            before_id=before_id, after_id=after_id,
+        )
+        return api_response(data=_history_page(messages, limit, before_id, after_id))
 
     @app.route("/api/messages/group", methods=["POST"])
     @require_json("group_id")
@@ -258,36 +271,53 @@ def register_routes(app):
         if err:
             return api_response(message=err, code=400)
         assert msg is not None, "Message is not None"
-        # 获取群成员并推送消息
-        from controllers.group import get_group_members
-        members = get_group_members(group_id, user.id) or []
-        receiver_ids = [m['user_id'] for m in members]
-        _emit_message(msg, receiver_ids)
-        print(f"[WebSocket] 推送群消息 #{msg.id} 到群 {group_id}，成员数: {len(receiver_ids)}")
-        return api_response(data=msg.to_dict())
+        # 推送到群房间（一次广播）；被采样的请求在载荷中带 trace_id
+        with tracing.span("serialize"):
+            msg_dict = tracing.inject(msg.to_dict())
+        push_group_message(group_id, msg_dict)
+        print(f"[WebSocket] 推送群消息 #{msg.id} 到房间 group_{group_id}")
+        return api_response(data=msg_dict)
 
     @app.route("/api/messages/group/<int:group_id>", methods=["GET"])
+    @query_budget(8)
     @require_auth
     def get_group_messages_route(user, group_id):
         unread_only = request.args.get("unread_only", "").lower() == "true"
         limit = min(int(request.args.get("limit", 100)), 200)
         offset = max(0, int(request.args.get("offset", 0)))
-        messages = message_controller.get_group_messages(user.id, group_id, unread_only=unread_only, limit=limit, offset=offset)
-        return api_response(data=[m.to_dict() for m in messages])
+        before_id = request.args.get("before_id", type=int)
+        after_id = request.args.get("after_id", type=int)
+        messages = message_controller.get_group_messages(
+            user.id, group_id, unread_only=unread_only, limit=limit, offset=offset,
+            before_id=before_id, after_id=after_id,
+        )
+        return api_response(data=_history_page(messages, limit, before_id, after_id))
 
     @app.route("/api/messages/search", methods=["GET"])
+    @query_budget(8)
     @require_auth
     def message_search(user):
         q = request.args.get("q", "").strip()
         limit = min(int(request.args.get("limit", 50)), 100)
-        messages = message_controller.search_messages(user.id, q, limit=limit)
-        return api_response(data=[m.to_dict() for m in messages])
+        messages, snippets = message_controller.search_messages(user.id, q, limit=limit)
+        return api_response(data=message_controller.serialize_messages(messages, snippets=snippets))
 
     @app.route("/api/messages/unread-summary", methods=["GET"])
+    @query_budget(4)
     @require_auth
     def unread_summary(user):
         return api_response(data=get_unread_summary(user.id))
 
+    @app.route("/api/conversations", methods=["GET"])
+    @query_budget(4)
+    @require_auth
+    def conversations(user):
+        limit = max(1, min(int(request.args.get("limit", 50)), 200))
+        page, err = conversation_controller.get_conversations(user.id, limit=limit, before=request.args.get("before"))
+        if err:
+            return api_response(message=err, code=400)
+        return api_response(data=page)
+
     @app.route("/api/messages/read", methods=["POST"])
     @require_json("chat_type", "chat_id")
     @require_auth
@@ -302,6 +332,7 @@ def register_routes(app):
 
     # ---------- 群组 ----------
     @app.route("/api/groups", methods=["GET"])
+    @query_budget(4)
     @require_auth
     def groups(user):
         return api_response(data=get_user_groups(user.id))
@@ -321,8 +352,9 @@ def register_routes(app):
             return api_response(message=err, code=400)
         socketio = getattr(current_app, "socketio", None)
         if socketio:
-            notify_ids = {user.id, *member_ids}
+            notify_ids = get_group_member_ids(group.id)
             for uid in notify_ids:
+                join_group_room(uid, group.id)
                 message = "群聊已创建" if uid == user.id else f"你被邀请加入群聊 {group.group_name}"
                 socketio.emit("group_added", {
                     "group": group.to_dict(),
@@ -345,6 +377,7 @@ def register_routes(app):
             return api_response(message=err, code=400)
         socketio = getattr(current_app, "socketio", None)
         if socketio:
+            join_group_room(user_id, group_id)
             group = Group.query.get(group_id)
             if group:
                 socketio.emit("group_added", {
@@ -368,6 +401,7 @@ def register_routes(app):
             return api_response(message=err, code=400)
         socketio = getattr(current_app, "socketio", None)
         if socketio:
+            leave_group_room(user_id, group_id)
             socketio.emit("group_removed", {
                 "group_id": group_id,
                 "message": "你已被移出群聊"
@@ -375,6 +409,7 @@ def register_routes(app):
         return api_response(data=True)
 
     @app.route("/api/groups/<int:group_id>/members", methods=["GET"])
+    @query_budget(4)
     @require_auth
     def group_members(user, group_id):
         members = get_group_members(group_id, user.id)
@@ -385,17 +420,17 @@ def register_routes(app):
     @app.route("/api/groups/<int:group_id>/dissolve", methods=["POST"])
     @require_auth
     def group_dissolve(user, group_id):
-        members = get_group_members(group_id, user.id) or []
         ok, err = dissolve_group(user.id, group_id)
         if err:
             return api_response(message=err, code=400)
         socketio = getattr(current_app, "socketio", None)
         if socketio:
-            for member in members:
-                socketio.emit("group_removed", {
-                    "group_id": group_id,
-                    "message": "群聊已解散"
-                }, to=f"user_{member['user_id']}", namespace='/')
+            # 先向群房间广播解散通知，再关闭房间
+            socketio.emit("group_removed", {
+                "group_id": group_id,
+                "message": "群聊已解散"
+            }, to=f"group_{group_id}", namespace='/')
+            close_group_room(group_id)
         return api_response(data=True)
 
     # ---------- 文件上传 ----------
@@ -408,3 +443,59 @@ def register_routes(app):
         if not path:
             return api_response(message="文件类型不允许或无效", code=400)
         return api_response(data={"file_path": path, "file_name": request.files["file"].filename})
+
+    # ---------- 分片上传（可续传）----------
+    def _upload_error(e):
+        data = {"offset": e.offset} if e.offset is not None else None
+        return api_response(data=data, message=e.message, code=e.code)
+
+    @app.route("/api/uploads", methods=["POST"])
+    @require_json("file_name", "size")
+    @require_auth
+    def upload_init(user):
+        data = request.get_json()
+        try:
+            return api_response(data=file_service.init_upload(user.id, data.get("file_name"), data.get("size")))
+        except file_service.UploadError as e:
+            return _upload_error(e)
+
+    @app.route("/api/uploads/<upload_id>", methods=["GET"])
+    @require_auth
+    def upload_status(user, upload_id):
+        try:
+            return api_response(data=file_service.get_upload(user.id, upload_id))
+        except file_service.UploadError as e:
+            return _upload_error(e)
+
+    @app.route("/api/uploads/<upload_id>", methods=["PUT"])
+    @require_auth
+    def upload_chunk(user, upload_id):
+        try:
+            offset = int(request.args.get("offset", ""))
+        except ValueError:
+            return api_response(message="需要 offset 参数", code=400)
+        try:
+            state = file_service.write_chunk(
+                user.id, upload_id, offset, request.stream, content_length=request.content_length
+            )
+        except file_service.UploadError as e:
+            return _upload_error(e)
+        return api_response(data=state)
+
+    @app.route("/api/uploads/<upload_id>/complete", methods=["POST"])
+    @require_auth
+    def upload_complete(user, upload_id):
+        try:
+            path, file_name = file_service.complete_upload(user.id, upload_id)
+        except file_service.UploadError as e:
+            return _upload_error(e)
+        return api_response(data={"file_path": path, "file_name": file_name})
+
+    @app.route("/api/uploads/<upload_id>", methods=["DELETE"])
+    @require_auth
+    def upload_abort(user, upload_id):
+        try:
+            file_service.abort_upload(user.id, upload_id)
+        except file_service.UploadError as e:
+            return _upload_error(e)
+        return api_response(data=True)
@@ -2,11 +2,21 @@
 WebSocket 实时消息推送（Flask-SocketIO）
 """
 from flask_socketio import emit, join_room, leave_room
-from services.auth_service import decode_token
+from services import auth_cache, tracing
 from controllers import user_controller
+from controllers.group import get_user_group_ids
+from services.message_bus import RoomSyncMixin, apply_room_sync
+
+_socketio = None
+
+# 由服务端按认证与群成员关系维护的房间，客户端不可自行加入/退出
+MANAGED_ROOM_PREFIXES = ("user_", "group_")
 
 
 def init_websocket(socketio):
+    global _socketio
+    _socketio = socketio
+
     @socketio.on("connect")
     def on_connect():
         print(f"[WebSocket] 客户端连接: {socketio.server.environ.get('REMOTE_ADDR', 'unknown')}")
@@ -18,7 +28,7 @@ def init_websocket(socketio):
             print("[WebSocket] 认证失败: 缺少token")
             emit("auth_fail", {"message": "需要 token"})
             return
-        payload = decode_token(token)
+        payload = auth_cache.get_claims(token)
         if not payload:
             print("[WebSocket] 认证失败: token无效")
             emit("auth_fail", {"message": "token 无效"})
@@ -26,20 +36,24 @@ def init_websocket(socketio):
         user_id = payload.get("user_id")
         # 加入个人房间，用于接收私聊与通知
         join_room(f"user_{user_id}")
-        print(f"[WebSocket] 用户 {user_id} 已认证并加入房间 user_{user_id}")
+        # 加入所在群的房间，群消息按房间一次广播
+        group_ids = get_user_group_ids(user_id)
+        for gid in group_ids:
+            join_room(f"group_{gid}")
+        print(f"[WebSocket] 用户 {user_id} 已认证并加入房间 user_{user_id} 及 {len(group_ids)} 个群房间")
         emit("authenticated", {"user_id": user_id})
 
     @socketio.on("join_chat")
     def on_join_chat(data):
         """加入会话（用于前端标记当前在哪个聊天窗口）"""
         room = (data or {}).get("room")
-        if room:
+        if room and not _is_managed_room(room):
             join_room(room)  # type: ignore
 
     @socketio.on("leave_chat")
     def on_leave_chat(data):
         room = (data or {}).get("room")
-        if room:
+        if room and not _is_managed_room(room):
             leave_room(room)  # type: ignore
 
     @socketio.on("disconnect")
@@ -47,14 +61,55 @@ def init_websocket(socketio):
         print("[WebSocket] 客户端断开连接")
 
 
-def push_private_message(receiver_id, message_dict):
-    """向指定用户推送私聊消息"""
-    from flask_socketio import emit
-    # 需在 socketio 上下文里调用
-    emit("new_message", message_dict, room=f"user_{receiver_id}")  # type: ignore
+def _is_managed_room(room):
+    return isinstance(room, str) and room.startswith(MANAGED_ROOM_PREFIXES)
+
+
+def push_private_message(receiver_id, message_dict, sender_id=None):
+    """向指定用户推送私聊消息；给出 sender_id 时同时推送给发送方（多设备同步）"""
+    if _socketio is None:
+        return
+    rooms = [f"user_{receiver_id}"]
+    if sender_id is not None and sender_id != receiver_id:
+        rooms.append(f"user_{sender_id}")
+    with tracing.span("emit", rooms=len(rooms)):
+        _socketio.emit("new_message", message_dict, to=rooms, namespace="/")
 
 
 def push_group_message(group_id, message_dict):
-    """向群组房间推送消息（前端需先 join_chat room=group_<id>）"""
-    from flask_socketio import emit
-    emit("new_message", message_dict, room=f"group_{group_id}")  # type: ignore
+    """向群组房间推送消息（一次广播，消息只序列化一次）"""
+    if _socketio is None:
+        return
+    with tracing.span("emit", rooms=1):
+        _socketio.emit("new_message", message_dict, to=f"group_{group_id}", namespace="/")
+
+
+# ---------- 群房间同步（邀请、踢人、解散时由路由调用） ----------
+
+def _sync_rooms(op, user_id, group_id):
+    """把用户所有在线连接加入/移出群房间；多进程部署时经消息总线让持有连接的进程执行"""
+    if _socketio is None:
+        return
+    manager = _socketio.server.manager
+    source, target = f"user_{user_id}", f"group_{group_id}"
+    if isinstance(manager, RoomSyncMixin):
+        manager.sync_rooms(op, source, target)
+    else:
+        apply_room_sync(manager, op, source, target)
+
+
+def join_group_room(user_id, group_id):
+    """将用户当前在线的所有连接加入群房间"""
+    _sync_rooms("join", user_id, group_id)
+
+
+def leave_group_room(user_id, group_id):
+    """将用户当前在线的所有连接移出群房间"""
+    _sync_rooms("leave", user_id, group_id)
+
+
+def close_group_room(group_id):
+    """解散群时关闭群房间（多进程部署时由消息总线广播到所有进程）"""
+    if _socketio is None:
+        return
+    _socketio.server.manager.close_room(f"group_{group_id}", "/")
@@ -2,17 +2,29 @@
 LinkIn 应用入口：创建 Flask 应用、注册路由与 WebSocket
 """
 import os
+
+# Redis 等外部消息队列依赖标准库 socket，在 eventlet 下需在其他模块导入前打补丁
+if (os.environ.get("SOCKETIO_MESSAGE_QUEUE") or "").startswith(("redis", "valkey")):
+    import eventlet
+    eventlet.monkey_patch()
+
 from pathlib import Path
 from typing import Optional
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from flask_socketio import SocketIO
 
-from config.settings import BASE_DIR, UPLOAD_DIR, AVATAR_DIR
-from config.database import init_db
+from config.settings import (
+    BASE_DIR, UPLOAD_DIR, AVATAR_DIR, BLOB_DIR, MAX_FILE_SIZE, MAX_FILE_SIZE_MB, SOCKETIO_MESSAGE_QUEUE, SOCKETIO_CHANNEL,
+    METRICS_ENABLED, METRICS_TOKEN, TRACING_SAMPLE_RATE, TRACING_EXPORTER,
+)
+from config.database import db, init_db
 from api.routes import register_routes
 from api.websocket import init_websocket
+from commands import register_commands
+from services import metrics, sql_profiler, tracing
+from services.message_bus import create_client_manager
 
 socketio: Optional[SocketIO] = None
 
@@ -24,26 +36,68 @@ def create_app():
         template_folder=str(BASE_DIR / "frontend" / "templates"),
     )
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "linkin-dev-secret")
+    # 请求体上限：读取时超出即中止（留出 multipart 表单的额外开销），不把超大上传写入临时文件
+    app.config["MAX_CONTENT_LENGTH"] = MAX_FILE_SIZE + 1024 * 1024
 
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
     init_db(app)
+    if METRICS_ENABLED:
+        metrics.init_app(app, db)
+    sql_profiler.init_app(app, db)
+    tracing.init_app(app)
 
     register_routes(app)
+    register_commands(app)
 
     global socketio
-    socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
+    options = {}
+    client_manager = create_client_manager(SOCKETIO_MESSAGE_QUEUE, channel=SOCKETIO_CHANNEL)
+    if client_manager is not None:
+        # 多进程部署：任一进程的 emit 经消息总线送达其他进程持有的连接
+        options["client_manager"] = client_manager
+    if METRICS_ENABLED:
+        # 编码事件包时按事件名统计次数与字节数
+        options["serializer"] = metrics.MeteredPacket
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet", **options)
     init_websocket(socketio)
     app.socketio = socketio  # type: ignore
 
-    # 静态文件：上传与头像
+    @app.errorhandler(413)
+    def request_too_large(_e):
+        from utils.helpers import api_response
+        return api_response(message=f"文件超过 {MAX_FILE_SIZE_MB}MB 限制", code=413), 413
+
+    # 静态文件：上传与头像（内容寻址路径与迁移前的旧路径），支持 ETag/304 与 Range
     @app.route("/storage/<path:subpath>")
     def storage(subpath):
-        parts = subpath.split("/", 1)
-        if len(parts) == 2 and parts[0] in ("uploads", "avatars"):
-            folder = UPLOAD_DIR if parts[0] == "uploads" else AVATAR_DIR
-            return send_from_directory(folder, parts[1])
-        return "", 404
+        from services.static_delivery import send_stored_file
+        return send_stored_file(subpath)
+
+    # 运维端点（/metrics、/debug/traces）只在配置了 METRICS_TOKEN 时注册（否则 404），请求须携带 Authorization: Bearer <token>
+    def operator_authorized():
+        import hmac
+        from flask import request
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}")
+
+    if (METRICS_ENABLED or TRACING_SAMPLE_RATE > 0) and not METRICS_TOKEN:
+        print("[Metrics] 未设置 METRICS_TOKEN，/metrics 与 /debug/traces 不对外提供")
+
+    if METRICS_ENABLED and METRICS_TOKEN:
+        @app.route("/metrics")
+        def metrics_endpoint():
+            from flask import Response
+            if not operator_authorized():
+                return Response("unauthorized\n", status=401, mimetype="text/plain")
+            return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    if TRACING_SAMPLE_RATE > 0 and TRACING_EXPORTER == "memory" and METRICS_TOKEN:
+        @app.route("/debug/traces")
+        def traces_endpoint():
+            from flask import Response, jsonify, request
+            if not operator_authorized():
+                return Response("unauthorized\n", status=401, mimetype="text/plain")
+            return jsonify(tracing.recent(request.args.get("limit", 50, type=int)))
 
     @app.route("/")
     def index():
@@ -61,5 +115,8 @@ if __name__ == "__main__":
     (BASE_DIR / "database").mkdir(exist_ok=True)
     UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
     AVATAR_DIR.mkdir(parents=True, exist_ok=True)
+    BLOB_DIR.mkdir(parents=True, exist_ok=True)
     if socketio is not None:
-        socketio.run(app, host="0.0.0.0", port=5000, debug=True)
+        port = int(os.environ.get("PORT", 5000))
+        # 多进程部署时关闭调试重载器，避免每个 worker 再派生子进程
+        socketio.run(app, host="0.0.0.0", port=port, debug=SOCKETIO_MESSAGE_QUEUE is None)
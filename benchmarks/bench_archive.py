@@ -0,0 +1,161 @@
+"""
+冷数据归档基准：归档前后 messages 表（含索引与全文索引）的大小、发送消息的写入延迟与历史翻页延迟
+
+    python benchmarks/bench_archive.py --messages 500000 --days 730 --archive-after 30
+
+在临时 SQLite 文件库（production 配置）上预置跨 --days 天的历史消息（私聊 + 群聊），
+先测一轮，再执行 archive_messages 并 VACUUM 后测第二轮：
+  hot size   messages 表、其索引与 messages_fts 占用的页（dbstat）
+  insert     send_private_message / send_group_message 交替发送的单条延迟
+  history    最新一页（热数据）与越过热数据的一页（归档读穿）的延迟
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--messages", type=int, default=500_000, help="预置的历史消息数")
+    p.add_argument("--days", type=int, default=730, help="历史消息跨越的天数")
+    p.add_argument("--archive-after", type=float, default=30, help="归档多少天之前的消息")
+    p.add_argument("--users", type=int, default=2000)
+    p.add_argument("--groups", type=int, default=200)
+    p.add_argument("--inserts", type=int, default=2000, help="每轮计时发送的消息数")
+    return p.parse_args()
+
+
+def seed(db, args):
+    conn = db.session.connection()
+    conn.exec_driver_sql(
+        "INSERT INTO users (id, link_id, nickname) VALUES (?, ?, ?)",
+        [(i, str(10_000_000 + i), f"u{i}") for i in range(1, args.users + 1)],
+    )
+    pairs = [(i, i % args.users + 1) for i in range(1, args.users + 1)]
+    conn.exec_driver_sql("INSERT INTO friendships (user_id, friend_id) VALUES (?, ?)",
+                         pairs + [(b, a) for a, b in pairs])
+    conn.exec_driver_sql("INSERT INTO groups (id, group_name, owner_id, last_seq) VALUES (?, ?, ?, 0)",
+                         [(g, f"g{g}", g) for g in range(1, args.groups + 1)])
+    members = {(g, (g * 7 + k) % args.users + 1) for g in range(1, args.groups + 1) for k in range(20)}
+    conn.exec_driver_sql("INSERT INTO group_members (group_id, user_id, role) VALUES (?, ?, 'member')",
+                         sorted(members))
+    start = datetime.utcnow() - timedelta(days=args.days)
+    step = timedelta(days=args.days) / args.messages
+    seqs = {}
+    rows = []
+    for i in range(args.messages):
+        created = start + step * i
+        text = f"message {i} " + "x" * random.randint(10, 120)
+        if i % 3 == 0:
+            g = random.randint(1, args.groups)
+            seqs[g] = seqs.get(g, 0) + 1
+            rows.append((g % args.users + 1, None, g, seqs[g], text, True, created))
+        else:
+            a, b = random.choice(pairs)
+            rows.append((a, b, None, None, text, True, created) if i % 2 else (b, a, None, None, text, True, created))
+        if len(rows) == 10_000 or i == args.messages - 1:
+            conn.exec_driver_sql(
+                "INSERT INTO messages (sender_id, receiver_id, group_id, seq, message_type, content, is_read, created_at)"
+                " VALUES (?, ?, ?, ?, 'text', ?, ?, ?)", rows)
+            rows = []
+    conn.exec_driver_sql("UPDATE groups SET last_seq = ?  WHERE id = ?", [(s, g) for g, s in seqs.items()])
+    db.session.commit()
+    return pairs
+
+
+def hot_size(db):
+    rows = db.session.execute(db.text(
+        "SELECT name, SUM(pgsize) FROM dbstat WHERE name = 'messages' OR name LIKE 'ix_messages_%'"
+        " OR name LIKE 'messages_fts%' GROUP BY name")).all()
+    return sum(size for _, size in rows) / 1024 / 1024, db.session.query(db.func.count()).select_from(
+        db.table("messages")).scalar()
+
+
+def measure_inserts(app, pairs, args):
+    from controllers.message_controller import send_private_message, send_group_message
+    from models.group import GroupMember
+
+    with app.app_context():
+        memberships = GroupMember.query.with_entities(GroupMember.user_id, GroupMember.group_id).all()
+    latencies = []
+    with app.app_context():
+        for i in range(args.inserts):
+            t = time.perf_counter()
+            if i % 3 == 0:
+                uid, gid = random.choice(memberships)
+                _, err = send_group_message(uid, gid, content=f"new {i}")
+            else:
+                a, b = random.choice(pairs)
+                _, err = send_private_message(a, b, content=f"new {i}")
+            assert err is None, err
+            latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def measure_history(app, pairs, args):
+    """最新一页与向前越过热数据（约一半历史处）的一页"""
+    from controllers.message_controller import get_private_messages
+    from models.message import Message
+
+    with app.app_context():
+        mid = Message.query.with_entities(Message.id).order_by(Message.id.desc()).first()[0] // 2
+    results = {}
+    for name, before_id in (("latest", None), ("deep", mid)):
+        samples = []
+        with app.app_context():
+            for a, b in random.sample(pairs, min(200, len(pairs))):
+                t = time.perf_counter()
+                get_private_messages(a, b, limit=50, before_id=before_id)
+                samples.append((time.perf_counter() - t) * 1000)
+        results[name] = statistics.median(samples)
+    return results
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URI"] = f"sqlite:///{workdir}/bench_archive.db"
+    os.environ["DATABASE_PROFILE"] = "production"
+    os.environ["STORAGE_DIR"] = f"{workdir}/storage"
+    from app import app
+    from config.database import db
+    from services.archive_service import archive_messages
+
+    with app.app_context():
+        t = time.perf_counter()
+        pairs = seed(db, args)
+        print(f"预置 {args.messages:,} 条消息（跨 {args.days} 天）用时 {time.perf_counter() - t:.0f}s")
+    print(f"{'phase':<10}{'hot rows':>12}{'hot MB':>10}{'insert p50':>12}{'p99':>10}{'latest':>10}{'deep':>10}")
+
+    def report(phase):
+        with app.app_context():
+            mb, rows = hot_size(db)
+        p50, p99 = measure_inserts(app, pairs, args)
+        history = measure_history(app, pairs, args)
+        print(f"{phase:<10}{rows:>12,}{mb:>10.1f}{p50:>10.2f}ms{p99:>8.2f}ms"
+              f"{history['latest']:>8.2f}ms{history['deep']:>8.2f}ms")
+
+    report("before")
+    with app.app_context():
+        t = time.perf_counter()
+        stats = archive_messages(args.archive_after)
+        elapsed = time.perf_counter() - t
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+    archive_mb = sum(f.stat().st_size for f in Path(workdir, "storage", "archive").rglob("*.gz")) / 1024 / 1024
+    print(f"归档 {stats['messages']:,} 条 / {stats['chats']} 个会话 → {stats['segments']} 个分段"
+          f"（{archive_mb:.1f}MB），用时 {elapsed:.0f}s")
+    report("after")
+
+
+if __name__ == "__main__":
+    main()
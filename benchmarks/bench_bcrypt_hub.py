@@ -0,0 +1,85 @@
+"""
+bcrypt 对 eventlet hub 的阻塞基准：N 个并发登录期间的 hub 调度延迟
+
+    python benchmarks/bench_bcrypt_hub.py --logins 100 --rounds 12
+
+blocking 模式直接在协程里调用 bcrypt.checkpw（旧实现），offload 模式走
+services.auth_service.check_password（原生线程池）。一个心跳协程每 10ms 醒来一次，
+记录实际醒来时间与预期的偏差，即 WebSocket 投递等其他协程会感受到的卡顿。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import eventlet  # noqa: E402
+
+TICK = 0.01
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--logins", type=int, default=100)
+    p.add_argument("--rounds", type=int, default=12)
+    p.add_argument("--threads", type=int, default=4)
+    return p.parse_args()
+
+
+def run(check, password, hashed, logins):
+    lags = []
+    done = [False]
+
+    def heartbeat():
+        while not done[0]:
+            t = time.perf_counter()
+            eventlet.sleep(TICK)
+            lags.append((time.perf_counter() - t - TICK) * 1000)
+
+    hb = eventlet.spawn(heartbeat)
+    eventlet.sleep(0)
+    pool = eventlet.GreenPool(logins)
+    start = time.perf_counter()
+    for _ in range(logins):
+        pool.spawn(check, password, hashed)
+    pool.waitall()
+    elapsed = time.perf_counter() - start
+    done[0] = True
+    hb.wait()
+    lags.sort()
+    return {
+        "elapsed_s": elapsed,
+        "lag_p50_ms": statistics.median(lags),
+        "lag_p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+        "lag_max_ms": lags[-1],
+        "ticks": len(lags),
+    }
+
+
+def main():
+    args = parse_args()
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_THREADS"] = str(args.threads)
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = str(args.logins)
+    import bcrypt
+    from services.auth_service import check_password
+
+    password = "correct horse battery staple"
+    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=args.rounds)).decode()
+
+    def blocking(pw, h):
+        return bcrypt.checkpw(pw.encode(), h.encode())
+
+    print(f"{args.logins} 个并发登录，bcrypt rounds={args.rounds}，线程池 {args.threads}")
+    print(f"{'mode':<10}{'elapsed':>10}{'lag p50':>12}{'lag p99':>12}{'lag max':>12}{'ticks':>8}")
+    for name, fn in (("blocking", blocking), ("offload", check_password)):
+        r = run(fn, password, hashed, args.logins)
+        print(f"{name:<10}{r['elapsed_s']:>9.2f}s{r['lag_p50_ms']:>10.1f}ms{r['lag_p99_ms']:>10.1f}ms"
+              f"{r['lag_max_ms']:>10.1f}ms{r['ticks']:>8}")
+
+
+if __name__ == "__main__":
+    main()
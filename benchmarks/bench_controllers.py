@@ -0,0 +1,189 @@
+"""
+控制器微基准：热点读接口在多个数据规模下的耗时，与 JSON 基线对比，超出阈值即失败
+
+    python benchmarks/bench_controllers.py                          # 默认 small,medium，与基线对比
+    python benchmarks/bench_controllers.py --scales small,medium,large --repeat 100
+    python benchmarks/bench_controllers.py --update-baseline        # 以本次结果覆盖基线
+
+每个规模在独立子进程中用 dataset.generate 生成数据（临时 SQLite 库，参数与 seed 固定，可复现），
+预热后逐个用例计时 --repeat 次（每次调用后清空会话，不复用 identity map），记录中位数与 p95。
+与基线（默认 benchmarks/baselines/controllers.json）相比中位数变慢超过 --threshold 且绝对差超过 --min-delta-ms
+的用例视为回退，进程以退出码 1 结束。基线与机器相关，换机器或 Python / SQLite 版本后应先在该环境 --update-baseline。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BASELINE = Path(__file__).resolve().parent / "baselines" / "controllers.json"
+SCALES = {
+    "small": dict(users=1_000, friend_degree=20, groups=30, group_sizes=(10, 50, 200), messages=50_000),
+    "medium": dict(users=5_000, friend_degree=50, groups=100, group_sizes=(10, 100, 500), messages=500_000),
+    "large": dict(users=20_000, friend_degree=100, groups=300, group_sizes=(20, 200, 2000), messages=2_000_000),
+}
+WARMUP = 3
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--scales", default="small,medium", help=f"逗号分隔，可选 {','.join(SCALES)}")
+    p.add_argument("--repeat", type=int, default=50, help="每个用例计时次数")
+    p.add_argument("--baseline", default=str(BASELINE), help="基线 JSON 路径")
+    p.add_argument("--update-baseline", action="store_true", help="以本次结果覆盖基线中对应的规模")
+    p.add_argument("--threshold", type=float, default=0.5, help="中位数允许变慢的比例")
+    p.add_argument("--min-delta-ms", type=float, default=0.1, help="绝对差低于该值时不计为回退（过滤计时噪声）")
+    p.add_argument("--output", default=None, help="另存本次结果的 JSON 路径")
+    return p.parse_args()
+
+
+def cases(db, info):
+    """用例名 -> 无参可调用对象；参数取自数据集描述与一次性查询"""
+    from controllers.friend_controller import get_friends
+    from controllers.group import get_group_members
+    from controllers.message_controller import get_private_messages, get_group_messages, search_messages
+    from models.message import Message
+    from services.notification_service import get_unread_summary
+
+    probe = info["probe_user"]
+    a, b = info["hot_pair"]
+    group_id, _ = info["largest_group"]
+
+    def middle_id(*criteria):
+        ids = [i for (i,) in db.session.query(Message.id).filter(*criteria).order_by(Message.id).all()]
+        return ids[len(ids) // 2]
+
+    private_mid = middle_id(db.or_(db.and_(Message.sender_id == a, Message.receiver_id == b),
+                                   db.and_(Message.sender_id == b, Message.receiver_id == a)))
+    group_mid = middle_id(Message.group_id == group_id)
+    db.session.remove()
+    return {
+        "get_private_messages.latest": lambda: get_private_messages(a, b, limit=50),
+        "get_private_messages.before": lambda: get_private_messages(a, b, limit=50, before_id=private_mid),
+        "get_private_messages.unread": lambda: get_private_messages(b, a, unread_only=True, limit=50),
+        "get_group_messages.latest": lambda: get_group_messages(probe, group_id, limit=50),
+        "get_group_messages.before": lambda: get_group_messages(probe, group_id, limit=50, before_id=group_mid),
+        "search_messages.fts": lambda: search_messages(probe, "项目 进度", limit=50),
+        "search_messages.like": lambda: search_messages(probe, "会", limit=50),
+        "get_unread_summary": lambda: get_unread_summary(probe),
+        "get_friends": lambda: get_friends(probe),
+        "get_group_members": lambda: get_group_members(group_id, probe),
+    }
+
+
+def run_scale(name, params, repeat):
+    """在子进程中执行：生成该规模的数据集并逐个用例计时，返回 {用例: {"median_ms", "p95_ms"}}"""
+    workdir = tempfile.mkdtemp(prefix="linkin-bench-")
+    os.environ["DATABASE_URI"] = f"sqlite:///{workdir}/{name}.db"
+    os.environ["STORAGE_DIR"] = f"{workdir}/storage"
+    from app import app
+    from config.database import db
+    from dataset import generate
+
+    results = {}
+    try:
+        with app.app_context():
+            t = time.perf_counter()
+            info = generate(db, **params)
+            generated = time.perf_counter() - t
+            for case, fn in cases(db, info).items():
+                samples = []
+                for i in range(WARMUP + repeat):
+                    t = time.perf_counter()
+                    fn()
+                    elapsed = (time.perf_counter() - t) * 1000
+                    db.session.remove()
+                    if i >= WARMUP:
+                        samples.append(elapsed)
+                samples.sort()
+                results[case] = {
+                    "median_ms": round(statistics.median(samples), 4),
+                    "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+                }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results, generated
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "database_profile": os.environ.get("DATABASE_PROFILE", "default"),
+    }
+
+
+def compare(baseline, current, threshold, min_delta):
+    """打印对比表，返回回退的 (规模, 用例) 列表"""
+    regressions = []
+    print(f"\n{'scale':<8}{'case':<32}{'baseline':>11}{'current':>11}{'change':>9}")
+    for scale, results in current.items():
+        base = baseline.get(scale, {})
+        for case, stat in results.items():
+            now = stat["median_ms"]
+            if case not in base:
+                print(f"{scale:<8}{case:<32}{'-':>11}{now:>9.3f}ms{'new':>9}")
+                continue
+            before = base[case]["median_ms"]
+            change = now / before - 1 if before else 0.0
+            regressed = change > threshold and now - before > min_delta
+            if regressed:
+                regressions.append((scale, case))
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{scale:<8}{case:<32}{before:>9.3f}ms{now:>9.3f}ms{change:>+8.0%}{flag}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    names = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in names if s not in SCALES]
+    if unknown:
+        sys.exit(f"未知规模: {', '.join(unknown)}")
+
+    current = {}
+    for name in names:
+        # 每个规模一个新进程：配置在导入时读取环境变量，缓存与连接池也互不影响
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results, generated = pool.submit(run_scale, name, SCALES[name], args.repeat).result()
+        current[name] = results
+        print(f"[{name}] 生成数据 {generated:.1f}s，{SCALES[name]['messages']:,} 条消息")
+        for case, stat in results.items():
+            print(f"  {case:<32}median {stat['median_ms']:>8.3f}ms  p95 {stat['p95_ms']:>8.3f}ms")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"environment": environment(), "scales": current},
+                                                ensure_ascii=False, indent=2) + "\n")
+
+    baseline_path = Path(args.baseline)
+    stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {"scales": {}}
+    if args.update_baseline:
+        stored["environment"] = environment()
+        stored["scales"].update(current)
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(stored, ensure_ascii=False, indent=2) + "\n")
+        print(f"\n已更新基线 {baseline_path}")
+        return
+    if not stored["scales"]:
+        print(f"\n基线 {baseline_path} 不存在，加 --update-baseline 生成")
+        return
+    regressions = compare(stored["scales"], current, args.threshold, args.min_delta_ms)
+    if regressions:
+        print(f"\n{len(regressions)} 个用例中位数变慢超过 {args.threshold:.0%}（基线环境 {stored.get('environment')}）")
+        sys.exit(1)
+    print("\n未发现回退")
+
+
+if __name__ == "__main__":
+    main()
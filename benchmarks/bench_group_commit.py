@@ -0,0 +1,91 @@
+"""
+消息写入基准：逐条 commit vs 组提交（group commit）
+
+    python benchmarks/bench_group_commit.py --senders 50 --messages 40
+
+在临时 SQLite 文件库上，用 N 个协程并发调用 send_private_message，
+分别在关闭/开启组提交时统计吞吐、单条发送延迟与实际提交次数。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import eventlet  # noqa: E402
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--senders", type=int, default=50, help="并发发送协程数")
+    p.add_argument("--messages", type=int, default=40, help="每个协程发送条数")
+    p.add_argument("--window-ms", type=float, default=3)
+    return p.parse_args()
+
+
+def setup(db, senders):
+    conn = db.session.connection()
+    conn.exec_driver_sql(
+        "INSERT INTO users (id, link_id, nickname) VALUES (?, ?, ?)",
+        [(i, str(10_000_000 + i), f"u{i}") for i in range(1, senders * 2 + 1)],
+    )
+    pairs = [(i, senders + i) for i in range(1, senders + 1)]
+    conn.exec_driver_sql(
+        "INSERT INTO friendships (user_id, friend_id) VALUES (?, ?)",
+        pairs + [(b, a) for a, b in pairs],
+    )
+    db.session.commit()
+    return pairs
+
+
+def run(app, pairs, per_sender):
+    from controllers.message_controller import send_private_message
+
+    latencies = []
+
+    def sender(a, b):
+        with app.app_context():
+            for i in range(per_sender):
+                t = time.perf_counter()
+                msg, err = send_private_message(a, b, content=f"m{i}")
+                assert err is None and msg.id
+                latencies.append((time.perf_counter() - t) * 1000)
+
+    pool = eventlet.GreenPool(len(pairs))
+    start = time.perf_counter()
+    for a, b in pairs:
+        pool.spawn(sender, a, b)
+    pool.waitall()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URI"] = f"sqlite:///{tempfile.mkdtemp()}/bench_group_commit.db"
+    os.environ["GROUP_COMMIT_WINDOW_MS"] = str(args.window_ms)
+    from app import app
+    from config.database import db
+    from services import group_commit
+
+    with app.app_context():
+        pairs = setup(db, args.senders)
+    total = args.senders * args.messages
+    print(f"{args.senders} 个并发发送者 × {args.messages} 条 = {total} 条消息，窗口 {args.window_ms}ms")
+    print(f"{'mode':<14}{'msg/s':>10}{'p50':>10}{'p99':>10}{'commits':>10}")
+    for enabled in (False, True):
+        group_commit.GROUP_COMMIT_ENABLED = enabled
+        rate, p50, p99 = run(app, pairs, args.messages)
+        writer = group_commit._writer
+        commits = writer.stats()["batches"] if enabled and writer else total
+        name = "group-commit" if enabled else "per-message"
+        print(f"{name:<14}{rate:>10,.0f}{p50:>8.1f}ms{p99:>8.1f}ms{commits:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+通讯码分配基准：随机生成 + 查询重试（旧实现）vs 序号置换 + 号段预留
+
+    python benchmarks/bench_link_id.py --length 6 --fills 0.5,0.9,0.99 --users 2000
+
+8 位通讯码共 9000 万个，无法在基准里填满，改用较短的通讯码（--length）缩小号码空间，
+按给定占用率预置用户后注册 --users 个新用户（分配通讯码 + INSERT + commit），
+统计每秒注册数、每次注册执行的 SQL 语句数与旧实现的最大递归深度。
+预置用户分两种：legacy 为旧实现随机生成的号（新分配器预留号段时需剔除），
+sequential 为新分配器自己分配的号（不会冲突）。
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--length", type=int, default=6, help="通讯码位数（号码空间为 9×10^(length-1)）")
+    p.add_argument("--fills", default="0.5,0.9,0.99", help="预置用户占号码空间的比例，逗号分隔")
+    p.add_argument("--users", type=int, default=2000, help="每轮注册的新用户数")
+    return p.parse_args()
+
+
+def legacy_generate(length, depth=1):
+    """旧实现：随机生成，冲突则查询后递归重试；返回 (link_id, 递归深度)"""
+    from config.database import db
+    from models.user import User
+
+    digits = "0123456789"
+    link_id = random.choice(digits[1:]) + "".join(random.choices(digits, k=length - 1))
+    if db.session.query(User).filter(User.link_id == link_id).first() is not None:
+        return legacy_generate(length, depth + 1)
+    return link_id, depth
+
+
+def reset(db, space, fill, low, prefill):
+    """清空用户表并预置 fill × space 个用户"""
+    from config.settings import LINK_ID_BLOCK_SIZE
+    from models.user import LinkIdSequence
+    from utils.id_generator import LinkIdAllocator
+
+    db.session.execute(db.text("DELETE FROM users"))
+    db.session.query(LinkIdSequence).delete()
+    db.session.commit()
+    count = int(space * fill)
+    allocator = LinkIdAllocator(len(str(low)), block_size=4096)
+    if prefill == "legacy":
+        ids = [str(low + n) for n in random.sample(range(space), count)]
+    else:
+        ids = allocator.allocate(count) if count else []
+    db.session.connection().exec_driver_sql(
+        "INSERT INTO users (link_id, nickname) VALUES (?, ?)", [(i, "seed") for i in ids])
+    db.session.commit()
+    allocator.block_size = LINK_ID_BLOCK_SIZE
+    return allocator
+
+
+def register(db, users, next_id):
+    from models.user import User
+
+    start = time.perf_counter()
+    for i in range(users):
+        db.session.add(User(link_id=next_id(), nickname=f"u{i}"))
+        db.session.commit()
+    return users / (time.perf_counter() - start)
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URI"] = f"sqlite:///{tempfile.mkdtemp()}/bench_link_id.db"
+    from sqlalchemy import event
+    from app import app
+    from config.database import db
+    from utils.id_generator import LinkIdAllocator
+
+    low = 10 ** (args.length - 1)
+    space = 9 * low
+    statements = [0]
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *a: statements.__setitem__(0, statements[0] + 1))
+        print(f"{args.length} 位通讯码，号码空间 {space:,}，每轮注册 {args.users} 个用户")
+        print(f"{'fill':>6}  {'mode':<22}{'users/s':>10}{'SQL/user':>10}{'max depth':>11}")
+        for fill in [float(f) for f in args.fills.split(",")]:
+            if space * fill + args.users > space:
+                print(f"{fill:>6.2f}  跳过：剩余号码不足 {args.users} 个")
+                continue
+            for mode, prefill in (("legacy", "legacy"), ("allocator/legacy", "legacy"),
+                                  ("allocator/sequential", "sequential")):
+                seeded = reset(db, space, fill, low, prefill)
+                depth = [0]
+                if mode == "legacy":
+                    def next_id():
+                        link_id, d = legacy_generate(args.length)
+                        depth[0] = max(depth[0], d)
+                        return link_id
+                else:
+                    # sequential：继续使用预置时的计数器；legacy：预置的号未经计数器，新建分配器
+                    allocator = seeded if prefill == "sequential" else LinkIdAllocator(args.length)
+                    next_id = lambda: allocator.allocate()[0]  # noqa: E731
+                statements[0] = 0
+                rate = register(db, args.users, next_id)
+                print(f"{fill:>6.2f}  {mode:<22}{rate:>10,.0f}{statements[0] / args.users:>10.2f}"
+                      f"{depth[0] if mode == 'legacy' else '-':>11}")
+
+
+if __name__ == "__main__":
+    main()
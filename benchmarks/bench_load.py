@@ -0,0 +1,380 @@
+"""
+端到端压测：REST 发送 -> Socket.IO new_message 送达延迟
+
+    python benchmarks/bench_load.py --users 200 --clients 200 --groups 10 --group-size 20 --rate 200 --duration 30
+    GROUP_COMMIT_ENABLED=1 python benchmarks/bench_load.py ...        # 服务端配置经环境变量传入，便于对比
+    python benchmarks/bench_load.py --env DATABASE_PROFILE=default ...
+
+在子进程中启动服务端（eventlet，临时 SQLite 文件库与存储目录，不依赖外部服务），随后：
+  1. 经 REST 注册 --users 个用户（服务端 BCRYPT_ROUNDS 调低），按环形互加 --friends 个好友，
+     建 --groups 个 --group-size 人的群（群主先加成员为好友）
+  2. 建立 --clients 个 Socket.IO 连接并 authenticate（多于用户数时同一用户多设备在线）
+  3. 按 --rate 条/秒的目标速率（开环，--senders 个发送线程）调用 /api/messages/private 与 /api/messages/group，
+     群消息占 --group-ratio
+统计每条消息从发出 HTTP 请求到各在线接收方（不含发送方自己的设备）收到 new_message 的延迟
+（p50 / p95 / p99）、HTTP 响应延迟、错误率、未送达数与压测期间服务端进程的 CPU 占用。
+
+Socket.IO 客户端为基于 simple-websocket（python-engineio 的依赖）的最小实现，直接以 websocket 传输连接，
+不需要安装 python-socketio[client] 的额外依赖；压测进程本身受 GIL 限制，速率很高时应先确认客户端不是瓶颈
+（实际速率明显低于 --rate 即为信号）。
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import simple_websocket
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 服务端启动脚本：关闭调试重载器（否则 CPU 统计落在重载器的子进程上）与访问日志
+SERVER = (
+    "import os\n"
+    "from app import app\n"
+    "app.socketio.run(app, host='127.0.0.1', port=int(os.environ['PORT']), debug=False, log_output=False)\n"
+)
+PASSWORD = "bench-password"
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--users", type=int, default=200)
+    p.add_argument("--clients", type=int, default=None, help="Socket.IO 连接数，默认与用户数相同")
+    p.add_argument("--friends", type=int, default=4, help="每个用户按环形添加的好友数")
+    p.add_argument("--groups", type=int, default=10)
+    p.add_argument("--group-size", type=int, default=20, help="每个群的人数（含群主）")
+    p.add_argument("--rate", type=float, default=200, help="目标发送速率（条/秒）")
+    p.add_argument("--duration", type=float, default=30, help="压测时长（秒）")
+    p.add_argument("--group-ratio", type=float, default=0.2, help="群消息占比")
+    p.add_argument("--senders", type=int, default=16, help="发送线程数（每个线程一个 keep-alive 连接）")
+    p.add_argument("--drain", type=float, default=5, help="停止发送后等待送达的秒数")
+    p.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="传给服务端的环境变量，可重复")
+    p.add_argument("--keep", action="store_true", help="保留临时目录（数据库与服务端日志）")
+    return p.parse_args()
+
+
+# ---------- 服务端 ----------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, args):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "DATABASE_URI": f"sqlite:///{workdir}/load.db",
+        "DATABASE_PROFILE": env.get("DATABASE_PROFILE", "production"),
+        "STORAGE_DIR": str(workdir / "storage"),
+        "BCRYPT_ROUNDS": env.get("BCRYPT_ROUNDS", "4"),
+        "PYTHONUNBUFFERED": "1",
+    })
+    env.update(kv.split("=", 1) for kv in args.env)
+    log = open(workdir / "server.log", "w")
+    proc = subprocess.Popen([sys.executable, "-c", SERVER], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"服务端启动失败，见 {workdir / 'server.log'}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/me")
+            conn.getresponse().read()
+            return proc, port
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("服务端 30 秒内未就绪")
+
+
+def cpu_seconds(pid):
+    """进程累计 CPU 时间（utime + stime，Linux /proc）；不可用时返回 None"""
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+# ---------- REST ----------
+
+class Api:
+    """每个线程一个 keep-alive 连接"""
+
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+
+    def post(self, path, body, token=None):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        try:
+            conn.request("POST", path, body=json.dumps(body), headers=headers)
+            resp = conn.getresponse()
+            return resp.status, json.loads(resp.read() or b"{}")
+        except (OSError, http.client.HTTPException, ValueError):
+            conn.close()
+            self.local.conn = None
+            raise
+
+
+def setup(api, args):
+    """注册用户、添加好友、建群，返回 (users, friend_pairs, groups)；users[i] = {"id", "token"}"""
+    def register(i):
+        for _ in range(20):
+            status, body = api.post("/api/register", {"nickname": f"load{i}", "password": PASSWORD})
+            if body.get("code") == 503:  # 哈希线程池已满
+                time.sleep(0.1)
+                continue
+            if body.get("code") != 0:
+                raise RuntimeError(f"注册失败: {body}")
+            return {"id": body["data"]["user"]["id"], "token": body["data"]["token"]}
+        raise RuntimeError("注册持续返回 503")
+
+    with ThreadPoolExecutor(16) as pool:
+        users = list(pool.map(register, range(args.users)))
+
+    n = args.users
+    pairs = {(min(i, (i + k) % n), max(i, (i + k) % n)) for i in range(n) for k in range(1, args.friends + 1)}
+    groups = []
+    for g in range(args.groups):
+        owner = g * n // max(args.groups, 1)
+        members = [(owner + k) % n for k in range(min(args.group_size, n))]
+        pairs.update((min(owner, m), max(owner, m)) for m in members if m != owner)
+        groups.append(members)
+    pairs = sorted(p for p in pairs if p[0] != p[1])
+
+    def befriend(pair):
+        a, b = pair
+        _, body = api.post("/api/friends/add", {"friend_id": users[b]["id"]}, users[a]["token"])
+        if body.get("code") != 0 and body.get("message") != "已是好友":
+            raise RuntimeError(f"加好友失败: {body}")
+
+    def create(members):
+        owner = users[members[0]]
+        _, body = api.post("/api/groups", {
+            "group_name": f"load-group-{members[0]}",
+            "member_ids": [users[m]["id"] for m in members[1:]],
+        }, owner["token"])
+        if body.get("code") != 0:
+            raise RuntimeError(f"建群失败: {body}")
+        return body["data"]["id"], members
+
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(befriend, pairs))
+        groups = list(pool.map(create, groups))
+    return users, pairs, groups
+
+
+# ---------- Socket.IO ----------
+
+class SocketClient:
+    """最小 Socket.IO（Engine.IO v4）客户端：websocket 传输、默认命名空间，收到事件时回调 on_event(name, data)"""
+
+    def __init__(self, port, on_event):
+        self.on_event = on_event
+        self.ws = simple_websocket.Client.connect(f"ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket")
+        self._expect("0")   # Engine.IO open
+        self.ws.send("40")  # Socket.IO connect
+        self._expect("40")
+        self.thread = threading.Thread(target=self._read, daemon=True)
+
+    def _expect(self, prefix):
+        packet = self.ws.receive(timeout=10)
+        if not packet or not packet.startswith(prefix):
+            raise RuntimeError(f"意外的握手包: {packet!r}")
+        return packet
+
+    def emit(self, event, data):
+        self.ws.send("42" + json.dumps([event, data]))
+
+    def authenticate(self, token):
+        self.emit("authenticate", {"token": token})
+        while True:
+            packet = self._expect("4")
+            event, data = json.loads(packet[2:])
+            if event == "authenticated":
+                break
+            if event == "auth_fail":
+                raise RuntimeError(f"认证失败: {data}")
+        self.thread.start()
+
+    def _read(self):
+        while True:
+            try:
+                packet = self.ws.receive()
+            except simple_websocket.ConnectionClosed:
+                return
+            if packet is None:
+                return
+            if packet == "2":  # 服务端 ping
+                self.ws.send("3")
+            elif packet.startswith("42"):
+                event, *data = json.loads(packet[2:])
+                self.on_event(event, data[0] if data else None)
+
+    def close(self):
+        self.ws.close()
+
+
+# ---------- 压测 ----------
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {}        # marker -> (发出时间, 应送达数)
+        self.delivered = []   # 送达延迟（毫秒）
+        self.received = {}    # marker -> 已送达数
+        self.http = []        # HTTP 响应延迟（毫秒）
+        self.errors = 0
+
+    def on_message(self, user_id, data):
+        now = time.perf_counter()
+        content = (data or {}).get("content") or ""
+        if not content.startswith("load ") or data.get("sender_id") == user_id:
+            return
+        marker = content.split(" ", 2)[1]
+        with self.lock:
+            entry = self.sent.get(marker)
+            if entry is not None:
+                self.delivered.append((now - entry[0]) * 1000)
+                self.received[marker] = self.received.get(marker, 0) + 1
+
+
+def connect_clients(port, users, args, recorder):
+    count = args.clients if args.clients is not None else len(users)
+
+    def open_one(k):
+        user = users[k % len(users)]
+        client = SocketClient(port, lambda event, data, uid=user["id"]:
+                              recorder.on_message(uid, data) if event == "new_message" else None)
+        client.authenticate(user["token"])
+        return client
+
+    with ThreadPoolExecutor(32) as pool:
+        clients = list(pool.map(open_one, range(count)))
+    online = {}
+    for k in range(count):
+        index = k % len(users)
+        online[index] = online.get(index, 0) + 1
+    return clients, online
+
+
+def drive(api, users, pairs, groups, online, args, recorder):
+    """开环发送：第 k 条消息计划在 start + k / rate 发出，由 --senders 个线程轮流承担"""
+    total = int(args.rate * args.duration)
+    start = time.perf_counter() + 0.5
+
+    def sender(worker):
+        rng = random.Random(worker)
+        for k in range(worker, total, args.senders):
+            delay = start + k / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            marker = str(k)
+            if groups and rng.random() < args.group_ratio:
+                group_id, members = rng.choice(groups)
+                author = rng.choice(members)
+                expected = sum(online.get(m, 0) for m in members if m != author)
+                path, body = "/api/messages/group", {"group_id": group_id}
+            else:
+                a, b = rng.choice(pairs)
+                author, target = (a, b) if rng.random() < 0.5 else (b, a)
+                expected = online.get(target, 0)
+                path, body = "/api/messages/private", {"to_user": users[target]["id"]}
+            body["content"] = f"load {marker} {'x' * rng.randint(8, 64)}"
+            t = time.perf_counter()
+            with recorder.lock:
+                recorder.sent[marker] = (t, expected)
+            try:
+                status, resp = api.post(path, body, users[author]["token"])
+                ok = status == 200 and resp.get("code") == 0
+            except (OSError, http.client.HTTPException, ValueError):
+                ok = False
+            with recorder.lock:
+                recorder.http.append((time.perf_counter() - t) * 1000)
+                if not ok:
+                    recorder.errors += 1
+                    recorder.sent[marker] = (t, 0)
+
+    threads = [threading.Thread(target=sender, args=(w,), daemon=True) for w in range(args.senders)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return total, time.perf_counter() - start
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    args = parse_args()
+    workdir = Path(tempfile.mkdtemp(prefix="linkin-load-"))
+    proc, port = start_server(workdir, args)
+    clients = []
+    try:
+        api = Api(port)
+        t = time.perf_counter()
+        users, pairs, groups = setup(api, args)
+        print(f"准备：{len(users)} 个用户，{len(pairs)} 对好友，{len(groups)} 个群，用时 {time.perf_counter() - t:.1f}s")
+        recorder = Recorder()
+        clients, online = connect_clients(port, users, args, recorder)
+        print(f"已建立 {len(clients)} 个 Socket.IO 连接（{len(online)} 个用户在线）")
+
+        cpu_before, wall_before = cpu_seconds(proc.pid), time.perf_counter()
+        total, elapsed = drive(api, users, pairs, groups, online, args, recorder)
+        cpu_after, wall_after = cpu_seconds(proc.pid), time.perf_counter()
+        expected = sum(e for _, e in recorder.sent.values())
+        deadline = time.perf_counter() + args.drain
+        while time.perf_counter() < deadline and len(recorder.delivered) < expected:
+            time.sleep(0.05)
+
+        with recorder.lock:
+            delivered = list(recorder.delivered)
+        lost = expected - len(delivered)
+        print(f"\n发送 {total:,} 条（目标 {args.rate:g}/s，实际 {total / elapsed:,.0f}/s），"
+              f"HTTP 错误 {recorder.errors}（{recorder.errors / max(total, 1):.2%}）")
+        print(f"{'':<12}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for name, values in (("http", recorder.http), ("delivery", delivered)):
+            print(f"{name:<12}" + "".join(f"{percentile(values, q):>8.1f}ms" for q in (0.5, 0.95, 0.99, 1.0)))
+        print(f"送达 {len(delivered):,}/{expected:,}，未送达 {lost:,}（{lost / max(expected, 1):.2%}）")
+        if cpu_before is not None and cpu_after is not None:
+            print(f"服务端 CPU {(cpu_after - cpu_before) / (wall_after - wall_before):.0%}（单核占用，压测期间）")
+    finally:
+        for client in clients:
+            client.close()
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        if args.keep:
+            print(f"临时目录：{workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Socket.IO 消息总线吞吐基准：1 个发布进程 -> N 个 worker 进程
+
+    python benchmarks/bench_message_bus.py --workers 4 --messages 20000
+    python benchmarks/bench_message_bus.py --queue redis://127.0.0.1:6379/0   # 本地 Redis / Valkey 替身
+
+每个 worker 进程持有一个模拟连接（在 broadcast 房间内），统计收到的事件数；
+发布进程以写模式（write_only）向该房间 emit，即 HTTP 进程推送消息的路径。
+默认在本进程内启动单机 Unix socket 代理。
+"""
+import argparse
+import multiprocessing as mp
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ROOM = "broadcast"
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--messages", type=int, default=20_000)
+    p.add_argument("--payload", type=int, default=256, help="消息内容字节数")
+    p.add_argument("--queue", default=None, help="消息队列 URL，默认启动本地 unix 代理")
+    p.add_argument("--timeout", type=float, default=120)
+    return p.parse_args()
+
+
+def worker(url, expected, ready, results, timeout):
+    import socketio
+    from services.message_bus import create_client_manager
+
+    server = socketio.Server(client_manager=create_client_manager(url, channel="bench"), async_mode="threading")
+    received = [0, None, None]
+    done = threading.Event()
+
+    def record(eio_sid, pkt):
+        now = time.perf_counter()
+        if received[1] is None:
+            received[1] = now
+        received[0] += 1
+        received[2] = now
+        if received[0] >= expected:
+            done.set()
+
+    server._send_eio_packet = record
+    server.manager.initialize()
+    sid = server.manager.connect("bench-eio", "/")
+    server.manager.basic_enter_room(sid, "/", ROOM)
+    time.sleep(0.5)  # 等待订阅连接建立
+    ready.put(True)
+    done.wait(timeout)
+    first, last = received[1] or 0, received[2] or 0
+    results.put((received[0], last - first))
+
+
+def main():
+    args = parse_args()
+    url = args.queue
+    if url is None:
+        from services.message_bus import run_broker
+        path = str(Path(tempfile.mkdtemp()) / "bus.sock")
+        threading.Thread(target=run_broker, args=(path,), daemon=True).start()
+        time.sleep(0.3)
+        url = f"unix://{path}"
+
+    ctx = mp.get_context("spawn")
+    ready, results = ctx.Queue(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(url, args.messages, ready, results, args.timeout))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.get(timeout=60)
+
+    from services.message_bus import create_client_manager
+    publisher = create_client_manager(url, channel="bench")
+    publisher.write_only = True
+    body = "x" * args.payload
+    start = time.perf_counter()
+    for i in range(args.messages):
+        publisher.emit("new_message", {"id": i, "content": body}, namespace="/", room=ROOM)
+    publish_s = time.perf_counter() - start
+
+    stats = [results.get(timeout=args.timeout + 10) for _ in procs]
+    total_s = time.perf_counter() - start
+    for p in procs:
+        p.join()
+    delivered = sum(n for n, _ in stats)
+    print(f"总线 {url}，{args.workers} 个 worker，{args.messages} 条消息，payload {args.payload}B")
+    print(f"发布耗时 {publish_s:.2f}s（{args.messages / publish_s:,.0f} msg/s）")
+    for i, (n, span) in enumerate(stats):
+        rate = n / span if span else 0
+        print(f"  worker {i}: 收到 {n}/{args.messages}，{rate:,.0f} msg/s")
+    print(f"合计投递 {delivered} 次，{delivered / total_s:,.0f} deliveries/s，端到端 {total_s:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+消息搜索基准：FTS5 全文索引 vs LIKE 全表扫描
+
+    python benchmarks/bench_search.py --rows 10000000
+
+在临时 SQLite 数据库中生成数据（不影响 database/linkin.db），
+对同一批关键字分别走 search_fts 与 search_messages_like，输出平均 / p95 耗时。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+WORDS = [
+    "今天", "明天", "晚上", "一起", "吃饭", "开会", "项目", "进度", "文件", "发你",
+    "收到", "好的", "谢谢", "周末", "电影", "加班", "需求", "上线", "测试", "回家",
+    "hello", "meeting", "deploy", "review", "dinner", "report", "release", "ticket",
+]
+QUERIES = ["一起 吃饭", "项目 进度", "deploy", "release ticket", "周末 电影", "不存在的关键字"]
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--rows", type=int, default=200_000, help="消息条数")
+    p.add_argument("--users", type=int, default=2_000)
+    p.add_argument("--friends", type=int, default=200, help="被测用户的好友数")
+    p.add_argument("--groups", type=int, default=30, help="被测用户所在群数")
+    p.add_argument("--repeat", type=int, default=5, help="每个关键字重复次数")
+    p.add_argument("--batch", type=int, default=50_000)
+    return p.parse_args()
+
+
+def populate(db, args):
+    rnd = random.Random(42)
+    conn = db.session.connection()
+    conn.exec_driver_sql(
+        "INSERT INTO users (id, link_id, nickname) VALUES (?, ?, ?)",
+        [(i, str(10_000_000 + i), f"u{i}") for i in range(1, args.users + 1)],
+    )
+    friends = range(2, args.friends + 2)
+    conn.exec_driver_sql(
+        "INSERT INTO friendships (user_id, friend_id) VALUES (?, ?)",
+        [(1, f) for f in friends] + [(f, 1) for f in friends],
+    )
+    groups = range(1, args.groups * 3 + 1)  # 被测用户只在前 1/3 的群里
+    conn.exec_driver_sql(
+        "INSERT INTO groups (id, group_name, owner_id) VALUES (?, ?, 1)",
+        [(g, f"g{g}") for g in groups],
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO group_members (group_id, user_id, role) VALUES (?, 1, 'member')",
+        [(g,) for g in range(1, args.groups + 1)],
+    )
+    inserted = 0
+    while inserted < args.rows:
+        n = min(args.batch, args.rows - inserted)
+        batch = []
+        for _ in range(n):
+            content = " ".join(rnd.choices(WORDS, k=rnd.randint(3, 12)))
+            if rnd.random() < 0.5:
+                a, b = rnd.randint(1, args.users), rnd.randint(1, args.users)
+                batch.append((a, b, None, content))
+            else:
+                batch.append((rnd.randint(1, args.users), None, rnd.choice(groups), content))
+        conn.exec_driver_sql(
+            "INSERT INTO messages (sender_id, receiver_id, group_id, message_type, content, is_read)"
+            " VALUES (?, ?, ?, 'text', ?, 0)",
+            batch,
+        )
+        db.session.commit()
+        conn = db.session.connection()
+        inserted += n
+        print(f"  已生成 {inserted}/{args.rows} 条消息")
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URI"] = f"sqlite:///{tempfile.mkdtemp()}/bench_search.db"
+    from app import app
+    from config.database import db
+    from controllers.message_controller import search_messages_like
+    from services import search_service
+
+    with app.app_context():
+        if not search_service.fts_enabled():
+            print("当前 SQLite 不支持 FTS5 trigram，无法对比")
+            return
+        t = time.perf_counter()
+        populate(db, args)
+        print(f"生成数据 {args.rows} 行（含触发器维护索引）: {time.perf_counter() - t:.1f}s")
+        print(f"{'keyword':<16}{'like avg':>12}{'like p95':>12}{'fts avg':>12}{'fts p95':>12}{'hits':>8}")
+        for q in QUERIES:
+            like_avg, like_p95 = timed(lambda: search_messages_like(1, q, limit=50), args.repeat)
+            fts_avg, fts_p95 = timed(lambda: search_service.search_fts(1, q, limit=50), args.repeat)
+            hits = len(search_service.search_fts(1, q, limit=50))
+            print(f"{q:<16}{like_avg:>10.1f}ms{like_p95:>10.1f}ms{fts_avg:>10.1f}ms{fts_p95:>10.1f}ms{hits:>8}")
+
+
+if __name__ == "__main__":
+    main()
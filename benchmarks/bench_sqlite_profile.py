@@ -0,0 +1,142 @@
+"""
+SQLite 运行配置基准：default（回滚日志、单连接池）vs production（WAL + 调优 PRAGMA + 读写分流）
+
+    python benchmarks/bench_sqlite_profile.py --writers 4 --readers 8 --seconds 5
+
+在临时 SQLite 文件库上，用原生线程并发执行发送消息（写）与拉取历史、未读汇总（读），
+统计各配置下的吞吐、p50/p99 延迟与 "database is locked" 错误数。
+每种配置在独立子进程中运行（DATABASE_PROFILE 在导入时读取）。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PROFILES = ("default", "production")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--writers", type=int, default=4, help="写线程数")
+    p.add_argument("--readers", type=int, default=8, help="读线程数")
+    p.add_argument("--seconds", type=float, default=5, help="每种配置的运行时长")
+    p.add_argument("--history", type=int, default=20000, help="预置的历史消息条数")
+    p.add_argument("--worker", choices=PROFILES, help=argparse.SUPPRESS)
+    return p.parse_args()
+
+
+def setup(db, pairs_count, history):
+    conn = db.session.connection()
+    conn.exec_driver_sql(
+        "INSERT INTO users (id, link_id, nickname) VALUES (?, ?, ?)",
+        [(i, str(10_000_000 + i), f"u{i}") for i in range(1, pairs_count * 2 + 1)],
+    )
+    pairs = [(i, pairs_count + i) for i in range(1, pairs_count + 1)]
+    conn.exec_driver_sql(
+        "INSERT INTO friendships (user_id, friend_id) VALUES (?, ?)",
+        pairs + [(b, a) for a, b in pairs],
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO messages (sender_id, receiver_id, message_type, content, is_read) VALUES (?, ?, 'text', ?, 0)",
+        [(*pairs[i % len(pairs)], f"history {i}") for i in range(history)],
+    )
+    db.session.commit()
+    return pairs
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def worker(args):
+    from sqlalchemy.exc import OperationalError
+
+    from app import app
+    from config.database import db
+    from controllers.message_controller import send_private_message, get_private_messages
+    from services.notification_service import get_unread_summary
+
+    pairs_count = max(args.writers, args.readers)
+    with app.app_context():
+        pairs = setup(db, pairs_count, args.history)
+
+    results = {"write": [], "read": []}
+    errors = {"write": 0, "read": 0}
+    stop = time.perf_counter() + args.seconds
+
+    def loop(kind, a, b):
+        with app.app_context():
+            i = 0
+            while time.perf_counter() < stop:
+                t = time.perf_counter()
+                try:
+                    if kind == "write":
+                        send_private_message(a, b, content=f"bench {i}")
+                    else:
+                        get_private_messages(b, a, limit=50)
+                        get_unread_summary(b)
+                        db.session.commit()
+                except OperationalError:
+                    db.session.rollback()
+                    errors[kind] += 1
+                    continue
+                finally:
+                    i += 1
+                results[kind].append((time.perf_counter() - t) * 1000)
+            db.session.remove()
+
+    threads = [threading.Thread(target=loop, args=("write", *pairs[i % len(pairs)])) for i in range(args.writers)]
+    threads += [threading.Thread(target=loop, args=("read", *pairs[i % len(pairs)])) for i in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    report = {}
+    for kind, lat in results.items():
+        report[kind] = {
+            "ops": len(lat) / args.seconds,
+            "p50": percentile(lat, 0.50),
+            "p99": percentile(lat, 0.99),
+            "errors": errors[kind],
+        }
+    print(json.dumps(report))
+
+
+def run_profile(args, profile):
+    env = dict(os.environ)
+    env["DATABASE_URI"] = f"sqlite:///{tempfile.mkdtemp()}/bench_sqlite_profile.db"
+    env["DATABASE_PROFILE"] = profile
+    cmd = [sys.executable, __file__, "--worker", profile, "--writers", str(args.writers),
+           "--readers", str(args.readers), "--seconds", str(args.seconds), "--history", str(args.history)]
+    out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        worker(args)
+        return
+    print(f"{args.writers} 个写线程 + {args.readers} 个读线程，每种配置运行 {args.seconds}s，"
+          f"预置 {args.history} 条历史消息")
+    print(f"{'profile':<12}{'op':<7}{'ops/s':>10}{'p50':>10}{'p99':>10}{'locked':>8}")
+    for profile in PROFILES:
+        report = run_profile(args, profile)
+        for kind in ("write", "read"):
+            r = report[kind]
+            print(f"{profile:<12}{kind:<7}{r['ops']:>10,.0f}{r['p50']:>8.1f}ms{r['p99']:>8.1f}ms{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+/storage 文件下发基准：零拷贝 sendfile vs 经 Python 缓冲的普通发送
+
+    python benchmarks/bench_static_delivery.py --seconds 5 --concurrency 8
+
+在临时存储目录与数据库上预置大文件（附件视频）与大量小文件（头像），
+在子进程中以 eventlet 服务器启动应用，用原生线程 + HTTP 长连接并发请求：
+  large       整个大文件下载，统计 MB/s
+  range       大文件内随机 1MB 区间（视频拖动进度条）
+  avatars     随机小文件下载，统计 req/s 与 p50/p99
+  revalidate  小文件带 If-None-Match 的条件请求（304）
+buffered 与 sendfile 两种模式各启动一次服务（STORAGE_SENDFILE_ENABLED=0/1）。
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MODES = ("buffered", "sendfile")
+SCENARIOS = ("large", "range", "avatars", "revalidate")
+RANGE_BYTES = 1024 * 1024
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--seconds", type=float, default=5, help="每个场景的运行时长")
+    p.add_argument("--concurrency", type=int, default=8, help="并发客户端线程数")
+    p.add_argument("--large-mb", type=int, default=20, help="大文件大小（MB）")
+    p.add_argument("--avatars", type=int, default=500, help="小文件个数")
+    p.add_argument("--avatar-kb", type=int, default=16, help="小文件大小（KB）")
+    p.add_argument("--seed", action="store_true", help=argparse.SUPPRESS)
+    p.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    return p.parse_args()
+
+
+def seed(args):
+    """在临时存储中写入测试文件，输出 {"large": path, "avatars": [paths]}"""
+    from app import app
+    from services.file_service import store_stream
+
+    with app.app_context():
+        large = store_stream(io.BytesIO(os.urandom(args.large_mb * 1024 * 1024)), "video.mp4",
+                             limit=args.large_mb * 1024 * 1024)
+        avatars = [store_stream(io.BytesIO(os.urandom(args.avatar_kb * 1024)), "avatar.png")
+                   for _ in range(args.avatars)]
+    print(json.dumps({"large": large, "avatars": avatars}))
+
+
+def serve(port):
+    from app import app, socketio
+    socketio.run(app, host="127.0.0.1", port=port, debug=False, log_output=False)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def fetch(conn, path, headers):
+    conn.request("GET", path, headers=headers)
+    resp = conn.getresponse()
+    buf = bytearray(256 * 1024)
+    view = memoryview(buf)
+    total = 0
+    while True:
+        n = resp.readinto(view)
+        if not n:
+            break
+        total += n
+    resp.close()
+    return resp.status, total
+
+
+def run_scenario(port, scenario, files, args):
+    large_size = args.large_mb * 1024 * 1024
+    stop = time.perf_counter() + args.seconds
+    latencies, sizes, errors = [], [0], [0]
+    lock = threading.Lock()
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local_lat, local_bytes = [], 0
+        while time.perf_counter() < stop:
+            headers = {}
+            if scenario in ("large", "range"):
+                path = "/storage/" + files["large"]
+                if scenario == "range":
+                    start = random.randrange(0, large_size - RANGE_BYTES)
+                    headers["Range"] = f"bytes={start}-{start + RANGE_BYTES - 1}"
+            else:
+                avatar = random.choice(files["avatars"])
+                path = "/storage/" + avatar
+                if scenario == "revalidate":
+                    headers["If-None-Match"] = '"%s"' % avatar.rsplit("/", 1)[-1].split(".")[0]
+            t = time.perf_counter()
+            try:
+                status, n = fetch(conn, path, headers)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                with lock:
+                    errors[0] += 1
+                continue
+            if status not in (200, 206, 304):
+                with lock:
+                    errors[0] += 1
+                continue
+            local_lat.append((time.perf_counter() - t) * 1000)
+            local_bytes += n
+        conn.close()
+        with lock:
+            latencies.extend(local_lat)
+            sizes[0] += local_bytes
+
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {
+        "rps": len(latencies) / args.seconds,
+        "mbps": sizes[0] / args.seconds / 1024 / 1024,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "errors": errors[0],
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("服务未能启动")
+
+
+def main():
+    args = parse_args()
+    if args.seed:
+        seed(args)
+        return
+    if args.serve:
+        serve(args.serve)
+        return
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env["DATABASE_URI"] = f"sqlite:///{workdir}/bench_static_delivery.db"
+    env["STORAGE_DIR"] = f"{workdir}/storage"
+    cmd = [sys.executable, __file__, "--large-mb", str(args.large_mb), "--avatars", str(args.avatars),
+           "--avatar-kb", str(args.avatar_kb)]
+    out = subprocess.run(cmd + ["--seed"], env=env, check=True, capture_output=True, text=True).stdout
+    files = json.loads(out.strip().splitlines()[-1])
+
+    print(f"{args.concurrency} 个并发客户端，每个场景 {args.seconds}s；"
+          f"大文件 {args.large_mb}MB，小文件 {args.avatars} 个 × {args.avatar_kb}KB")
+    print(f"{'mode':<10}{'scenario':<12}{'req/s':>10}{'MB/s':>10}{'p50':>10}{'p99':>10}{'errors':>8}")
+    for mode in MODES:
+        port = free_port()
+        env["STORAGE_SENDFILE_ENABLED"] = "1" if mode == "sendfile" else "0"
+        server = subprocess.Popen([sys.executable, __file__, "--serve", str(port)], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            for scenario in SCENARIOS:
+                r = run_scenario(port, scenario, files, args)
+                print(f"{mode:<10}{scenario:<12}{r['rps']:>10,.0f}{r['mbps']:>10,.1f}"
+                      f"{r['p50']:>8.1f}ms{r['p99']:>8.1f}ms{r['errors']:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+可复现的合成数据集：用户、好友关系、群与消息（同一组参数与 seed 生成完全相同的数据）
+
+    python benchmarks/dataset.py --out /tmp/linkin-bench.db --users 5000 --messages 500000
+
+  users          用户数（user_id 1..users）
+  friend_degree  每个用户的好友数：用户 i 与 i±1..i±degree/2（取模）互为好友
+  group_sizes    群规模，按顺序循环分配给 groups 个群；成员随机抽取
+  messages       消息总数，group_ratio 为群消息占比；私聊在随机一对好友间、群消息由随机成员发出
+  unread_ratio   最新的这部分消息未读（私聊 is_read = 0，群成员的已读序号停在其之前）
+
+探测用户（probe_user，user_id 1）加入所有群，作为基准中“重度用户”的视角。
+插入直接走 DB-API 批量执行，不经过控制器；消息全文索引由触发器维护，会话读模型最后用 rebuild_conversations 生成。
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+WORDS = [
+    "今天", "明天", "晚上", "一起", "吃饭", "开会", "项目", "进度", "文件", "发你",
+    "收到", "好的", "谢谢", "周末", "电影", "加班", "需求", "上线", "测试", "回家",
+    "hello", "meeting", "deploy", "review", "dinner", "report", "release", "ticket",
+]
+PROBE_USER = 1
+# 消息时间从该时刻起按 id 均匀递增（不依赖当前时间，保证可复现）
+EPOCH = datetime(2024, 1, 1)
+_BATCH = 20_000
+
+
+def _insert(conn, sql, rows):
+    for i in range(0, len(rows), _BATCH):
+        conn.exec_driver_sql(sql, rows[i:i + _BATCH])
+
+
+def generate(db, users=1000, friend_degree=20, group_sizes=(10, 50, 200), groups=30, messages=50_000,
+             group_ratio=0.4, unread_ratio=0.02, days=365, seed=42):
+    """
+    在当前应用上下文的空数据库中生成数据集。返回描述信息：
+    {"probe_user", "hot_pair": (a, b) 消息最多的一对好友, "largest_group": (group_id, 人数), "counts": {...}}
+    """
+    from services.conversation_service import rebuild_conversations
+
+    rnd = random.Random(seed)
+    conn = db.session.connection()
+    _insert(conn, "INSERT INTO users (id, link_id, nickname, created_at) VALUES (?, ?, ?, ?)",
+            [(i, str(10_000_000 + i), f"user{i}", EPOCH) for i in range(1, users + 1)])
+
+    half = max(1, friend_degree // 2)
+    pairs = sorted({(min(i, j), max(i, j)) for i in range(1, users + 1)
+                    for j in ((i - 1 + k) % users + 1 for k in range(1, half + 1)) if i != j})
+    _insert(conn, "INSERT INTO friendships (user_id, friend_id, created_at) VALUES (?, ?, ?)",
+            [(a, b, EPOCH) for a, b in pairs] + [(b, a, EPOCH) for a, b in pairs])
+
+    members = {}
+    for g in range(1, groups + 1):
+        size = min(group_sizes[(g - 1) % len(group_sizes)], users)
+        chosen = set(rnd.sample(range(1, users + 1), size))
+        chosen.discard(PROBE_USER)
+        members[g] = [PROBE_USER] + sorted(chosen)[:size - 1]
+    _insert(conn, "INSERT INTO groups (id, group_name, owner_id, last_seq, created_at) VALUES (?, ?, ?, 0, ?)",
+            [(g, f"group{g}", ids[0], EPOCH) for g, ids in members.items()])
+    _insert(conn, "INSERT INTO group_members (group_id, user_id, role, joined_at) VALUES (?, ?, ?, ?)",
+            [(g, uid, "owner" if k == 0 else "member", EPOCH) for g, ids in members.items()
+             for k, uid in enumerate(ids)])
+
+    step = timedelta(days=days) / max(messages, 1)
+    unread_from = int(messages * (1 - unread_ratio))
+    seqs, read_seqs, pair_counts = Counter(), {}, Counter()
+    rows = []
+    for i in range(messages):
+        text = " ".join(rnd.choices(WORDS, k=rnd.randint(2, 8)))
+        created = EPOCH + step * i
+        if members and rnd.random() < group_ratio:
+            g = rnd.randint(1, groups)
+            seqs[g] += 1
+            if i < unread_from:
+                read_seqs[g] = seqs[g]
+            rows.append((rnd.choice(members[g]), None, g, seqs[g], text, True, created))
+        else:
+            a, b = rnd.choice(pairs)
+            pair_counts[(a, b)] += 1
+            sender, receiver = (a, b) if rnd.random() < 0.5 else (b, a)
+            rows.append((sender, receiver, None, None, text, i < unread_from, created))
+        if len(rows) == _BATCH:
+            _insert_messages(conn, rows)
+            rows = []
+    _insert_messages(conn, rows)
+    _insert(conn, "UPDATE groups SET last_seq = ? WHERE id = ?", [(s, g) for g, s in seqs.items()])
+    _insert(conn, "INSERT INTO user_group_read (user_id, group_id, last_read_message_id, last_read_seq, own_since_read)"
+            " VALUES (?, ?, 0, ?, 0)",
+            [(uid, g, read_seqs.get(g, 0)) for g, ids in members.items() for uid in ids])
+    db.session.commit()
+    rebuild_conversations()
+
+    largest = max(members, key=lambda g: len(members[g])) if members else None
+    return {
+        "probe_user": PROBE_USER,
+        "hot_pair": pair_counts.most_common(1)[0][0] if pair_counts else None,
+        "largest_group": (largest, len(members[largest])) if largest else None,
+        "counts": {"users": users, "friendships": len(pairs), "groups": groups, "messages": messages},
+    }
+
+
+def _insert_messages(conn, rows):
+    if rows:
+        conn.exec_driver_sql(
+            "INSERT INTO messages (sender_id, receiver_id, group_id, seq, message_type, content, is_read, created_at)"
+            " VALUES (?, ?, ?, ?, 'text', ?, ?, ?)", rows)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--out", required=True, help="生成的 SQLite 文件（不能已存在）")
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--friend-degree", type=int, default=20)
+    p.add_argument("--group-sizes", default="10,50,200", help="群规模，逗号分隔")
+    p.add_argument("--groups", type=int, default=30)
+    p.add_argument("--messages", type=int, default=50_000)
+    p.add_argument("--group-ratio", type=float, default=0.4)
+    p.add_argument("--seed", type=int, default=42)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    out = Path(args.out).resolve()
+    if out.exists():
+        sys.exit(f"{out} 已存在")
+    os.environ["DATABASE_URI"] = f"sqlite:///{out}"
+    os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp())
+    from app import app
+    from config.database import db
+
+    with app.app_context():
+        t = time.perf_counter()
+        info = generate(db, users=args.users, friend_degree=args.friend_degree,
+                        group_sizes=[int(x) for x in args.group_sizes.split(",")], groups=args.groups,
+                        messages=args.messages, group_ratio=args.group_ratio, seed=args.seed)
+    print(f"已生成 {out}（{time.perf_counter() - t:.1f}s）：{info}")
+
+
+if __name__ == "__main__":
+    main()
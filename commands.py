@@ -0,0 +1,127 @@
+"""
+命令行维护任务（flask --app app <command>）
+"""
+import os
+
+import click
+
+
+def register_commands(app):
+    @app.cli.command("rebuild-conversations")
+    @click.option("--user-id", type=int, default=None, help="仅重建指定用户，默认全部")
+    def rebuild_conversations(user_id):
+        """按好友关系、群成员与 messages 表重建会话列表（含未读数）"""
+        from services.conversation_service import rebuild_conversations as rebuild
+        n = rebuild(user_id)
+        click.echo(f"已重建会话 {n} 条")
+
+    @app.cli.command("rebuild-group-seq")
+    def rebuild_group_seq():
+        """按 id 顺序重排群消息序号，并换算各成员的已读序号"""
+        from services.notification_service import rebuild_group_sequences
+        n = rebuild_group_sequences()
+        click.echo(f"已重排 {n} 条群消息的序号")
+
+    @app.cli.command("gc-uploads")
+    @click.option("--max-age-hours", type=float, default=None, help="清理多久未续传的会话，默认 UPLOAD_SESSION_TTL_HOURS")
+    def gc_uploads(max_age_hours):
+        """清理过期未完成的分片上传"""
+        from services.file_service import gc_upload_sessions
+        n = gc_upload_sessions() if max_age_hours is None else gc_upload_sessions(max_age_hours)
+        click.echo(f"已清理 {n} 个过期上传会话")
+
+    @app.cli.command("migrate-storage")
+    @click.option("--batch-size", type=int, default=200, help="每批改写引用并提交的文件数")
+    def migrate_storage(batch_size):
+        """把 uploads/、avatars/ 中的旧文件迁入内容寻址存储（可重复执行）"""
+        from services.file_service import migrate_legacy_files
+        stats = migrate_legacy_files(batch_size=batch_size)
+        click.echo(
+            f"已迁移 {stats['files']} 个文件，其中 {stats['deduplicated']} 个与已有内容重复"
+            f"（节省 {stats['bytes_saved'] / 1024 / 1024:.1f}MB），改写引用 {stats['references']} 处"
+        )
+
+    @app.cli.command("gc-blobs")
+    @click.option("--grace-hours", type=float, default=None, help="无引用文件的保留时长，默认 BLOB_GC_GRACE_HOURS")
+    def gc_blobs(grace_hours):
+        """删除不再被消息或头像引用的存储文件"""
+        from services.file_service import gc_blobs as gc
+        n = gc() if grace_hours is None else gc(grace_hours)
+        click.echo(f"已删除 {n} 个无引用文件")
+
+    @app.cli.command("rebuild-search-index")
+    def rebuild_search_index():
+        """从 messages 表重建消息全文索引"""
+        from services.search_service import rebuild_search_index as rebuild
+        if rebuild():
+            click.echo("已重建消息全文索引")
+        else:
+            click.echo("FTS5 不可用，当前使用 LIKE 检索")
+
+    @app.cli.command("import-data")
+    @click.option("--users", "users_path", type=click.Path(exists=True, dir_okay=False),
+                  help="用户文件：nickname, link_id, password / password_hash")
+    @click.option("--friendships", "friendships_path", type=click.Path(exists=True, dir_okay=False),
+                  help="好友关系文件：user, friend（通讯码）")
+    @click.option("--groups", "groups_path", type=click.Path(exists=True, dir_okay=False),
+                  help="群组文件：group_name, owner, members（通讯码）")
+    @click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None, help="默认按扩展名判断")
+    @click.option("--batch-size", type=int, default=5000, help="每个事务写入的行数")
+    @click.option("--workers", type=int, default=os.cpu_count() or 1, help="并行哈希密码的进程数")
+    @click.option("--bcrypt-rounds", type=int, default=None,
+                  help="默认 BCRYPT_ROUNDS；调低可加快导入，用户下次登录时按当前成本重新哈希")
+    @click.option("--id-map", type=click.Path(dir_okay=False, writable=True), default=None,
+                  help="写出自动分配的通讯码（CSV：row, nickname, link_id）")
+    def import_data(users_path, friendships_path, groups_path, fmt, batch_size, workers, bcrypt_rounds, id_map):
+        """从 CSV / JSONL 批量导入用户、好友关系与群组（按批事务写入，可重复执行）"""
+        import csv
+        from config.settings import BCRYPT_ROUNDS
+        from services import import_service
+
+        last_report = [0.0]
+
+        def progress(label, stats):
+            # 每秒最多输出一次进度
+            if stats["seconds"] - last_report[0] >= 1:
+                last_report[0] = stats["seconds"]
+                click.echo(f"  {label}: {stats['rows']:,} 行，已导入 {stats['imported']:,}，"
+                           f"{stats['rows'] / stats['seconds']:,.0f} 行/s")
+
+        def summary(label, stats):
+            last_report[0] = 0.0
+            seconds = stats.get("seconds") or 0
+            rate = stats["rows"] / seconds if seconds else 0
+            click.echo(f"{label}: {stats['rows']:,} 行，导入 {stats['imported']:,}，跳过 {stats['skipped']:,}，"
+                       f"用时 {seconds:.1f}s（{rate:,.0f} 行/s）")
+
+        if users_path:
+            map_file = open(id_map, "w", newline="", encoding="utf-8") if id_map else None
+            try:
+                writer = None
+                if map_file is not None:
+                    writer = csv.writer(map_file)
+                    writer.writerow(["row", "nickname", "link_id"])
+                stats = import_service.import_users(
+                    import_service.read_rows(users_path, fmt), batch_size=batch_size, workers=workers,
+                    rounds=bcrypt_rounds or BCRYPT_ROUNDS, id_map=writer, progress=progress,
+                )
+            finally:
+                if map_file is not None:
+                    map_file.close()
+            summary("用户", stats)
+        if friendships_path:
+            stats = import_service.import_friendships(
+                import_service.read_rows(friendships_path, fmt), batch_size=batch_size, progress=progress)
+            summary("好友关系", stats)
+        if groups_path:
+            stats = import_service.import_groups(
+                import_service.read_rows(groups_path, fmt), batch_size=batch_size, progress=progress)
+            summary("群组", stats)
+
+    @app.cli.command("archive-messages")
+    @click.option("--older-than-days", type=float, default=None, help="归档多少天之前的消息，默认 ARCHIVE_AFTER_DAYS")
+    def archive_messages(older_than_days):
+        """把旧消息移出 messages 表，按会话写入压缩的冷数据分段（历史接口透明读取，可重复执行）"""
+        from services.archive_service import archive_messages as archive
+        stats = archive() if older_than_days is None else archive(older_than_days)
+        click.echo(f"已归档 {stats['chats']} 个会话的 {stats['messages']} 条消息，新增分段 {stats['segments']} 个")
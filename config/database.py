@@ -2,21 +2,125 @@
 数据库配置与会话管理
 """
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateColumn
 
-db = SQLAlchemy()
+# production 配置下只读连接池的 bind key
+READ_BIND = "reader"
+
+
+class RoutingSession(Session):
+    """
+    读写分流会话（仅在配置了 READ_BIND 时生效）：
+    事务尚未写入时 SELECT 走只读连接池；flush、写语句以及写入之后同一事务内的读取走写连接，
+    保证读到自己的写入。事务结束后重新按只读处理。
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and READ_BIND in self._db.engines:
+            if not self._flushing and not self.info.get("wrote") and getattr(clause, "is_select", False):
+                return self._db.engines[READ_BIND]
+            self.info["wrote"] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_write_flag(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("wrote", None)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = None
 
 
+def _is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def _sqlite_pragmas(read_only):
+    """production 配置下每个新连接执行的 PRAGMA"""
+    from config.settings import SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE
+
+    pragmas = [
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA synchronous=NORMAL",  # WAL 下只在检查点 fsync，掉电最多丢失最近的事务，不会损坏数据库
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=1")
+    else:
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")  # 持久化在数据库文件中，由写连接设置即可
+    return pragmas
+
+
+def _install_pragmas(engine, read_only):
+    pragmas = _sqlite_pragmas(read_only)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def _add_missing_columns(engine):
+    """
+    create_all 不会给已存在的表补列：按模型为旧库补建新增列（新增列须可空或带 server_default）。
+    返回补建的 "表名.列名" 集合。
+    """
+    added = set()
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}")
+                    added.add(f"{table.name}.{column.name}")
+    return added
+
+
+# 已被取代、不再读写的旧表：升级已有数据库时删除（unread_counters 由 conversations 会话读模型取代）
+_RETIRED_TABLES = ("unread_counters",)
+
+
+def _drop_retired_tables(engine):
+    """删除 _RETIRED_TABLES 中仍存在的表（其索引随表一并删除），返回删除的表名列表"""
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        present = [name for name in _RETIRED_TABLES if inspect(conn).has_table(name)]
+        for name in present:
+            conn.exec_driver_sql(f"DROP TABLE {preparer.quote(name)}")
+    return present
+
+
 def init_db(app):
     """初始化数据库扩展"""
-    from config.settings import DATABASE_URI, SQLITE_PATH
-    
+    from config.settings import DATABASE_URI, SQLITE_PATH, DATABASE_PROFILE, DATABASE_READ_POOL_SIZE
+
     app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
     if "sqlite" in DATABASE_URI and SQLITE_PATH:
         SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    production = DATABASE_PROFILE == "production" and _is_sqlite_file(DATABASE_URI)
+    if production:
+        # SQLite 同一时刻只允许一个写者：写入串行经过唯一的写连接，不在库内争抢写锁；
+        # 读连接池不设上限（超出 pool_size 的连接用完即关），读请求不会排队等待连接
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_size": 1, "max_overflow": 0}
+        app.config["SQLALCHEMY_BINDS"] = {
+            READ_BIND: {"url": DATABASE_URI, "pool_size": DATABASE_READ_POOL_SIZE, "max_overflow": -1},
+        }
     db.init_app(app)
-    
+
     # 可选：Flask-Migrate（若已安装）
     try:
         from flask_migrate import Migrate  # type: ignore
@@ -24,9 +128,29 @@ def init_db(app):
         migrate = Migrate(app, db)
     except ImportError:
         pass
-    
+
     with app.app_context():
-        from models import user, message, friendship, group  # noqa: F401 - ensure UserGroupRead created
+        if production:
+            _install_pragmas(db.engine, read_only=False)
+            _install_pragmas(db.engines[READ_BIND], read_only=True)
+        from models import user, message, friendship, group, conversation, blob  # noqa: F401 - ensure UserGroupRead created
+        had_conversations = inspect(db.engine).has_table("conversations")
         db.create_all()
-    
+        added = _add_missing_columns(db.engine)
+        for name in _drop_retired_tables(db.engine):
+            print(f"[DB] 已删除不再使用的旧表 {name}")
+        # create_all 不会为已存在的表补建新增的索引
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+        from services.search_service import init_search_index
+        init_search_index(db.engine)
+        if "messages.seq" in added:
+            from services.notification_service import rebuild_group_sequences
+            rebuild_group_sequences()
+        if not had_conversations:
+            # 会话读模型首次建立：从已有好友关系、群成员与消息构建
+            from services.conversation_service import rebuild_conversations
+            rebuild_conversations()
+
     return db
@@ -11,19 +11,103 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SQLITE_PATH = BASE_DIR / "database" / "linkin.db"
 DATABASE_URI = os.environ.get("DATABASE_URI") or f"sqlite:///{SQLITE_PATH}"
 
+# SQLite 运行配置：default 保持 SQLite 默认行为；production 启用 WAL 与调优后的 PRAGMA，
+# 并拆分读写引擎（SELECT 走只读连接池，写入串行经过唯一的写连接）
+DATABASE_PROFILE = os.environ.get("DATABASE_PROFILE", "default")
+DATABASE_READ_POOL_SIZE = int(os.environ.get("DATABASE_READ_POOL_SIZE", 8))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
 # 安全
 SECRET_KEY = os.environ.get("SECRET_KEY") or "linkin-dev-secret-key-change-in-production"
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_HOURS = 24 * 7  # 7 天
 
+# 消息写入组提交：窗口内到达的消息合并为一个事务（SQLite 下减少 fsync 次数），默认关闭
+GROUP_COMMIT_ENABLED = os.environ.get("GROUP_COMMIT_ENABLED", "").lower() in ("1", "true", "yes")
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("GROUP_COMMIT_WINDOW_MS", 3))
+GROUP_COMMIT_MAX_ROWS = int(os.environ.get("GROUP_COMMIT_MAX_ROWS", 256))
+
+# 密码哈希：bcrypt 成本因子（变更后用户下次登录时自动按新成本重新哈希）
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+# 密码计算在独立原生线程池中执行，避免阻塞 eventlet hub；排队超过上限时直接拒绝
+PASSWORD_HASH_THREADS = int(os.environ.get("PASSWORD_HASH_THREADS", 4))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64))
+
+# 认证缓存（token 声明缓存至 exp；用户快照另有 TTL，资料更新时主动失效）
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", 10000))
+AUTH_USER_CACHE_TTL_SECONDS = int(os.environ.get("AUTH_USER_CACHE_TTL_SECONDS", 300))
+
+# 好友关系与群成员缓存（写路径提交后主动失效，TTL 兜底多进程下丢失的失效消息）
+RELATION_CACHE_MAX_ENTRIES = int(os.environ.get("RELATION_CACHE_MAX_ENTRIES", 10000))
+RELATION_CACHE_TTL_SECONDS = int(os.environ.get("RELATION_CACHE_TTL_SECONDS", 300))
+
 # 文件存储
-UPLOAD_DIR = BASE_DIR / "storage" / "uploads"
-AVATAR_DIR = BASE_DIR / "storage" / "avatars"
+STORAGE_DIR = Path(os.environ.get("STORAGE_DIR") or BASE_DIR / "storage")
+UPLOAD_DIR = STORAGE_DIR / "uploads"
+AVATAR_DIR = STORAGE_DIR / "avatars"
+# 内容寻址存储：文件按 SHA-256 命名，存放在 blobs/<前2位>/<3-4位>/ 两级分片目录
+BLOB_DIR = STORAGE_DIR / "blobs"
+# 图片变体（缩略图、预览图）存放目录，按 <变体>/<前2位>/<3-4位>/<sha256> 分片
+VARIANT_DIR = STORAGE_DIR / "variants"
+# 未被引用的文件保留多久后才回收（覆盖"已上传、尚未发送"的窗口）
+BLOB_GC_GRACE_HOURS = float(os.environ.get("BLOB_GC_GRACE_HOURS", 24))
 MAX_FILE_SIZE_MB = 20
+MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024
+# 分片上传：未完成的上传保存在临时目录，超过 TTL 未续传的会话被清理
+UPLOAD_TMP_DIR = STORAGE_DIR / "tmp"
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+UPLOAD_SESSION_TTL_HOURS = float(os.environ.get("UPLOAD_SESSION_TTL_HOURS", 24))
+# /storage 下发：eventlet 服务器上不小于该字节数的文件用 os.sendfile 零拷贝发送（发送后关闭连接）
+STORAGE_SENDFILE_ENABLED = os.environ.get("STORAGE_SENDFILE_ENABLED", "1").lower() in ("1", "true", "yes")
+STORAGE_SENDFILE_MIN_BYTES = int(os.environ.get("STORAGE_SENDFILE_MIN_BYTES", 256 * 1024))
+# 图片变体（需 pip install pillow，未安装时只提供原图）：名称 -> (边长像素, crop 居中裁成正方形 / fit 按最长边缩放)
+IMAGE_VARIANTS = {"thumb": (128, "crop"), "preview": (720, "fit")}
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))  # 上传后后台生成变体的线程数
+IMAGE_MAX_PENDING = int(os.environ.get("IMAGE_MAX_PENDING", 256))  # 后台排队上限，超出的留给按需生成
+IMAGE_LAZY_MAX_CONCURRENT = int(os.environ.get("IMAGE_LAZY_MAX_CONCURRENT", 2))  # 请求时按需生成的并发上限
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 40_000_000))  # 超过该像素数的图片不处理
 ALLOWED_EXTENSIONS = None  # None 表示允许所有文件类型
 
+# 冷数据归档：早于 ARCHIVE_AFTER_DAYS 的消息由 archive-messages 移出 messages 表，
+# 按会话写入 gzip 压缩的分段文件（每段至多 ARCHIVE_SEGMENT_MESSAGES 条），历史接口翻页越过热数据时透明读取
+ARCHIVE_DIR = STORAGE_DIR / "archive"
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_SEGMENT_MESSAGES = int(os.environ.get("ARCHIVE_SEGMENT_MESSAGES", 1000))
+ARCHIVE_CACHE_SEGMENTS = int(os.environ.get("ARCHIVE_CACHE_SEGMENTS", 64))  # 进程内缓存的已解压分段数
+
 # 通讯码长度
 LINK_ID_LENGTH = 8
+# 通讯码分配：每个进程一次预留的号段大小（进程重启时未用完的号段作废）
+LINK_ID_BLOCK_SIZE = int(os.environ.get("LINK_ID_BLOCK_SIZE", 64))
+
+# Socket.IO 多进程消息总线（为空则单进程内存模式）
+# unix:///tmp/linkin-bus.sock —— 单机多进程，需先运行 python -m services.message_bus
+# redis://127.0.0.1:6379/0     —— Redis 兼容服务，可跨主机
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE") or None
+SOCKETIO_CHANNEL = os.environ.get("SOCKETIO_CHANNEL", "linkin")
+
+# 指标（默认关闭）：GET /metrics 输出 Prometheus 文本格式，须同时设置 METRICS_TOKEN 并携带 Authorization: Bearer <token>，
+# 未设置令牌时不注册该端点（路由名、连接数、缓存规模等不对外暴露）
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+
+# 请求级 SQL 分析（services/sql_profiler.py）：off / sample（按比例抽样）/ strict（超出查询预算即报错，用于开发与测试）
+SQL_PROFILE_MODE = os.environ.get("SQL_PROFILE_MODE", "off").lower()
+SQL_PROFILE_SAMPLE_RATE = float(os.environ.get("SQL_PROFILE_SAMPLE_RATE", "0.01"))
+# 设置后携带 X-SQL-Profile: <token> 的请求在任何模式下都会被分析，摘要写入响应头
+SQL_PROFILE_TOKEN = os.environ.get("SQL_PROFILE_TOKEN") or None
+# 未用 @query_budget 声明的路由的默认查询预算（条数）；同一 SELECT 形状重复达到阈值视为疑似 N+1
+SQL_QUERY_BUDGET = int(os.environ.get("SQL_QUERY_BUDGET", "20"))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+
+# 链路追踪（services/tracing.py）：按比例采样 HTTP 请求，0 为关闭；
+# 导出到内存（GET /debug/traces，同样须设置 METRICS_TOKEN）或文件（每条链路一行 JSON；不放在对外提供的 storage 目录下）
+TRACING_SAMPLE_RATE = float(os.environ.get("TRACING_SAMPLE_RATE", "0"))
+TRACING_EXPORTER = os.environ.get("TRACING_EXPORTER", "memory").lower()
+TRACING_FILE = os.environ.get("TRACING_FILE", str(BASE_DIR / "logs" / "traces.jsonl"))
+TRACING_BUFFER_SIZE = int(os.environ.get("TRACING_BUFFER_SIZE", "1000"))
 
 # CORS（开发时可放宽）
 CORS_ORIGINS = ["*"]
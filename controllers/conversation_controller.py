@@ -0,0 +1,52 @@
+"""
+会话列表业务逻辑
+"""
+from datetime import datetime
+
+from config.database import db
+from models.conversation import Conversation
+from models.group import Group
+from models.user import User
+
+
+def _encode_cursor(conv):
+    return f"{conv.last_active_at.isoformat()}_{conv.id}"
+
+
+def _decode_cursor(cursor):
+    try:
+        ts, conv_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(ts), int(conv_id)
+    except (ValueError, AttributeError):
+        return None
+
+
+def get_conversations(user_id, limit=50, before=None):
+    """
+    会话列表，按最后活跃时间倒序；一次查询走 (user_id, last_active_at, id) 索引并带出好友/群资料。
+    before 为上一页返回的 next_cursor。返回 ({"conversations": [...], "next_cursor": str|None}, err)
+    """
+    q = db.session.query(Conversation, User, Group).outerjoin(
+        User, (Conversation.chat_type == "user") & (User.id == Conversation.chat_id),
+    ).outerjoin(
+        Group, (Conversation.chat_type == "group") & (Group.id == Conversation.chat_id),
+    ).filter(Conversation.user_id == user_id)
+    if before:
+        decoded = _decode_cursor(before)
+        if decoded is None:
+            return None, "无效的游标"
+        ts, conv_id = decoded
+        q = q.filter(db.or_(  # type: ignore
+            Conversation.last_active_at < ts,
+            (Conversation.last_active_at == ts) & (Conversation.id < conv_id),
+        ))
+    rows = q.order_by(Conversation.last_active_at.desc(), Conversation.id.desc()).limit(limit).all()
+
+    items = []
+    for conv, user, group in rows:
+        d = conv.to_dict()
+        d["user"] = user.to_dict() if user else None
+        d["group"] = group.to_dict() if group else None
+        items.append(d)
+    next_cursor = _encode_cursor(rows[-1][0]) if len(rows) == limit else None
+    return {"conversations": items, "next_cursor": next_cursor}, None
@@ -4,21 +4,31 @@
 from config.database import db
 from models.user import User
 from models.friendship import Friendship
+from services import relation_cache, archive_service
+from services.conversation_service import open_conversation, delete_conversations
 
 
 def get_friends(user_id):
     """获取用户好友列表"""
-    rows = Friendship.query.filter(Friendship.user_id == user_id).all()
-    return [r.friend.to_dict() for r in rows if r.friend]
+    # 一次 JOIN 取出好友，避免逐条懒加载 Friendship.friend
+    users = (
+        User.query.join(Friendship, Friendship.friend_id == User.id)
+        .filter(Friendship.user_id == user_id)
+        .order_by(Friendship.id)
+        .all()
+    )
+    return [u.to_dict() for u in users]
+
+
+def get_friend_ids(user_id):
+    """好友 user_id 列表（读关系缓存）"""
+    return list(relation_cache.friend_ids(user_id))
 
 
 def is_friend(user_id, friend_id):
     if user_id == friend_id:
         return True
-    return Friendship.query.filter(
-        Friendship.user_id == user_id,
-        Friendship.friend_id == friend_id,
-    ).first() is not None
+    return friend_id in relation_cache.friend_ids(user_id)
 
 
 def add_friend(user_id, friend_id):
@@ -29,7 +39,10 @@ def add_friend(user_id, friend_id):
     f1 = Friendship(user_id=user_id, friend_id=friend_id)
     f2 = Friendship(user_id=friend_id, friend_id=user_id)
     db.session.add_all([f1, f2])
+    open_conversation(user_id, "user", friend_id)
+    open_conversation(friend_id, "user", user_id)
     db.session.commit()
+    relation_cache.invalidate_friends(user_id, friend_id)
     return True, None
 
 
@@ -42,11 +55,20 @@ def remove_friend(user_id, friend_id, clear_history=False):
     ).delete(synchronize_session=False)
     if clear_history:
         from models.message import Message
-        Message.query.filter(
+        from services.file_service import release_files
+        history = Message.query.filter(
             ((Message.sender_id == user_id) & (Message.receiver_id == friend_id))
             | ((Message.sender_id == friend_id) & (Message.receiver_id == user_id))
-        ).delete(synchronize_session=False)
+        )
+        release_files(p for (p,) in history.with_entities(Message.file_path).filter(Message.file_path.isnot(None)))  # type: ignore
+        history.delete(synchronize_session=False)
+        archived = archive_service.drop_chat(archive_service.private_key(user_id, friend_id))
+    delete_conversations("user", friend_id, user_id=user_id)
+    delete_conversations("user", user_id, user_id=friend_id)
     db.session.commit()
+    if clear_history:
+        archive_service.unlink_segments(archived)
+    relation_cache.invalidate_friends(user_id, friend_id)
     return True, None
 
 
@@ -6,21 +6,17 @@ from models.group import Group, GroupMember, UserGroupRead
 from models.message import Message
 from models.user import User
 from controllers.friend_controller import is_friend
+from services import relation_cache, archive_service
+from services.conversation_service import open_conversation, open_conversations, delete_conversations
+from services.file_service import release_files
 
 
 def is_member(user_id, group_id):
-    return GroupMember.query.filter(
-        GroupMember.group_id == group_id,
-        GroupMember.user_id == user_id,
-    ).first() is not None
+    return user_id in relation_cache.member_roles(group_id)
 
 
 def get_member_role(user_id, group_id):
-    m = GroupMember.query.filter(
-        GroupMember.group_id == group_id,
-        GroupMember.user_id == user_id,
-    ).first()
-    return m.role if m else None
+    return relation_cache.member_roles(group_id).get(user_id)
 
 
 def create_group(owner_id, group_name, member_ids=None):
@@ -28,12 +24,15 @@ def create_group(owner_id, group_name, member_ids=None):
     group = Group(owner_id=owner_id, group_name=group_name)
     db.session.add(group)
     db.session.flush()
-    owner_member = GroupMember(group_id=group.id, user_id=owner_id, role="owner")
-    db.session.add(owner_member)
-    for uid in member_ids:
-        if uid != owner_id and is_friend(owner_id, uid):
-            db.session.add(GroupMember(group_id=group.id, user_id=uid, role="member"))
+    user_ids = [owner_id] + [uid for uid in dict.fromkeys(member_ids) if uid != owner_id and is_friend(owner_id, uid)]
+    # 成员与会话各一条 executemany 写入（不需要回填 ORM 对象的主键）
+    db.session.execute(db.insert(GroupMember), [
+        {"group_id": group.id, "user_id": uid, "role": "owner" if uid == owner_id else "member"} for uid in user_ids
+    ])
+    open_conversations(user_ids, "group", group.id)
     db.session.commit()
+    # 群 ID 可能复用已解散群的 ID，清除可能存在的旧条目
+    relation_cache.invalidate_group(group.id)
     return group, None
 
 
@@ -48,7 +47,9 @@ def invite_member(operator_id, group_id, user_id):
     if not is_friend(operator_id, user_id):
         return None, "仅可邀请好友"
     db.session.add(GroupMember(group_id=group_id, user_id=user_id, role="member"))
+    open_conversation(user_id, "group", group_id)
     db.session.commit()
+    relation_cache.invalidate_group(group_id)
     return True, None
 
 
@@ -69,7 +70,9 @@ def kick_member(operator_id, group_id, user_id):
         GroupMember.group_id == group_id,
         GroupMember.user_id == user_id,
     ).delete()
+    delete_conversations("group", group_id, user_id=user_id)
     db.session.commit()
+    relation_cache.invalidate_group(group_id)
     return True, None
 
 
@@ -79,21 +82,50 @@ def dissolve_group(operator_id, group_id):
         return None, "群不存在"
     if g.owner_id != operator_id:
         return None, "仅群主可解散"
-    Message.query.filter(Message.group_id == group_id).delete(synchronize_session=False)  # type: ignore
+    history = Message.query.filter(Message.group_id == group_id)  # type: ignore
+    release_files(p for (p,) in history.with_entities(Message.file_path).filter(Message.file_path.isnot(None)))  # type: ignore
+    history.delete(synchronize_session=False)
+    archived = archive_service.drop_chat(archive_service.group_key(group_id))
     UserGroupRead.query.filter(UserGroupRead.group_id == group_id).delete(synchronize_session=False)  # type: ignore
+    delete_conversations("group", group_id)
     db.session.delete(g)
     db.session.commit()
+    archive_service.unlink_segments(archived)
+    relation_cache.invalidate_group(group_id)
     return True, None
 
 
 def get_user_groups(user_id):
-    members = GroupMember.query.filter(GroupMember.user_id == user_id).all()
-    return [m.group.to_dict() for m in members if m.group]
+    groups = (
+        Group.query.join(GroupMember, GroupMember.group_id == Group.id)
+        .filter(GroupMember.user_id == user_id)
+        .order_by(GroupMember.id)
+        .all()
+    )
+    return [g.to_dict() for g in groups]
+
+
+def get_user_group_ids(user_id):
+    """用户所在群的 ID 列表（仅查询 group_id 列）"""
+    rows = db.session.query(GroupMember.group_id).filter(GroupMember.user_id == user_id).all()
+    return [gid for (gid,) in rows]
+
+
+def get_group_member_ids(group_id):
+    """群成员 user_id 列表（读关系缓存）"""
+    return list(relation_cache.member_roles(group_id))
 
 
 def get_group_members(group_id, current_user_id):
     """获取群成员列表（仅群成员可调）"""
     if not is_member(current_user_id, group_id):
         return None
-    members = GroupMember.query.filter(GroupMember.group_id == group_id).all()
-    return [m.to_dict() for m in members]
+    # 成员与用户一次取出，避免逐个成员懒加载 GroupMember.user
+    rows = (
+        db.session.query(GroupMember, User)
+        .outerjoin(User, User.id == GroupMember.user_id)
+        .filter(GroupMember.group_id == group_id)
+        .order_by(GroupMember.id)
+        .all()
+    )
+    return [m.to_dict(user_dict=u.to_dict() if u else None) for m, u in rows]
@@ -3,65 +3,151 @@
 """
 from config.database import db
 from models.message import Message
-from models.group import UserGroupRead
+from models.user import User
 from controllers.friend_controller import is_friend
 from controllers.group import is_member
+from services.notification_service import next_group_seq, incr_own_group_message, advance_group_read
+from services.conversation_service import record_private_message, record_group_message, clear_unread
+from services import search_service, group_commit, archive_service, tracing
+from services.file_service import retain_file
 
 
+@tracing.traced
 def send_private_message(sender_id, receiver_id, content=None, file_path=None, file_name=None):
-    if not is_friend(sender_id, receiver_id):
+    with tracing.span("check.is_friend"):
+        allowed = is_friend(sender_id, receiver_id)
+    if not allowed:
         return None, "仅好友可发送消息"
     msg_type = "file" if file_path else "text"
-    msg = Message(
-        sender_id=sender_id,
-        receiver_id=receiver_id,
-        message_type=msg_type,
-        content=content,
-        file_path=file_path,
-        file_name=file_name,
-    )
-    db.session.add(msg)
-    db.session.commit()
-    return msg, None
+
+    def insert():
+        msg = Message(
+            sender_id=sender_id,
+            receiver_id=receiver_id,
+            message_type=msg_type,
+            content=content,
+            file_path=file_path,
+            file_name=file_name,
+        )
+        db.session.add(msg)
+        db.session.flush()
+        record_private_message(msg)
+        retain_file(file_path)
+        return msg
+
+    return group_commit.write(insert), None
 
 
+@tracing.traced
 def send_group_message(sender_id, group_id, content=None, file_path=None, file_name=None):
-    if not is_member(sender_id, group_id):
+    with tracing.span("check.is_member"):
+        allowed = is_member(sender_id, group_id)
+    if not allowed:
         return None, "您不在该群中"
     msg_type = "file" if file_path else "text"
-    msg = Message(
-        sender_id=sender_id,
-        group_id=group_id,
-        message_type=msg_type,
-        content=content,
-        file_path=file_path,
-        file_name=file_name,
-    )
-    db.session.add(msg)
-    db.session.commit()
-    return msg, None
 
+    def insert():
+        msg = Message(
+            sender_id=sender_id,
+            group_id=group_id,
+            seq=next_group_seq(group_id),
+            message_type=msg_type,
+            content=content,
+            file_path=file_path,
+            file_name=file_name,
+        )
+        db.session.add(msg)
+        db.session.flush()
+        record_group_message(msg)
+        incr_own_group_message(sender_id, group_id)
+        retain_file(file_path)
+        return msg
+
+    return group_commit.write(insert), None
 
-def get_private_messages(user_id, other_id, unread_only=False, limit=100, offset=0):
-    q = Message.query.filter(
-        Message.group_id.is_(None),  # type: ignore
-        db.or_(  # type: ignore
-            (Message.sender_id == user_id) & (Message.receiver_id == other_id),
-            (Message.sender_id == other_id) & (Message.receiver_id == user_id),
-        ),
-    ).order_by(Message.created_at.desc()).limit(limit).offset(offset)
+
+def get_private_messages(user_id, other_id, unread_only=False, limit=100, offset=0, before_id=None, after_id=None):
+    """
+    私聊历史，按时间正序返回。
+    before_id / after_id 为游标（Message.id）：before_id 向前翻取更早的消息，after_id 向后补取更新的消息；
+    两个方向各走一次 (receiver_id, sender_id, id) 索引范围扫描后合并，每页耗时与翻页深度无关。
+    越过热数据的部分从冷数据归档中读取（见 archive_service.read_through）。
+    offset 仅为兼容旧客户端保留（只查热数据）。
+    """
+    if offset:
+        q = Message.query.filter(
+            Message.group_id.is_(None),  # type: ignore
+            db.or_(  # type: ignore
+                (Message.sender_id == user_id) & (Message.receiver_id == other_id),
+                (Message.sender_id == other_id) & (Message.receiver_id == user_id),
+            ),
+        )
+        if unread_only:
+            q = q.filter(Message.is_read == False, Message.receiver_id == user_id)  # type: ignore
+        return list(reversed(q.order_by(Message.id.desc()).limit(limit).offset(offset).all()))
+
+    directions = [(other_id, user_id)]
+    if not unread_only and other_id != user_id:
+        directions.append((user_id, other_id))
+    rows = []
+    for sender_id, receiver_id in directions:
+        q = Message.query.filter(
+            Message.receiver_id == receiver_id,
+            Message.sender_id == sender_id,
+            Message.group_id.is_(None),  # type: ignore
+        )
+        if unread_only:
+            q = q.filter(Message.is_read == False)  # type: ignore
+        rows.extend(_keyset_page(q, limit, before_id, after_id))
+    page = _merge_page(rows, limit, after_id if before_id is None else None)
     if unread_only:
-        q = q.filter(Message.is_read == False, Message.receiver_id == user_id)  # type: ignore
-    return list(reversed(q.all()))
+        return page  # 归档消息视为已读
+    return archive_service.read_through(archive_service.private_key(user_id, other_id), page, limit, before_id, after_id)
 
 
-def get_group_messages(user_id, group_id, unread_only=False, limit=100, offset=0):
+def get_group_messages(user_id, group_id, unread_only=False, limit=100, offset=0, before_id=None, after_id=None):
+    """群聊历史，按时间正序返回；游标语义同 get_private_messages，走 (group_id, id) 索引"""
     if not is_member(user_id, group_id):
         return []
-    q = Message.query.filter(Message.group_id == group_id).order_by(Message.created_at.desc()).limit(limit).offset(offset)
+    q = Message.query.filter(Message.group_id == group_id)
     if unread_only:
         q = q.filter(Message.is_read == False)  # type: ignore
-    return list(reversed(q.all()))
+    if offset:
+        return list(reversed(q.order_by(Message.id.desc()).limit(limit).offset(offset).all()))
+    page = _merge_page(_keyset_page(q, limit, before_id, after_id), limit, after_id if before_id is None else None)
+    if unread_only:
+        return page
+    return archive_service.read_through(archive_service.group_key(group_id), page, limit, before_id, after_id)
+
+
+def _keyset_page(q, limit, before_id=None, after_id=None):
+    if before_id is not None:
+        q = q.filter(Message.id < before_id)
+    if after_id is not None:
+        q = q.filter(Message.id > after_id)
+    if after_id is not None and before_id is None:
+        return q.order_by(Message.id.asc()).limit(limit).all()
+    return q.order_by(Message.id.desc()).limit(limit).all()
+
+
+def _merge_page(rows, limit, after_id=None):
+    """合并（多个方向的）页结果：after_id 模式取最早的 limit 条，否则取最新的 limit 条；均按 id 正序返回"""
+    rows.sort(key=lambda m: m.id)
+    if after_id is not None:
+        return rows[:limit]
+    return rows[-limit:] if limit else []
+
+
+def next_cursor(messages, limit, after_id=None, before_id=None):
+    """
+    计算下一页游标：默认/before_id 模式返回本页最早消息 id（作为下一次的 before_id），
+    after_id 模式返回本页最新消息 id（作为下一次的 after_id）；没有更多时返回 None。
+    """
+    if len(messages) < limit:
+        return None
+    if after_id is not None and before_id is None:
+        return messages[-1].id
+    return messages[0].id
 
 
 def mark_as_read(user_id: int, chat_type: str = "user", chat_id=None):
@@ -73,31 +159,56 @@ def mark_as_read(user_id: int, chat_type: str = "user", chat_id=None):
         ]
         Message.query.filter(*criteria).update({"is_read": True}, synchronize_session=False)  # type: ignore
     else:
-        last_msg = Message.query.filter(Message.group_id == chat_id).order_by(Message.id.desc()).first()
-        if last_msg:
-            filters = [  # type: ignore
-                UserGroupRead.user_id == user_id,
-                UserGroupRead.group_id == chat_id,  # type: ignore
-            ]
-            rec = UserGroupRead.query.filter(*filters).first()  # type: ignore
-            if rec:
-                rec.last_read_message_id = max(rec.last_read_message_id, last_msg.id)
-            else:
-                db.session.add(UserGroupRead(
-                    user_id=user_id, group_id=int(chat_id) if chat_id else 0, last_read_message_id=last_msg.id
-                ))
+        last_id = db.session.query(db.func.max(Message.id)).filter(Message.group_id == chat_id).scalar()
+        if not last_id:
+            last_id = archive_service.last_archived_id(archive_service.group_key(int(chat_id)))
+        if last_id:
+            advance_group_read(user_id, int(chat_id), last_id)
+    clear_unread(user_id, "user" if chat_type == "user" else "group", chat_id)
     db.session.commit()
 
 
+def serialize_messages(messages, snippets=None):
+    """
+    批量序列化消息：一次查询取出本页全部发送者，避免逐条懒加载 Message.sender。
+    snippets: 可选 {message_id: 高亮片段}，用于搜索结果。
+    """
+    sender_ids = {m.sender_id for m in messages}
+    senders = {}
+    if sender_ids:
+        senders = {u.id: u.to_dict() for u in User.query.filter(User.id.in_(sender_ids)).all()}  # type: ignore
+    result = [m.to_dict(sender_dict=senders.get(m.sender_id)) for m in messages]
+    if snippets is not None:
+        for d in result:
+            d["snippet"] = snippets.get(d["id"], "")
+    return result
+
+
 def search_messages(user_id, keyword, limit=50):
-    """搜索当前用户可见的消息（私聊+群），按时间倒序"""
+    """
+    搜索当前用户可见的消息（私聊+群）。
+    关键字足够长且 FTS5 索引可用时走全文索引，按相关度排序；否则走 LIKE，按时间倒序。
+    返回 (messages, snippets)，snippets 为 {message_id: 高亮片段 HTML}。
+    """
     if not keyword or not keyword.strip():
-        return []
-    from controllers.friend_controller import get_friends
-    from controllers.group import get_user_groups
-    keyword = f"%{keyword.strip()}%"
-    friend_ids = [f["id"] for f in get_friends(user_id)]
-    group_ids = [g["id"] for g in get_user_groups(user_id)]
+        return [], {}
+    keyword = keyword.strip()
+    if search_service.can_use_fts(keyword):
+        hits = search_service.search_fts(user_id, keyword, limit=limit)
+        ids = [mid for mid, _ in hits]
+        by_id = {m.id: m for m in Message.query.filter(Message.id.in_(ids)).all()} if ids else {}  # type: ignore
+        return [by_id[mid] for mid in ids if mid in by_id], dict(hits)
+    messages = search_messages_like(user_id, keyword, limit=limit)
+    return messages, {m.id: search_service.highlight(m.content, keyword) for m in messages}
+
+
+def search_messages_like(user_id, keyword, limit=50):
+    """LIKE 子串检索（FTS5 不可用或关键字过短时使用），按时间倒序"""
+    from controllers.friend_controller import get_friend_ids
+    from controllers.group import get_user_group_ids
+    keyword = f"%{keyword}%"
+    friend_ids = get_friend_ids(user_id)
+    group_ids = get_user_group_ids(user_id)
     
     # 构建私聊条件
     if friend_ids:
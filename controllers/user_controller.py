@@ -1,11 +1,16 @@
 """
 用户业务逻辑
 """
+from sqlalchemy.exc import IntegrityError
+
 from config.database import db
 from models.user import User
+from services.file_service import retain_file, release_files
 from utils.id_generator import generate_link_id
 from utils.validators import is_valid_nickname, is_valid_link_id
 
+LINK_ID_MAX_ATTEMPTS = 3
+
 
 def get_user_by_id(user_id):
     return User.query.get(user_id)
@@ -18,20 +23,38 @@ def get_user_by_link_id(link_id):
 def create_user(nickname, link_id=None, password=None):
     if not is_valid_nickname(nickname):
         return None, "昵称无效"
-    if link_id and link_id.strip():
+    custom = bool(link_id and link_id.strip())
+    if custom:
+        link_id = link_id.strip()
         if not is_valid_link_id(link_id):
             return None, "通讯码必须为8位数字"
         if get_user_by_link_id(link_id):
             return None, "该通讯码已被使用"
-    else:
-        link_id = generate_link_id()
-    user = User(link_id=link_id, nickname=nickname.strip())
+    password_hash = None
     if password:
         from services.auth_service import hash_password
-        user.password_hash = hash_password(password)
-    db.session.add(user)
+        password_hash = hash_password(password)
+    # 分配的通讯码在预留时已剔除被占用的号，仅当恰好与之后自选的通讯码相撞时才会插入失败，换下一个号
+    for _ in range(LINK_ID_MAX_ATTEMPTS):
+        user = User(link_id=link_id if custom else generate_link_id(), nickname=nickname.strip(),
+                    password_hash=password_hash)
+        db.session.add(user)
+        try:
+            db.session.commit()
+            return user, None
+        except IntegrityError:
+            db.session.rollback()
+            if custom:
+                return None, "该通讯码已被使用"
+    return None, "通讯码分配失败，请重试"
+
+
+def set_password(user, password):
+    """按当前 bcrypt 成本因子重新设置密码哈希"""
+    from services.auth_service import hash_password
+    user.password_hash = hash_password(password)
     db.session.commit()
-    return user, None
+    return user
 
 
 def update_profile(user_id, nickname=None, avatar=None):
@@ -42,7 +65,11 @@ def update_profile(user_id, nickname=None, avatar=None):
         if not is_valid_nickname(nickname):
             return None, "昵称无效"
         user.nickname = nickname.strip()
-    if avatar is not None:
+    if avatar is not None and avatar != user.avatar:
+        release_files([user.avatar])
+        retain_file(avatar)
         user.avatar = avatar
     db.session.commit()
+    from services.auth_cache import invalidate_user
+    invalidate_user(user_id)
     return user, None
@@ -13,6 +13,14 @@ CREATE TABLE IF NOT EXISTS users (
 );
 CREATE INDEX IF NOT EXISTS ix_users_link_id ON users(link_id);
 
+-- link_id_sequences（通讯码分配计数器：通讯码 = 以 key 为密钥对序号的置换，各进程按号段预留 next_value）
+CREATE TABLE IF NOT EXISTS link_id_sequences (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    length INTEGER NOT NULL UNIQUE,
+    key VARCHAR(64) NOT NULL,
+    next_value INTEGER NOT NULL DEFAULT 0
+);
+
 -- friendships
 CREATE TABLE IF NOT EXISTS friendships (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -28,6 +36,7 @@ CREATE TABLE IF NOT EXISTS groups (
     group_name VARCHAR(128) NOT NULL,
     group_avatar VARCHAR(256),
     owner_id INTEGER NOT NULL REFERENCES users(id),
+    last_seq INTEGER NOT NULL DEFAULT 0,
     created_at DATETIME
 );
 
@@ -47,6 +56,7 @@ CREATE TABLE IF NOT EXISTS messages (
     sender_id INTEGER NOT NULL REFERENCES users(id),
     receiver_id INTEGER REFERENCES users(id),
     group_id INTEGER REFERENCES groups(id),
+    seq INTEGER,
     message_type VARCHAR(16) NOT NULL DEFAULT 'text',
     content TEXT,
     file_path VARCHAR(512),
@@ -54,3 +64,84 @@ CREATE TABLE IF NOT EXISTS messages (
     is_read BOOLEAN DEFAULT 0,
     created_at DATETIME
 );
+CREATE INDEX IF NOT EXISTS ix_messages_sender_created ON messages(sender_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_messages_receiver_created ON messages(receiver_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_messages_group_created ON messages(group_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_messages_group_id ON messages(group_id, id);
+CREATE INDEX IF NOT EXISTS ix_messages_receiver_sender_id ON messages(receiver_id, sender_id, id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_messages_group_seq ON messages(group_id, seq);
+
+-- user_group_read（群已读位置；未读数 = groups.last_seq - last_read_seq - own_since_read）
+CREATE TABLE IF NOT EXISTS user_group_read (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    group_id INTEGER NOT NULL REFERENCES groups(id),
+    last_read_message_id INTEGER NOT NULL DEFAULT 0,
+    last_read_seq INTEGER NOT NULL DEFAULT 0,
+    own_since_read INTEGER NOT NULL DEFAULT 0,
+    UNIQUE(user_id, group_id)
+);
+
+-- conversations（会话读模型：每个用户的每个会话一行；漂移时执行 flask --app app rebuild-conversations 重建）
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    chat_type VARCHAR(8) NOT NULL,
+    chat_id INTEGER NOT NULL,
+    unread INTEGER NOT NULL DEFAULT 0,
+    last_message_id INTEGER,
+    last_sender_id INTEGER,
+    last_message_type VARCHAR(16),
+    last_preview VARCHAR(256),
+    last_active_at DATETIME NOT NULL,
+    UNIQUE(user_id, chat_type, chat_id)
+);
+CREATE INDEX IF NOT EXISTS ix_conversations_user_active ON conversations(user_id, last_active_at, id);
+CREATE INDEX IF NOT EXISTS ix_conversations_user_unread ON conversations(user_id, unread);
+
+-- blobs（内容寻址存储：文件存为 storage/blobs/<h[:2]>/<h[2:4]>/<sha256>，ref_count 为引用该内容的消息与头像数）
+CREATE TABLE IF NOT EXISTS blobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256 VARCHAR(64) NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_blobs_unreferenced ON blobs(ref_count, last_uploaded_at);
+
+-- blob_aliases（migrate-storage 迁移前的 uploads/、avatars/ 旧路径 -> 内容哈希）
+CREATE TABLE IF NOT EXISTS blob_aliases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path VARCHAR(512) NOT NULL UNIQUE,
+    sha256 VARCHAR(64) NOT NULL
+);
+
+-- image_variants（图片缩略图 / 预览图元数据；文件存为 storage/variants/<variant>/<h[:2]>/<h[2:4]>/<sha256>，mimetype 为空表示原图无法解码）
+CREATE TABLE IF NOT EXISTS image_variants (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256 VARCHAR(64) NOT NULL,
+    variant VARCHAR(16) NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    size INTEGER,
+    mimetype VARCHAR(32),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(sha256, variant)
+);
+
+-- message_segments（冷数据分段：archive-messages 把旧消息按会话写入 storage/archive 下 gzip 压缩的 JSON Lines 文件；
+-- 私聊 chat_id / peer_id 为双方 user_id（小者在前），群聊 chat_id 为 group_id、peer_id 为 0）
+CREATE TABLE IF NOT EXISTS message_segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_type VARCHAR(8) NOT NULL,
+    chat_id INTEGER NOT NULL,
+    peer_id INTEGER NOT NULL DEFAULT 0,
+    first_id INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    path VARCHAR(256) NOT NULL,
+    created_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS ix_message_segments_chat ON message_segments(chat_type, chat_id, peer_id, last_id);
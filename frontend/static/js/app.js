@@ -61,13 +61,37 @@ class APIClient {
   }
 
   async uploadFile(file) {
-    const form = new FormData();
-    form.append('file', file);
+    // 分片上传：网络中断或分片失败时按服务端已接收的偏移续传，不必从头再传
+    const init = await this.request('POST', '/uploads', { file_name: file.name, size: file.size });
+    if (init.code !== 0 || !init.data) return init;
+    const uploadId = init.data.upload_id;
+    const chunkSize = init.data.chunk_size;
+    let offset = init.data.offset;
+    let failures = 0;
+    while (offset < file.size) {
+      const res = await this.putChunk(uploadId, offset, file.slice(offset, offset + chunkSize));
+      if (res.code === 0) {
+        offset = res.data.offset;
+        failures = 0;
+        continue;
+      }
+      // 网络错误或偏移不一致可重试，其余错误（超限、会话不存在）直接返回
+      if ((res.code !== -1 && res.code !== 409) || ++failures > 5) return res;
+      await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+      const status = await this.request('GET', '/uploads/' + uploadId);
+      if (status.code === 0 && status.data) offset = status.data.offset;
+    }
+    return this.request('POST', '/uploads/' + uploadId + '/complete');
+  }
+
+  async putChunk(uploadId, offset, blob) {
+    const headers = { 'Content-Type': 'application/octet-stream' };
     const token = this.getToken();
-    const opts = { method: 'POST', body: form };
-    if (token) opts.headers = { 'Authorization': 'Bearer ' + token };
+    if (token) headers['Authorization'] = 'Bearer ' + token;
     try {
-      const response = await fetch(this.baseURL + '/upload', opts);
+      const response = await fetch(this.baseURL + '/uploads/' + uploadId + '?offset=' + offset, {
+        method: 'PUT', headers, body: blob,
+      });
       return await response.json();
     } catch (error) {
       return { code: -1, message: '网络错误', error };
@@ -98,6 +122,12 @@ const MessageUtils = {
     if (!fileInfo || !fileInfo.file_path) return '';
     return fileInfo.file_path.startsWith('http') ? fileInfo.file_path : ('/storage/' + fileInfo.file_path);
   },
+  // 图片变体路径，规则与服务端 file_service.variant_path 相同；非内容寻址图片返回空
+  variantPath(path, variant) {
+    const m = /^blobs\/([0-9a-f]{2})\/([0-9a-f]{2})\/([0-9a-f]{64})\.([a-z0-9]+)$/.exec(path || '');
+    if (!m || !this.isImageFile(path)) return '';
+    return 'variants/' + variant + '/' + m[1] + '/' + m[2] + '/' + m[3] + '.' + m[4];
+  },
   downloadFile(fileInfo) {
     if (!fileInfo || !fileInfo.file_path) return;
     const url = this.getFileUrl(fileInfo);
@@ -156,6 +186,7 @@ createApp({
       leftTab: 'chats',
       friends: [],
       groups: [],
+      conversations: [],  // /api/conversations，按最后活跃时间倒序
       unreadMap: {},  // key: 'user_2' | 'group_1', value: unread count
       chatList: [],
       currentChat: null,
@@ -205,7 +236,9 @@ createApp({
     avatarUrl(path) {
       if (!path) return '';
       if (path.startsWith('http')) return path;
-      // 使用缓存破坏参数，只在更新头像时改变
+      // 内容寻址路径随内容变化，可直接长期缓存；头像只需缩略图
+      if (path.startsWith('blobs/')) return '/storage/' + (MessageUtils.variantPath(path, 'thumb') || path);
+      // 旧路径使用缓存破坏参数，只在更新头像时改变
       return '/storage/' + path + '?v=' + this.avatarCacheBuster;
     },
     t(key, params) {
@@ -282,7 +315,7 @@ createApp({
         this.settingsForm.avatar = res.data.avatar;
         this.loadFriends();
         this.loadGroups();
-        this.loadUnreadSummary();
+        this.loadConversations();
         this.connectSocket();
       } else {
         this.logout();
@@ -296,16 +329,36 @@ createApp({
       const res = await request('GET', '/groups');
       if (res.code === 0) this.groups = res.data || [];
     },
-    async loadUnreadSummary() {
-      const res = await request('GET', '/messages/unread-summary');
+    async loadConversations() {
+      const res = await request('GET', '/conversations?limit=200');
       if (res.code !== 0 || !res.data) return;
       const map = {};
-      for (const it of res.data) {
-        const key = (it.chat_type === 'group' ? 'group_' : 'user_') + it.chat_id;
-        map[key] = it.unread;
+      for (const it of res.data.conversations) {
+        map[it.chat_type + '_' + it.chat_id] = it.unread;
       }
+      this.conversations = res.data.conversations;
       this.unreadMap = map;
     },
+    touchConversation(msg) {
+      // 新消息：更新对应会话的最后一条消息并移到列表顶部；列表中没有该会话时重新拉取
+      const isPrivate = msg.receiver_id != null;
+      const chatType = isPrivate ? 'user' : 'group';
+      const chatId = isPrivate
+        ? (msg.sender_id === this.currentUser.id ? msg.receiver_id : msg.sender_id)
+        : msg.group_id;
+      const idx = this.conversations.findIndex(c => c.chat_type === chatType && c.chat_id === chatId);
+      if (idx < 0) {
+        this.loadConversations();
+        return;
+      }
+      const preview = msg.message_type === 'file' ? msg.file_name : (msg.content || '');
+      const conv = {
+        ...this.conversations[idx],
+        last_message: { id: msg.id, sender_id: msg.sender_id, message_type: msg.message_type, preview },
+        last_active_at: msg.created_at,
+      };
+      this.conversations = [conv, ...this.conversations.filter((_, i) => i !== idx)];
+    },
     connectSocket() {
       if (this.socket) return;
       this.socket = io(location.origin, { 
@@ -321,6 +374,8 @@ createApp({
       });
       
       this.socket.on('authenticated', (data) => {
+        // 重连后补齐断线期间错过的消息
+        if (this.currentChat) this.loadMessages();
       });
       
       this.socket.on('auth_fail', (data) => {
@@ -334,6 +389,7 @@ createApp({
       });
       
       this.socket.on('new_message', (msg) => {
+        this.touchConversation(msg);
         const isPrivate = msg.receiver_id != null;
         const isReceiver = isPrivate
           ? msg.receiver_id === this.currentUser.id
@@ -346,6 +402,12 @@ createApp({
           (!isPrivate && msg.group_id === this.currentChat?.id)
         );
         if (isCurrent) {
+          // 群消息序号不连续说明中间有消息未送达（如断线期间），重新拉取最新一页
+          const last = this.messages[this.messages.length - 1];
+          if (!isPrivate && msg.seq && last && last.seq && msg.seq > last.seq + 1) {
+            this.loadMessages();
+            return;
+          }
           // 检查消息是否已存在（防止重复）
           if (!this.messages.some(m => m.id === msg.id)) {
             this.messages.push(msg);
@@ -369,11 +431,13 @@ createApp({
         }
         // 刷新好友列表
         this.loadFriends();
+        this.loadConversations();
       });
       
       this.socket.on('friend_removed', (data) => {
         // 刷新好友列表
         this.loadFriends();
+        this.loadConversations();
         // 如果正在和被删除的好友聊天，清空当前聊天
         if (this.currentChat && this.currentChat.type === 'user' && this.currentChat.id === data.friend_id) {
           this.currentChat = null;
@@ -394,6 +458,9 @@ createApp({
         this.friends = (this.friends || []).map(f => (
           f.id === updated.id ? { ...f, nickname: updated.nickname, avatar: updated.avatar, link_id: updated.link_id } : f
         ));
+        this.conversations = (this.conversations || []).map(c => (
+          c.chat_type === 'user' && c.chat_id === updated.id ? { ...c, user: { ...c.user, ...updated } } : c
+        ));
         if (this.currentChat && this.currentChat.type === 'user' && this.currentChat.id === updated.id) {
           const name = updated.nickname + (updated.link_id ? ('(' + updated.link_id + ')') : '');
           this.currentChat = { ...this.currentChat, name, avatar: updated.avatar };
@@ -410,11 +477,13 @@ createApp({
       this.socket.on('group_added', (data) => {
         if (data && data.message) showToast(data.message, 'success');
         this.loadGroups();
+        this.loadConversations();
       });
 
       this.socket.on('group_removed', (data) => {
         if (data && data.message) showToast(data.message, 'error');
         this.loadGroups();
+        this.loadConversations();
         if (this.currentChat && this.currentChat.type === 'group' && data && data.group_id === this.currentChat.id) {
           this.closeChat();
         }
@@ -468,7 +537,7 @@ createApp({
       showToast(this.t('toast.registerSuccess', { linkId: this.generatedLinkId }), 'success', 5000);
       this.loadFriends();
       this.loadGroups();
-      this.loadUnreadSummary();
+      this.loadConversations();
       this.connectSocket();
     },
     async login() {
@@ -496,7 +565,7 @@ createApp({
       showToast(this.t('toast.loginSuccess'), 'success');
       this.loadFriends();
       this.loadGroups();
-      this.loadUnreadSummary();
+      this.loadConversations();
       this.connectSocket();
     },
     logout() {
@@ -598,9 +667,9 @@ createApp({
         url = '/messages/private/' + this.currentChat.id;
       }
       const res = await request('GET', url);
-      this.messages = (res.code === 0 && res.data) ? res.data : [];
+      this.messages = (res.code === 0 && res.data) ? (res.data.messages || []) : [];
       await this.markChatRead(this.currentChat.type, this.currentChat.id);
-      this.loadUnreadSummary();
+      this.loadConversations();
       this.$nextTick(() => this.scrollToBottom());
     },
     scrollToBottom() {
@@ -630,6 +699,9 @@ createApp({
     fileDownloadUrl(m) {
       return MessageUtils.getFileUrl(m);
     },
+    imagePreviewUrl(m) {
+      return m.preview_path ? '/storage/' + m.preview_path : MessageUtils.getFileUrl(m);
+    },
     downloadFile(m) {
       MessageUtils.downloadFile(m);
     },
@@ -670,6 +742,7 @@ createApp({
         return;
       }
       this.groups.push(res.data);
+      this.loadConversations();
       this.showCreateGroup = false;
       this.createGroupName = '';
       this.createGroupMemberIds = [];
@@ -792,7 +865,7 @@ createApp({
       this.groups = this.groups.filter(g => g.id !== this.currentChat.id);
       this.currentChat = null;
       this.messages = [];
-      this.loadUnreadSummary();
+      this.loadConversations();
     },
     async searchFriend() {
       const kw = (this.searchKeyword || '').trim();
@@ -814,6 +887,7 @@ createApp({
       const addRes = await request('POST', '/friends/add', { friend_id: user.id });
       if (addRes.code === 0) {
         this.friends.push(user);
+        this.loadConversations();
         showToast(this.t('toast.addFriendSuccess', { name: user.nickname }), 'success');
       } else {
         showToast(addRes.message || this.t('toast.addFriendFail'), 'error');
@@ -858,30 +932,40 @@ createApp({
     },
     buildChatList() {
       const u = (key) => this.unreadMap[key] || 0;
-      this.chatList = [
-        ...(this.friends || []).map(f => ({
+      const preview = (m) => {
+        if (!m) return '';
+        return m.message_type === 'file' ? (this.t('chat.filePreview') + ' ' + (m.preview || '')) : (m.preview || '');
+      };
+      this.chatList = (this.conversations || []).map(c => {
+        const key = c.chat_type + '_' + c.chat_id;
+        if (c.chat_type === 'group') {
+          const g = c.group || {};
+          return {
+            type: 'group',
+            id: c.chat_id,
+            name: g.group_name,
+            avatar: g.group_avatar,
+            owner_id: g.owner_id,
+            key,
+            unread: u(key),
+            preview: preview(c.last_message),
+          };
+        }
+        const f = c.user || {};
+        return {
           type: 'user',
-          id: f.id,
+          id: c.chat_id,
           name: f.nickname,
           avatar: f.avatar,
-          key: 'user_' + f.id,
-          unread: u('user_' + f.id),
-        })),
-        ...(this.groups || []).map(g => ({
-          type: 'group',
-          id: g.id,
-          name: g.group_name,
-          avatar: g.group_avatar,
-          owner_id: g.owner_id,
-          key: 'group_' + g.id,
-          unread: u('group_' + g.id),
-        })),
-      ];
+          key,
+          unread: u(key),
+          preview: preview(c.last_message),
+        };
+      });
     },
   },
   watch: {
-    friends: { handler() { this.buildChatList(); }, deep: true },
-    groups: { handler() { this.buildChatList(); }, deep: true },
+    conversations: { handler() { this.buildChatList(); }, deep: true },
     unreadMap: { handler() { this.buildChatList(); }, deep: true },
   },
 }).mount('#app');
@@ -2,9 +2,11 @@
 数据模型 - 统一导出
 """
 from config.database import db
-from models.user import User
+from models.user import User, LinkIdSequence
 from models.friendship import Friendship
-from models.message import Message
+from models.message import Message, MessageSegment
 from models.group import Group, GroupMember, UserGroupRead
+from models.conversation import Conversation
+from models.blob import Blob, BlobAlias, ImageVariant
 
-__all__ = ["db", "User", "Friendship", "Message", "Group", "GroupMember", "UserGroupRead"]
+__all__ = ["db", "User", "LinkIdSequence", "Friendship", "Message", "MessageSegment", "Group", "GroupMember", "UserGroupRead", "Conversation", "Blob", "BlobAlias", "ImageVariant"]
@@ -0,0 +1,68 @@
+"""
+内容寻址文件存储：按内容 SHA-256 去重的文件实体、旧路径别名与图片变体
+"""
+from datetime import datetime
+from config.database import db
+
+
+class Blob(db.Model):
+    """
+    一份文件内容对应一行。ref_count 为引用该文件的记录数（消息 file_path、用户头像、群头像），
+    由发送消息、更换头像、删除消息等写路径随事务增减；归零且超过宽限期后由 gc-blobs 删除。
+    """
+    __tablename__ = "blobs"
+    __table_args__ = (
+        db.Index("ix_blobs_unreferenced", "ref_count", "last_uploaded_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # 最近一次上传（含命中去重）的时间：刚上传尚未被消息引用的文件在宽限期内不会被回收
+    last_uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, sha256: str, size: int, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.sha256 = sha256
+        self.size = size
+
+
+class BlobAlias(db.Model):
+    """迁移前的旧路径（uploads/xxx、avatars/xxx）到内容哈希的映射，旧链接迁移后仍可访问"""
+    __tablename__ = "blob_aliases"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    path = db.Column(db.String(512), unique=True, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+
+    def __init__(self, path: str, sha256: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+        self.sha256 = sha256
+
+
+class ImageVariant(db.Model):
+    """
+    图片变体元数据：每个内容哈希的每种变体一行（文件见 file_service.variant_file）。
+    mimetype 为空表示原图无法解码（不是图片或超出像素上限），不再重试，请求时回退到原图。
+    """
+    __tablename__ = "image_variants"
+    __table_args__ = (
+        db.UniqueConstraint("sha256", "variant", name="uq_image_variant"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+    variant = db.Column(db.String(16), nullable=False)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    size = db.Column(db.Integer, nullable=True)
+    mimetype = db.Column(db.String(32), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, sha256: str, variant: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.sha256 = sha256
+        self.variant = variant
@@ -0,0 +1,71 @@
+"""
+会话读模型：每个用户的每个会话一行，保存未读数、最后一条消息快照与最后活跃时间，
+侧边栏会话列表与未读汇总各一次索引查询即可读取。由发送、已读、加好友、入群等写路径维护。
+"""
+from datetime import datetime
+from typing import Optional
+from config.database import db
+
+# 最后一条消息预览保留的字符数
+PREVIEW_LENGTH = 64
+
+
+class Conversation(db.Model):
+    __tablename__ = "conversations"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "chat_type", "chat_id", name="uq_conversation"),
+        db.Index("ix_conversations_user_active", "user_id", "last_active_at", "id"),
+        db.Index("ix_conversations_user_unread", "user_id", "unread"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    chat_type = db.Column(db.String(8), nullable=False)  # user / group
+    chat_id = db.Column(db.Integer, nullable=False)  # 私聊为对方 user_id，群聊为 group_id
+    unread = db.Column(db.Integer, nullable=False, default=0)
+    last_message_id = db.Column(db.Integer, nullable=True)
+    last_sender_id = db.Column(db.Integer, nullable=True)
+    last_message_type = db.Column(db.String(16), nullable=True)
+    last_preview = db.Column(db.String(PREVIEW_LENGTH * 4), nullable=True)  # 文本消息截断内容 / 文件名
+    last_active_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(
+        self,
+        user_id: int,
+        chat_type: str,
+        chat_id: int,
+        unread: int = 0,
+        last_message_id: Optional[int] = None,
+        last_sender_id: Optional[int] = None,
+        last_message_type: Optional[str] = None,
+        last_preview: Optional[str] = None,
+        last_active_at: Optional[datetime] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.user_id = user_id
+        self.chat_type = chat_type
+        self.chat_id = chat_id
+        self.unread = unread
+        self.last_message_id = last_message_id
+        self.last_sender_id = last_sender_id
+        self.last_message_type = last_message_type
+        self.last_preview = last_preview
+        self.last_active_at = last_active_at or datetime.utcnow()
+
+    def to_dict(self):
+        last_message = None
+        if self.last_message_id is not None:
+            last_message = {
+                "id": self.last_message_id,
+                "sender_id": self.last_sender_id,
+                "message_type": self.last_message_type,
+                "preview": self.last_preview,
+            }
+        return {
+            "chat_type": self.chat_type,
+            "chat_id": self.chat_id,
+            "unread": self.unread,
+            "last_message": last_message,
+            "last_active_at": self.last_active_at.isoformat() + "Z" if self.last_active_at else None,
+        }
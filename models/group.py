@@ -13,8 +13,13 @@ class Group(db.Model):
     group_name = db.Column(db.String(128), nullable=False)
     group_avatar = db.Column(db.String(256), nullable=True)
     owner_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    # 最近一条群消息的序号（Message.seq），发送群消息时在同一事务内递增
+    last_seq = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # 批量导入按 (群主, 群名) 识别已导入的群
+    __table_args__ = (db.Index("ix_groups_owner_name", "owner_id", "group_name"),)
+
     def __init__(
         self,
         group_name: str,
@@ -31,11 +36,14 @@ class Group(db.Model):
     members = db.relationship("GroupMember", backref="group", lazy="dynamic", cascade="all, delete-orphan")
 
     def to_dict(self):
+        from services.file_service import variant_path
         return {
             "id": self.id,
             "group_name": self.group_name,
             "group_avatar": self.group_avatar,
+            "group_avatar_thumb": variant_path(self.group_avatar, "thumb"),
             "owner_id": self.owner_id,
+            "last_seq": self.last_seq or 0,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
 
@@ -65,25 +73,34 @@ class GroupMember(db.Model):
 
     user = db.relationship("User", foreign_keys=[user_id])
 
-    def to_dict(self):
+    def to_dict(self, user_dict=None):
+        """user_dict: 调用方已批量取好的成员用户信息，传入时不再懒加载 self.user"""
+        if user_dict is None and self.user:
+            user_dict = self.user.to_dict()
         return {
             "id": self.id,
             "group_id": self.group_id,
             "user_id": self.user_id,
             "role": self.role,
-            "user": self.user.to_dict() if self.user else None,
+            "user": user_dict,
             "joined_at": self.joined_at.isoformat() if self.joined_at else None,
         }
 
 
 class UserGroupRead(db.Model):
-    """用户在某群的已读位置（用于未读数）"""
+    """
+    用户在某群的已读位置（用于未读数）。
+    未读数 = Group.last_seq - last_read_seq - own_since_read，无需扫描消息表。
+    """
     __tablename__ = "user_group_read"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     group_id = db.Column(db.Integer, db.ForeignKey("groups.id"), nullable=False)
     last_read_message_id = db.Column(db.Integer, nullable=False, default=0)
+    last_read_seq = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
+    # 已读位置之后用户自己发送的消息数（自己的消息不计入未读）
+    own_since_read = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
 
     __table_args__ = (db.UniqueConstraint("user_id", "group_id", name="uq_user_group_read"),)
 
@@ -92,9 +109,13 @@ class UserGroupRead(db.Model):
         user_id: int,
         group_id: int,
         last_read_message_id: int = 0,
+        last_read_seq: int = 0,
+        own_since_read: int = 0,
         **kwargs
     ) -> None:
         super().__init__(**kwargs)
         self.user_id = user_id
         self.group_id = group_id
         self.last_read_message_id = last_read_message_id
+        self.last_read_seq = last_read_seq
+        self.own_since_read = own_since_read
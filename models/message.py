@@ -12,12 +12,17 @@ class Message(db.Model):
         db.Index("ix_messages_sender_created", "sender_id", "created_at"),
         db.Index("ix_messages_receiver_created", "receiver_id", "created_at"),
         db.Index("ix_messages_group_created", "group_id", "created_at"),
+        # 游标分页按单调递增的 id 排序
+        db.Index("ix_messages_group_id", "group_id", "id"),
+        db.Index("ix_messages_receiver_sender_id", "receiver_id", "sender_id", "id"),
+        db.Index("ix_messages_group_seq", "group_id", "seq", unique=True),
     )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     sender_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)  # 私聊
     group_id = db.Column(db.Integer, db.ForeignKey("groups.id"), nullable=True)   # 群聊
+    seq = db.Column(db.Integer, nullable=True)  # 群内连续序号（从 1 开始），客户端据此发现断档；私聊为空
     message_type = db.Column(db.String(16), nullable=False, default="text")  # text / file
     content = db.Column(db.Text, nullable=True)
     file_path = db.Column(db.String(512), nullable=True)
@@ -31,6 +36,7 @@ class Message(db.Model):
         message_type: str = "text",
         receiver_id: Optional[int] = None,
         group_id: Optional[int] = None,
+        seq: Optional[int] = None,
         content: Optional[str] = None,
         file_path: Optional[str] = None,
         file_name: Optional[str] = None,
@@ -42,6 +48,7 @@ class Message(db.Model):
         self.message_type = message_type
         self.receiver_id = receiver_id
         self.group_id = group_id
+        self.seq = seq
         self.content = content
         self.file_path = file_path
         self.file_name = file_name
@@ -50,7 +57,9 @@ class Message(db.Model):
     sender = db.relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     receiver = db.relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
 
-    def to_dict(self):
+    def to_dict(self, sender_dict=None):
+        """sender_dict: 调用方已批量取好的发送者信息，传入时不再懒加载 self.sender"""
+        from services.file_service import variant_path
         # 确保时间格式包含UTC标记，避免前端时区混淆
         created_at_str = None
         if self.created_at:
@@ -64,11 +73,59 @@ class Message(db.Model):
             "sender_id": self.sender_id,
             "receiver_id": self.receiver_id,
             "group_id": self.group_id,
+            "seq": self.seq,
             "message_type": self.message_type,
             "content": self.content,
             "file_path": self.file_path,
             "file_name": self.file_name,
+            # 图片消息的缩略图与预览图（非图片为 None）
+            "thumb_path": variant_path(self.file_path, "thumb"),
+            "preview_path": variant_path(self.file_path, "preview"),
             "is_read": self.is_read,
             "created_at": created_at_str,
-            "sender": self.sender.to_dict() if self.sender else None,
+            "sender": sender_dict if sender_dict is not None else (self.sender.to_dict() if self.sender else None),
         }
+
+
+class MessageSegment(db.Model):
+    """
+    冷数据分段：一个会话中一段连续 id 的归档消息（gzip 压缩的 JSON Lines，见 services.archive_service）。
+    私聊 chat_id / peer_id 为双方 user_id（小者在前），群聊 chat_id 为 group_id、peer_id 为 0。
+    """
+    __tablename__ = "message_segments"
+    __table_args__ = (
+        db.Index("ix_message_segments_chat", "chat_type", "chat_id", "peer_id", "last_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    chat_type = db.Column(db.String(8), nullable=False)  # user / group
+    chat_id = db.Column(db.Integer, nullable=False)
+    peer_id = db.Column(db.Integer, nullable=False, default=0)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # 压缩后字节数
+    path = db.Column(db.String(256), nullable=False)  # 相对 ARCHIVE_DIR
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(
+        self,
+        chat_type: str,
+        chat_id: int,
+        peer_id: int,
+        first_id: int,
+        last_id: int,
+        count: int,
+        size: int,
+        path: str,
+        **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.chat_type = chat_type
+        self.chat_id = chat_id
+        self.peer_id = peer_id
+        self.first_id = first_id
+        self.last_id = last_id
+        self.count = count
+        self.size = size
+        self.path = path
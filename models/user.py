@@ -40,11 +40,13 @@ class User(db.Model):
     )
 
     def to_dict(self):
+        from services.file_service import variant_path
         return {
             "id": self.id,
             "link_id": self.link_id,
             "nickname": self.nickname,
             "avatar": self.avatar,
+            "avatar_thumb": variant_path(self.avatar, "thumb"),
 
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
@@ -55,3 +57,21 @@ class User(db.Model):
 
     def __repr__(self):
         return f"<User {self.display_name()}>"
+
+
+class LinkIdSequence(db.Model):
+    """
+    通讯码分配计数器（每种长度一行）：通讯码 = 以 key 为密钥对 next_value 序号做的置换，
+    各进程按号段预留序号，不同序号必得不同通讯码（见 utils.id_generator）
+    """
+    __tablename__ = "link_id_sequences"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    length = db.Column(db.Integer, unique=True, nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    next_value = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    def __init__(self, length: int, key: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.length = length
+        self.key = key
@@ -0,0 +1,301 @@
+"""
+消息冷数据归档
+
+archive-messages 把早于 ARCHIVE_AFTER_DAYS 的消息移出 messages 表：按会话（私聊双方 / 群）写成 gzip 压缩的
+JSON Lines 分段文件（按 id 升序，每段至多 ARCHIVE_SEGMENT_MESSAGES 条），message_segments 表登记每段的 id 范围。
+messages 表及其索引只保留近期消息；历史接口翻页越过热数据时按 id 范围读取分段（read_before / read_after）。
+
+归档按全局 id 截止点进行，同一会话中归档消息的 id 总小于热数据中的 id。归档消息视为已读，
+不再出现在 unread_only 查询与全文检索中；引用的文件保持引用计数，删好友清空记录、解散群时随分段一起释放。
+"""
+import gzip
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+
+from config.database import db
+from config.settings import ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, ARCHIVE_SEGMENT_MESSAGES, ARCHIVE_CACHE_SEGMENTS
+from models.message import Message, MessageSegment
+from services import search_service
+from services.auth_cache import TTLCache
+from services.file_service import release_files
+
+# 分段中保存的消息字段
+FIELDS = ("id", "sender_id", "receiver_id", "group_id", "seq", "message_type", "content", "file_path", "file_name")
+# 每归档多少个会话提交一次
+CHATS_PER_COMMIT = 100
+
+# 分段文件不可变（合并时写新文件），按相对路径缓存解压后的行
+_segments = TTLCache(ARCHIVE_CACHE_SEGMENTS)
+
+
+def private_key(user_a, user_b):
+    return "user", min(user_a, user_b), max(user_a, user_b)
+
+
+def group_key(group_id):
+    return "group", group_id, 0
+
+
+def _segment_query(key):
+    chat_type, chat_id, peer_id = key
+    # 合并写出的新分段行可能复用被删除旧行的 id：以查询结果覆盖会话中已加载的同 id 对象，否则读到旧 path
+    return MessageSegment.query.execution_options(populate_existing=True).filter(
+        MessageSegment.chat_type == chat_type,
+        MessageSegment.chat_id == chat_id,
+        MessageSegment.peer_id == peer_id,
+    )
+
+
+def _encode(msg):
+    row = {f: getattr(msg, f) for f in FIELDS}
+    row["created_at"] = msg.created_at.isoformat() if msg.created_at else None
+    return row
+
+
+def _decode(row):
+    """还原为未加入会话的 Message 对象，可直接交给 serialize_messages"""
+    fields = {f: row.get(f) for f in FIELDS if f != "id"}
+    msg = Message(is_read=True, **fields)
+    msg.id = row["id"]
+    msg.created_at = datetime.fromisoformat(row["created_at"]) if row.get("created_at") else None
+    return msg
+
+
+def _segment_path(key, first_id, last_id):
+    chat_type, chat_id, peer_id = key
+    return f"{chat_type}/{chat_id % 256:02x}/{chat_id}-{peer_id}/{first_id}-{last_id}.jsonl.gz"
+
+
+def _load(path):
+    """分段文件的全部行；文件不存在时抛出 FileNotFoundError（见 _reading）"""
+    rows = _segments.get(path)
+    if rows is None:
+        with gzip.open(ARCHIVE_DIR / path, "rt", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        _segments.set(path, rows)
+    return rows
+
+
+def _write(key, rows):
+    """写出一个分段文件（先写临时文件再改名），返回未提交的 MessageSegment"""
+    path = _segment_path(key, rows[0]["id"], rows[-1]["id"])
+    target = ARCHIVE_DIR / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+    os.replace(tmp, target)
+    chat_type, chat_id, peer_id = key
+    return MessageSegment(chat_type=chat_type, chat_id=chat_id, peer_id=peer_id, first_id=rows[0]["id"],
+                          last_id=rows[-1]["id"], count=len(rows), size=target.stat().st_size, path=path)
+
+
+# ---------- 读取 ----------
+
+def _reading(read):
+    """
+    archive-messages 会在 Web 进程读取期间合并末段并删除被替换的旧文件：刚查到的分段文件可能已不存在，
+    此时重新查询分段列表再读一次（合并后的新分段已提交，包含旧分段的全部行）
+    """
+    @wraps(read)
+    def wrapper(*args, **kwargs):
+        try:
+            return read(*args, **kwargs)
+        except FileNotFoundError:
+            return read(*args, **kwargs)
+    return wrapper
+
+
+@_reading
+def read_before(key, before_id=None, limit=100, after_id=None):
+    """归档中 id < before_id（且 > after_id）的最新 limit 条，按 id 正序返回；不限时传 None"""
+    if limit <= 0:
+        return []
+    q = _segment_query(key)
+    if before_id is not None:
+        q = q.filter(MessageSegment.first_id < before_id)
+    if after_id is not None:
+        q = q.filter(MessageSegment.last_id > after_id)
+    rows = []
+    for seg in q.order_by(MessageSegment.last_id.desc()):
+        rows = [r for r in _load(seg.path)
+                if (before_id is None or r["id"] < before_id) and (after_id is None or r["id"] > after_id)] + rows
+        if len(rows) >= limit:
+            break
+    return [_decode(r) for r in rows[-limit:]]
+
+
+@_reading
+def read_after(key, after_id, limit=100):
+    """归档中 id > after_id 的最早 limit 条，按 id 正序返回"""
+    if limit <= 0:
+        return []
+    rows = []
+    q = _segment_query(key).filter(MessageSegment.last_id > after_id)
+    for seg in q.order_by(MessageSegment.last_id.asc()):
+        rows.extend(r for r in _load(seg.path) if r["id"] > after_id)
+        if len(rows) >= limit:
+            break
+    return [_decode(r) for r in rows[:limit]]
+
+
+def last_archived_id(key):
+    return db.session.query(db.func.max(MessageSegment.last_id)).filter(
+        MessageSegment.chat_type == key[0],
+        MessageSegment.chat_id == key[1],
+        MessageSegment.peer_id == key[2],
+    ).scalar()
+
+
+def archived_counts(chat_type="group"):
+    """{chat_id: 归档条数}（重排群内序号时作为热数据序号的起点）"""
+    return dict(
+        db.session.query(MessageSegment.chat_id, db.func.sum(MessageSegment.count))
+        .filter(MessageSegment.chat_type == chat_type)
+        .group_by(MessageSegment.chat_id)
+        .all()
+    )
+
+
+def read_through(key, page, limit, before_id=None, after_id=None):
+    """
+    历史分页读穿：page 为热数据中按同样游标取到的一页（按 id 正序）。
+    向前翻页不足 limit 条时用归档中更早的消息补齐；after_id 落在归档范围内时先返回归档中的消息。
+    """
+    if after_id is not None and before_id is None:
+        last_id = last_archived_id(key)
+        if last_id is None or last_id <= after_id:
+            return page
+        return (read_after(key, after_id, limit) + page)[:limit]
+    if len(page) >= limit:
+        return page
+    bound = page[0].id if page else before_id
+    return read_before(key, bound, limit - len(page), after_id=after_id) + page
+
+
+# ---------- 归档 ----------
+
+def _cutoff_id(cutoff):
+    """created_at 早于 cutoff 的最大消息 id：id 与 created_at 同序，按主键二分查找，不扫描全表"""
+    lo = db.session.query(db.func.min(Message.id)).scalar()
+    hi = db.session.query(db.func.max(Message.id)).scalar()
+    if lo is None:
+        return None
+    found = None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        row = db.session.query(Message.id, Message.created_at).filter(Message.id >= mid).order_by(Message.id).first()
+        if row is None or row.id > hi:
+            hi = mid - 1
+        elif row.created_at is not None and row.created_at < cutoff:
+            found = row.id
+            lo = row.id + 1
+        else:
+            hi = mid - 1
+    return found
+
+
+def _archivable_chats(cutoff_id):
+    keys = {group_key(gid) for (gid,) in db.session.query(Message.group_id).filter(
+        Message.group_id.isnot(None), Message.id <= cutoff_id).distinct()}  # type: ignore
+    keys.update(private_key(s, r) for s, r in db.session.query(Message.sender_id, Message.receiver_id).filter(
+        Message.group_id.is_(None), Message.receiver_id.isnot(None), Message.id <= cutoff_id).distinct())  # type: ignore
+    return sorted(keys)
+
+
+def _chat_queries(key):
+    chat_type, chat_id, peer_id = key
+    if chat_type == "group":
+        return [Message.query.filter(Message.group_id == chat_id)]
+    # 私聊按两个方向各走一次 (receiver_id, sender_id, id) 索引（群消息的 receiver_id 为空，无需再过滤 group_id，
+    # 否则 SQLite 可能改走 (group_id, id) 索引扫描全部私聊消息）
+    return [
+        Message.query.filter(Message.receiver_id == r, Message.sender_id == s)
+        for s, r in {(chat_id, peer_id), (peer_id, chat_id)}
+    ]
+
+
+def _archive_chat(key, cutoff_id, stats):
+    """归档一个会话中 id <= cutoff_id 的消息，返回被合并替换、待提交后删除的旧分段路径"""
+    obsolete = []
+    pending = []
+    # 最新一段未写满时与本次归档的消息合并重写，避免每次归档都留下零碎小段
+    tail = _segment_query(key).order_by(MessageSegment.last_id.desc()).first()
+    if tail is not None and tail.count < ARCHIVE_SEGMENT_MESSAGES:
+        pending = list(_load(tail.path))
+        obsolete.append(tail.path)
+        stats["segments"] -= 1
+        db.session.delete(tail)
+    queries = _chat_queries(key)
+    columns = [getattr(Message, f) for f in FIELDS] + [Message.created_at]
+    last_id = 0
+    while True:
+        batch = []
+        for q in queries:
+            batch.extend(q.with_entities(*columns).filter(Message.id > last_id, Message.id <= cutoff_id)
+                         .order_by(Message.id).limit(ARCHIVE_SEGMENT_MESSAGES).all())
+        if not batch:
+            break
+        batch = sorted(batch, key=lambda m: m.id)[:ARCHIVE_SEGMENT_MESSAGES]
+        last_id = batch[-1].id
+        pending.extend(_encode(m) for m in batch)
+        stats["messages"] += len(batch)
+        while len(pending) >= ARCHIVE_SEGMENT_MESSAGES:
+            db.session.add(_write(key, pending[:ARCHIVE_SEGMENT_MESSAGES]))
+            pending = pending[ARCHIVE_SEGMENT_MESSAGES:]
+            stats["segments"] += 1
+    if pending:
+        db.session.add(_write(key, pending))
+        stats["segments"] += 1
+    for q in queries:
+        q.filter(Message.id <= last_id).delete(synchronize_session=False)
+    return obsolete
+
+
+def archive_messages(older_than_days=ARCHIVE_AFTER_DAYS):
+    """
+    把早于 older_than_days 的消息移入归档分段（可重复执行，每 CHATS_PER_COMMIT 个会话提交一次）。
+    返回 {"chats", "messages", "segments"}。
+    """
+    stats = {"chats": 0, "messages": 0, "segments": 0}
+    cutoff_id = _cutoff_id(datetime.utcnow() - timedelta(days=older_than_days))
+    if cutoff_id is None:
+        return stats
+    obsolete = []
+    for key in _archivable_chats(cutoff_id):
+        obsolete += _archive_chat(key, cutoff_id, stats)
+        stats["chats"] += 1
+        if stats["chats"] % CHATS_PER_COMMIT == 0:
+            db.session.commit()
+            unlink_segments(obsolete)
+            obsolete = []
+    db.session.commit()
+    unlink_segments(obsolete)
+    if stats["messages"]:
+        search_service.optimize_search_index()  # 合并全文索引中被删除条目留下的段
+    return stats
+
+
+# ---------- 删除 ----------
+
+def drop_chat(key):
+    """
+    删除会话的全部归档（删好友清空记录、解散群时在调用方事务内调用）：释放其中消息引用的文件并删除登记。
+    返回分段路径，调用方 commit 之后交给 unlink_segments 删除文件。
+    """
+    segments = _segment_query(key).all()
+    paths = [seg.path for seg in segments]
+    release_files(r["file_path"] for path in paths for r in _load(path) if r.get("file_path"))
+    _segment_query(key).delete(synchronize_session=False)
+    return paths
+
+
+def unlink_segments(paths):
+    for path in paths:
+        _segments.pop(path)
+        (ARCHIVE_DIR / path).unlink(missing_ok=True)
@@ -0,0 +1,139 @@
+"""
+认证主体缓存：token 摘要 -> JWT 声明，user_id -> 用户快照
+供 require_auth 与 WebSocket authenticate 共用，避免每个请求都完整解码 JWT 并查询用户。
+用户资料变更后的快照失效与关系缓存一样经消息总线广播到所有进程（见 services/message_bus.py）。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config.settings import AUTH_CACHE_MAX_ENTRIES, AUTH_USER_CACHE_TTL_SECONDS
+
+
+class TTLCache:
+    """有界 LRU + 过期时间的缓存，带命中/未命中计数"""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[0] is None or item[0] > now):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, expires_at=None):
+        if self.ttl is not None:
+            ttl_expiry = time.time() + self.ttl
+            expires_at = ttl_expiry if expires_at is None else min(expires_at, ttl_expiry)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class UserSnapshot:
+    """已认证用户的只读快照（不绑定数据库会话，可跨请求复用）"""
+
+    __slots__ = ("id", "link_id", "nickname", "avatar", "created_at", "_dict")
+
+    def __init__(self, user):
+        self.id = user.id
+        self.link_id = user.link_id
+        self.nickname = user.nickname
+        self.avatar = user.avatar
+        self.created_at = user.created_at
+        self._dict = user.to_dict()
+
+    def to_dict(self):
+        return dict(self._dict)
+
+    def display_name(self):
+        return f"{self.nickname}({self.link_id})"
+
+    def __repr__(self):
+        return f"<UserSnapshot {self.display_name()}>"
+
+
+_claims_cache = TTLCache(AUTH_CACHE_MAX_ENTRIES)
+_user_cache = TTLCache(AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_USER_CACHE_TTL_SECONDS)
+
+
+def _token_digest(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def get_claims(token):
+    """返回 token 的声明；缓存至 token 的 exp 为止。无效 token 返回 None（不缓存）"""
+    from services.auth_service import decode_token
+
+    digest = _token_digest(token)
+    claims = _claims_cache.get(digest)
+    if claims is not None:
+        return claims
+    claims = decode_token(token)
+    if not claims:
+        return None
+    _claims_cache.set(digest, claims, expires_at=claims.get("exp"))
+    return claims
+
+
+def get_user(user_id):
+    """返回用户快照；不存在返回 None"""
+    from controllers.user_controller import get_user_by_id
+
+    if user_id is None:
+        return None
+    snapshot = _user_cache.get(user_id)
+    if snapshot is not None:
+        return snapshot
+    user = get_user_by_id(user_id)
+    if not user:
+        return None
+    snapshot = UserSnapshot(user)
+    _user_cache.set(user_id, snapshot)
+    return snapshot
+
+
+def apply_invalidation(payload):
+    """清除本进程的用户快照。payload: {"profiles": [...]}（其余键属于 relation_cache）"""
+    for user_id in payload.get("profiles", ()):
+        _user_cache.pop(user_id)
+
+
+def invalidate_user(user_id):
+    """用户资料变更后调用（在 commit 之后）；多进程部署时经消息总线通知其他进程"""
+    from services.message_bus import broadcast_cache_invalidation
+
+    payload = {"profiles": [user_id]}
+    apply_invalidation(payload)
+    broadcast_cache_invalidation(payload)
+
+
+def stats():
+    return {"claims": _claims_cache.stats(), "users": _user_cache.stats()}
@@ -1,22 +1,71 @@
 """
 认证服务：密码哈希、JWT
 """
+import threading
 import jwt
 import bcrypt
 from datetime import datetime, timedelta
-from config.settings import SECRET_KEY, JWT_ALGORITHM, JWT_EXPIRE_HOURS
+from config.settings import (
+    SECRET_KEY,
+    JWT_ALGORITHM,
+    JWT_EXPIRE_HOURS,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_THREADS,
+    PASSWORD_HASH_MAX_PENDING,
+)
+
+try:
+    from eventlet import tpool
+    tpool.set_num_threads(PASSWORD_HASH_THREADS)
+except ImportError:  # 非 eventlet 部署：普通线程池
+    tpool = None
+    from concurrent.futures import ThreadPoolExecutor
+    _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_THREADS, thread_name_prefix="bcrypt")
+
+
+class PasswordHasherBusy(Exception):
+    """密码计算线程池排队已满，调用方应快速返回“服务繁忙”"""
+
+
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _offload(fn, *args):
+    """在原生线程中执行 bcrypt 计算（bcrypt 计算期间释放 GIL），当前协程让出 hub"""
+    global _pending
+    with _pending_lock:
+        if _pending >= PASSWORD_HASH_MAX_PENDING:
+            raise PasswordHasherBusy()
+        _pending += 1
+    try:
+        if tpool is not None:
+            return tpool.execute(fn, *args)
+        return _executor.submit(fn, *args).result()
+    finally:
+        with _pending_lock:
+            _pending -= 1
 
 
 def hash_password(password):
     if not password:
         return None
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return _offload(bcrypt.hashpw, password.encode("utf-8"), salt).decode("utf-8")
 
 
 def check_password(password, password_hash):
     if not password or not password_hash:
         return False
-    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+    return _offload(bcrypt.checkpw, password.encode("utf-8"), password_hash.encode("utf-8"))
+
+
+def needs_rehash(password_hash):
+    """哈希的成本因子与当前配置不一致时返回 True（格式：$2b$<rounds>$...）"""
+    try:
+        return int(password_hash.split("$")[2]) != BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return False
 
 
 def create_token(user_id, link_id):
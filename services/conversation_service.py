@@ -0,0 +1,212 @@
+"""
+会话读模型维护（在调用方事务内执行，随调用方 commit 生效）
+"""
+from datetime import datetime
+
+from config.database import db
+from models.conversation import Conversation, PREVIEW_LENGTH
+from models.friendship import Friendship
+from models.group import Group, GroupMember, UserGroupRead
+from models.message import Message
+
+
+def _preview(message_type, content, file_name):
+    if message_type == "file":
+        return file_name
+    return (content or "")[:PREVIEW_LENGTH]
+
+
+def _snapshot(msg):
+    """会话中保存的最后一条消息快照（msg 须已 flush，取得 id 与 created_at）"""
+    return {
+        "last_message_id": msg.id,
+        "last_sender_id": msg.sender_id,
+        "last_message_type": msg.message_type,
+        "last_preview": _preview(msg.message_type, msg.content, msg.file_name),
+        "last_active_at": msg.created_at or datetime.utcnow(),
+    }
+
+
+def _conversation_filter(user_id, chat_type, chat_id):
+    return Conversation.query.filter(
+        Conversation.user_id == user_id,
+        Conversation.chat_type == chat_type,
+        Conversation.chat_id == chat_id,
+    )
+
+
+def open_conversation(user_id, chat_type, chat_id):
+    """建立空会话（加好友、建群、入群时调用），已存在则不变"""
+    if _conversation_filter(user_id, chat_type, chat_id).first() is None:
+        db.session.add(Conversation(user_id=user_id, chat_type=chat_type, chat_id=chat_id))
+
+
+def open_conversations(user_ids, chat_type, chat_id):
+    """批量建立空会话（建群时全体成员）：一次查询已存在的会话，其余一条 executemany 写入"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    existing = {
+        uid for (uid,) in db.session.query(Conversation.user_id).filter(
+            Conversation.chat_type == chat_type,
+            Conversation.chat_id == chat_id,
+            Conversation.user_id.in_(user_ids),  # type: ignore
+        )
+    }
+    rows = [{"user_id": uid, "chat_type": chat_type, "chat_id": chat_id} for uid in sorted(user_ids - existing)]
+    if rows:
+        db.session.execute(db.insert(Conversation), rows)
+
+
+def record_private_message(msg):
+    """私聊新消息：双方会话更新最后一条消息，接收方未读 +1（发给自己的消息不进入会话列表）"""
+    if msg.sender_id == msg.receiver_id:
+        return
+    snapshot = _snapshot(msg)
+    for owner_id, peer_id, incr in ((msg.receiver_id, msg.sender_id, 1), (msg.sender_id, msg.receiver_id, 0)):
+        updated = _conversation_filter(owner_id, "user", peer_id).update(
+            {**snapshot, "unread": Conversation.unread + incr}, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(Conversation(user_id=owner_id, chat_type="user", chat_id=peer_id, unread=incr, **snapshot))
+
+
+def record_group_message(msg):
+    """群聊新消息：全体成员的会话更新最后一条消息，除发送者外未读 +1（按集合批量更新，不逐个成员查询）"""
+    group_id, sender_id = msg.group_id, msg.sender_id
+    snapshot = _snapshot(msg)
+    member_ids = db.select(GroupMember.user_id).where(GroupMember.group_id == group_id)
+    Conversation.query.filter(
+        Conversation.chat_type == "group",
+        Conversation.chat_id == group_id,
+        Conversation.user_id.in_(member_ids),  # type: ignore
+    ).update({
+        **snapshot,
+        "unread": Conversation.unread + db.case((Conversation.user_id != sender_id, 1), else_=0),
+    }, synchronize_session=False)
+    # 尚无会话行的成员补插
+    has_conversation = db.select(Conversation.id).where(
+        Conversation.user_id == GroupMember.user_id,
+        Conversation.chat_type == "group",
+        Conversation.chat_id == group_id,
+    ).exists()
+    columns = Conversation.__table__.c
+    db.session.execute(
+        db.insert(Conversation).from_select(
+            ["user_id", "chat_type", "chat_id", "unread", *snapshot],
+            db.select(
+                GroupMember.user_id,
+                db.literal("group"),
+                db.literal(group_id),
+                db.case((GroupMember.user_id != sender_id, 1), else_=0),
+                *[db.literal(value, type_=columns[key].type) for key, value in snapshot.items()],
+            ).where(
+                GroupMember.group_id == group_id,
+                ~has_conversation,
+            ),
+        )
+    )
+
+
+def clear_unread(user_id, chat_type, chat_id):
+    """标记已读：清零该会话的未读数"""
+    _conversation_filter(user_id, chat_type, chat_id).update({"unread": 0}, synchronize_session=False)
+
+
+def delete_conversations(chat_type, chat_id, user_id=None):
+    """删除会话（删好友、踢人、解散群时调用）；user_id 为空时删除所有用户的该会话"""
+    q = Conversation.query.filter(
+        Conversation.chat_type == chat_type,
+        Conversation.chat_id == chat_id,
+    )
+    if user_id is not None:
+        q = q.filter(Conversation.user_id == user_id)
+    q.delete(synchronize_session=False)
+
+
+def rebuild_conversations(user_id=None):
+    """
+    按好友关系、群成员与 messages 表重建会话读模型（升级已有数据库或数据漂移时的对账任务）。
+    user_id 为空时重建全部用户。返回写入的会话行数。
+    """
+    q = Conversation.query
+    if user_id is not None:
+        q = q.filter(Conversation.user_id == user_id)
+    q.delete(synchronize_session=False)
+
+    # 私聊：每个方向的最后一条消息与未读数
+    private_last = {}
+    last_q = db.session.query(Message.sender_id, Message.receiver_id, db.func.max(Message.id)).filter(
+        Message.group_id.is_(None),  # type: ignore
+        Message.receiver_id.isnot(None),  # type: ignore
+    ).group_by(Message.sender_id, Message.receiver_id)
+    for sender_id, receiver_id, last_id in last_q:
+        for key in ((sender_id, receiver_id), (receiver_id, sender_id)):
+            private_last[key] = max(private_last.get(key, 0), last_id)
+    unread_q = db.session.query(Message.receiver_id, Message.sender_id, db.func.count(Message.id)).filter(
+        Message.group_id.is_(None),  # type: ignore
+        Message.is_read == False,  # type: ignore
+    )
+    if user_id is not None:
+        unread_q = unread_q.filter(Message.receiver_id == user_id)
+    private_unread = {(r, s): n for r, s, n in unread_q.group_by(Message.receiver_id, Message.sender_id)}
+
+    # 群聊：每个群的最后一条消息；未读数按群内序号相减
+    group_last = dict(
+        db.session.query(Message.group_id, db.func.max(Message.id))
+        .filter(Message.group_id.isnot(None))  # type: ignore
+        .group_by(Message.group_id)
+        .all()
+    )
+    unread = (
+        Group.last_seq
+        - db.func.coalesce(UserGroupRead.last_read_seq, 0)
+        - db.func.coalesce(UserGroupRead.own_since_read, 0)
+    )
+    member_q = db.session.query(
+        GroupMember.user_id, GroupMember.group_id, GroupMember.joined_at, unread
+    ).join(
+        Group, Group.id == GroupMember.group_id,
+    ).outerjoin(
+        UserGroupRead,
+        (UserGroupRead.user_id == GroupMember.user_id) & (UserGroupRead.group_id == GroupMember.group_id),
+    )
+    friend_q = db.session.query(Friendship.user_id, Friendship.friend_id, Friendship.created_at).filter(
+        Friendship.user_id != Friendship.friend_id
+    )
+    if user_id is not None:
+        member_q = member_q.filter(GroupMember.user_id == user_id)
+        friend_q = friend_q.filter(Friendship.user_id == user_id)
+
+    specs = [
+        (uid, "user", fid, created_at, private_last.get((uid, fid)), private_unread.get((uid, fid), 0))
+        for uid, fid, created_at in friend_q
+    ]
+    specs += [
+        (uid, "group", gid, joined_at, group_last.get(gid), max(0, n or 0))
+        for uid, gid, joined_at, n in member_q
+    ]
+
+    last_ids = {spec[4] for spec in specs if spec[4]}
+    messages = {}
+    if last_ids:
+        rows = db.session.query(
+            Message.id, Message.sender_id, Message.message_type, Message.content, Message.file_name, Message.created_at
+        ).filter(Message.id.in_(last_ids)).all()  # type: ignore
+        messages = {r.id: r for r in rows}
+
+    conversations = []
+    for uid, chat_type, chat_id, opened_at, last_id, unread_count in specs:
+        conv = Conversation(user_id=uid, chat_type=chat_type, chat_id=chat_id, unread=unread_count,
+                            last_active_at=opened_at)
+        m = messages.get(last_id)
+        if m is not None:
+            conv.last_message_id = m.id
+            conv.last_sender_id = m.sender_id
+            conv.last_message_type = m.message_type
+            conv.last_preview = _preview(m.message_type, m.content, m.file_name)
+            conv.last_active_at = m.created_at or opened_at
+        conversations.append(conv)
+    db.session.add_all(conversations)
+    db.session.commit()
+    return len(conversations)
@@ -1,15 +1,74 @@
 """
 文件上传与存储
+
+上传的文件按内容 SHA-256 寻址：写入时流式计算哈希，存为 BLOB_DIR/<h[:2]>/<h[2:4]>/<h>，
+相同内容只保存一份（blobs 表登记大小与引用计数）。对外的 file_path 形如
+blobs/ab/cd/<sha256>.<ext>，扩展名只用于响应的 Content-Type。
+迁移前的 uploads/xxx、avatars/xxx 路径仍可访问（文件尚未迁移时直接读取，迁移后经 blob_aliases 映射）。
 """
+import fcntl
+import hashlib
+import json
+import mimetypes
 import os
+import re
+import shutil
+import time
 import uuid
+from collections import Counter
+from datetime import datetime, timedelta
 from pathlib import Path
-from config.settings import UPLOAD_DIR, AVATAR_DIR, MAX_FILE_SIZE_MB, ALLOWED_EXTENSIONS
+
+from sqlalchemy.exc import IntegrityError
+
+from config.database import db
+from config.settings import (
+    UPLOAD_DIR,
+    AVATAR_DIR,
+    BLOB_DIR,
+    VARIANT_DIR,
+    UPLOAD_TMP_DIR,
+    MAX_FILE_SIZE,
+    MAX_FILE_SIZE_MB,
+    ALLOWED_EXTENSIONS,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_SESSION_TTL_HOURS,
+    BLOB_GC_GRACE_HOURS,
+    IMAGE_VARIANTS,
+)
+from models.blob import Blob, BlobAlias, ImageVariant
+from services import metrics
+
+# 流式写入分片时每次读取的字节数
+STREAM_BLOCK_SIZE = 64 * 1024
+# 两次顺带清理过期上传会话的最小间隔（秒）
+GC_INTERVAL_SECONDS = 600
+BLOB_PREFIX = "blobs"
+_BLOB_PATH_RE = re.compile(r"^blobs/([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})(?:\.([a-z0-9]{1,16}))?$")
+_VARIANT_PATH_RE = re.compile(r"^variants/([a-z]{1,16})/([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})(?:\.([a-z0-9]{1,16}))?$")
+# 生成缩略图、预览图的图片扩展名（与前端 isImageFile 一致）
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp", "bmp"}
+# 迁移前的平铺目录：file_path 前缀 -> 目录
+LEGACY_DIRS = {"uploads": UPLOAD_DIR, "avatars": AVATAR_DIR}
+
+_last_gc = 0.0
+
+
+class UploadError(Exception):
+    """分片上传失败；code 为接口返回码，offset 为服务端已接收的字节数（偏移不符时供客户端续传）"""
+
+    def __init__(self, message, code=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.offset = offset
 
 
 def ensure_dirs():
     UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
     AVATAR_DIR.mkdir(parents=True, exist_ok=True)
+    BLOB_DIR.mkdir(parents=True, exist_ok=True)
+    UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
 
 
 def allowed_file(filename):
@@ -26,20 +85,482 @@ def allowed_file(filename):
     return ext in ALLOWED_EXTENSIONS
 
 
-def save_upload(file_storage, subdir="uploads"):
+# ---------- 内容寻址存储 ----------
+
+def _extension(filename):
+    """file_path 中保留的扩展名（仅字母数字），无法使用时为空"""
+    if not filename or "." not in filename:
+        return ""
+    ext = filename.rsplit(".", 1)[-1].lower()
+    return ext if re.fullmatch(r"[a-z0-9]{1,16}", ext) else ""
+
+
+def blob_path(sha256, filename=None):
+    """内容哈希 -> 对外的相对路径"""
+    ext = _extension(filename)
+    name = f"{sha256}.{ext}" if ext else sha256
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{name}"
+
+
+def parse_blob_path(path):
+    """相对路径 -> 内容哈希；不是内容寻址路径时返回 None"""
+    m = _BLOB_PATH_RE.match(path or "")
+    if not m or m.group(3)[:2] != m.group(1) or m.group(3)[2:4] != m.group(2):
+        return None
+    return m.group(3)
+
+
+def _blob_file(sha256):
+    return BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+def content_file(sha256):
+    """内容哈希对应的磁盘文件"""
+    return _blob_file(sha256)
+
+
+def variant_path(path, variant):
+    """
+    图片的变体（缩略图 thumb / 预览图 preview）相对路径，只由 path 推算、不查库；
+    非内容寻址的图片返回 None。变体尚未生成时请求该路径会按需生成。
+    路径带原图扩展名：变体暂时无法提供时据此重定向到带扩展名的原图路径（Content-Type 由扩展名推断）。
+    """
+    sha256 = parse_blob_path(path)
+    ext = _extension(path)
+    if sha256 is None or ext not in IMAGE_EXTENSIONS:
+        return None
+    return f"variants/{variant}/{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+
+def parse_variant_path(path):
+    """变体相对路径 -> (变体名, 内容哈希, 原图扩展名)；格式不符时返回 None，早期不带扩展名的路径扩展名为 None"""
+    m = _VARIANT_PATH_RE.match(path or "")
+    if not m or m.group(4)[:2] != m.group(2) or m.group(4)[2:4] != m.group(3):
+        return None
+    return m.group(1), m.group(4), m.group(5)
+
+
+def variant_file(sha256, variant):
+    return VARIANT_DIR / variant / sha256[:2] / sha256[2:4] / sha256
+
+
+def _tmp_file():
+    UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    return UPLOAD_TMP_DIR / f"{uuid.uuid4().hex}.blob"
+
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+            size += len(block)
+    return hasher.hexdigest(), size
+
+
+def _place_blob(tmp_path, sha256):
+    """把已算好哈希的临时文件放入分片目录；内容已存在时丢弃临时文件"""
+    target = _blob_file(sha256)
+    if target.exists():
+        tmp_path.unlink(missing_ok=True)
+        return False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, target)
+    return True
+
+
+def _touch_blob(sha256, size):
+    """登记内容（不提交）：已存在则刷新上传时间，使其在宽限期内不被回收"""
+    updated = Blob.query.filter(Blob.sha256 == sha256).update(
+        {"last_uploaded_at": datetime.utcnow()}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(Blob(sha256=sha256, size=size))
+
+
+def _register_blob(sha256, size):
+    _touch_blob(sha256, size)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 并发上传了相同内容：对方已插入，改为刷新上传时间
+        db.session.rollback()
+        _touch_blob(sha256, size)
+        db.session.commit()
+
+
+def store_stream(stream, filename, limit=MAX_FILE_SIZE):
+    """
+    把流按块写入存储，写入过程中计算 SHA-256；超过 limit 字节时中止并返回 None。
+    返回对外的相对路径（相同内容返回同一路径）。
+    """
+    tmp_path = _tmp_file()
+    hasher = hashlib.sha256()
+    written = 0
+    with open(tmp_path, "wb") as out:
+        while True:
+            block = stream.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            written += len(block)
+            if written > limit:
+                out.close()
+                tmp_path.unlink(missing_ok=True)
+                return None
+            hasher.update(block)
+            out.write(block)
+    sha256 = hasher.hexdigest()
+    _register_blob(sha256, written)
+    _place_blob(tmp_path, sha256)
+    metrics.UPLOAD_BYTES.inc(written, "direct")
+    metrics.UPLOADS.inc(1, "direct")
+    return _stored(sha256, filename)
+
+
+def store_file(path, filename):
+    """把本地文件移入存储（分片上传完成时使用），返回对外的相对路径"""
+    sha256, size = _hash_file(path)
+    _register_blob(sha256, size)
+    _place_blob(Path(path), sha256)
+    return _stored(sha256, filename)
+
+
+def _stored(sha256, filename):
+    path = blob_path(sha256, filename)
+    # 图片：后台生成缩略图与预览图，不等待
+    from services import image_service
+    image_service.enqueue(path)
+    return path
+
+
+def save_upload(file_storage):
     """保存上传文件，返回相对路径"""
     ensure_dirs()
     if not file_storage or not file_storage.filename:
         return None
     if not allowed_file(file_storage.filename):
         return None
-    ext = file_storage.filename.rsplit(".", 1)[-1].lower()
-    name = f"{uuid.uuid4().hex}.{ext}"
-    base = UPLOAD_DIR if subdir == "uploads" else AVATAR_DIR
-    path = base / name
-    file_storage.save(str(path))
-    return f"{subdir}/{name}"
+    # 请求体大小已由 MAX_CONTENT_LENGTH 在读取时限制，这里再按实际写入的字节数兜底
+    return store_stream(file_storage.stream, file_storage.filename)
 
 
 def save_avatar(file_storage):
-    return save_upload(file_storage, subdir="avatars")
+    return save_upload(file_storage)
+
+
+def resolve_path(path):
+    """
+    对外相对路径 -> (磁盘文件, 用于推断 Content-Type 的文件名, 内容哈希)；不存在时返回 None。
+    旧路径先查原目录（此时内容哈希为 None），已迁移的经 blob_aliases 映射到内容文件。
+    """
+    sha256 = parse_blob_path(path)
+    if sha256 is None:
+        prefix, _, name = (path or "").partition("/")
+        folder = LEGACY_DIRS.get(prefix)
+        if folder is None or not name or "/" in name or name.startswith("."):
+            return None
+        legacy = folder / name
+        if legacy.is_file():
+            return legacy, name, None
+        alias = BlobAlias.query.filter(BlobAlias.path == path).first()
+        if alias is None:
+            return None
+        sha256 = alias.sha256
+    target = _blob_file(sha256)
+    if not target.is_file():
+        return None
+    return target, path.rsplit("/", 1)[-1], sha256
+
+
+def guess_mimetype(name):
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+# ---------- 引用计数（在调用方事务内执行，随调用方 commit 生效）----------
+
+def retain_file(path):
+    """新增一处对 path 的引用（发送文件消息、设置头像）；非内容寻址路径忽略"""
+    sha256 = parse_blob_path(path)
+    if sha256 is not None:
+        Blob.query.filter(Blob.sha256 == sha256).update(
+            {"ref_count": Blob.ref_count + 1}, synchronize_session=False
+        )
+
+
+def release_files(paths):
+    """移除若干引用（删除消息、更换头像）；paths 可重复，每次出现计一次"""
+    counts = Counter(sha for sha in map(parse_blob_path, paths) if sha is not None)
+    for sha256, n in counts.items():
+        Blob.query.filter(Blob.sha256 == sha256).update(
+            {"ref_count": db.func.max(Blob.ref_count - n, 0)}, synchronize_session=False
+        )
+
+
+def gc_blobs(grace_hours=BLOB_GC_GRACE_HOURS):
+    """删除无引用且超过宽限期未再上传的内容文件，返回删除的个数"""
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    removed = 0
+    while True:
+        rows = db.session.query(Blob.id, Blob.sha256).filter(
+            Blob.ref_count <= 0, Blob.last_uploaded_at < cutoff,
+        ).limit(500).all()
+        if not rows:
+            break
+        for blob_id, sha256 in rows:
+            # 条件删除：期间被引用或重新上传的跳过
+            deleted = Blob.query.filter(
+                Blob.id == blob_id, Blob.ref_count <= 0, Blob.last_uploaded_at < cutoff,
+            ).delete(synchronize_session=False)
+            if deleted:
+                BlobAlias.query.filter(BlobAlias.sha256 == sha256).delete(synchronize_session=False)
+                ImageVariant.query.filter(ImageVariant.sha256 == sha256).delete(synchronize_session=False)
+        db.session.commit()
+        for _, sha256 in rows:
+            if Blob.query.filter(Blob.sha256 == sha256).first() is None:
+                _blob_file(sha256).unlink(missing_ok=True)
+                for variant in IMAGE_VARIANTS:
+                    variant_file(sha256, variant).unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+
+# ---------- 分片上传：init -> PUT 分片（按偏移续传）-> complete ----------
+# 会话元数据与已接收数据分别保存在 UPLOAD_TMP_DIR/<upload_id>.json 与 .part，
+# 已接收字节数以 .part 的实际大小为准；多进程共享同一目录即可续传。
+
+def _session_paths(upload_id):
+    if not upload_id or not upload_id.isalnum():
+        raise UploadError("上传会话不存在", code=404)
+    return UPLOAD_TMP_DIR / f"{upload_id}.json", UPLOAD_TMP_DIR / f"{upload_id}.part"
+
+
+def _load_session(upload_id, user_id):
+    meta_path, part_path = _session_paths(upload_id)
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        raise UploadError("上传会话不存在或已过期", code=404)
+    if meta.get("user_id") != user_id:
+        raise UploadError("上传会话不存在或已过期", code=404)
+    return meta, part_path
+
+
+def _session_state(meta, part_path):
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    return {
+        "upload_id": meta["upload_id"],
+        "file_name": meta["file_name"],
+        "size": meta["size"],
+        "offset": offset,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+    }
+
+
+def init_upload(user_id, file_name, size):
+    """创建上传会话；size 为文件总字节数，超过 MAX_FILE_SIZE_MB 直接拒绝"""
+    ensure_dirs()
+    maybe_gc_upload_sessions()
+    if not file_name or not allowed_file(file_name):
+        raise UploadError("文件类型不允许或无效")
+    if not isinstance(size, int) or size < 0:
+        raise UploadError("无效的文件大小")
+    if size > MAX_FILE_SIZE:
+        raise UploadError(f"文件超过 {MAX_FILE_SIZE_MB}MB 限制", code=413)
+    upload_id = uuid.uuid4().hex
+    meta = {"upload_id": upload_id, "user_id": user_id, "file_name": file_name, "size": size,
+            "created_at": time.time()}
+    meta_path, part_path = _session_paths(upload_id)
+    part_path.touch()
+    meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    return _session_state(meta, part_path)
+
+
+def get_upload(user_id, upload_id):
+    """查询会话状态（断线后据 offset 续传）"""
+    meta, part_path = _load_session(upload_id, user_id)
+    return _session_state(meta, part_path)
+
+
+def write_chunk(user_id, upload_id, offset, stream, content_length=None):
+    """
+    从 offset 处追加写入一个分片：按块从请求流读取并写盘，不在内存中缓存整个分片。
+    offset 必须等于已接收字节数；写入超过声明大小时丢弃本分片并拒绝。返回会话状态。
+    """
+    meta, part_path = _load_session(upload_id, user_id)
+    size = meta["size"]
+    if content_length is not None and offset + content_length > size:
+        raise UploadError("分片超出声明的文件大小", code=413, offset=offset)
+    try:
+        out = open(part_path, "r+b")
+    except FileNotFoundError:
+        raise UploadError("上传会话不存在或已过期", code=404)
+    with out:
+        try:
+            fcntl.flock(out, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("该上传会话正有分片在写入", code=409)
+        received = os.fstat(out.fileno()).st_size
+        if offset != received:
+            raise UploadError("分片偏移与已接收字节数不符", code=409, offset=received)
+        out.seek(received)
+        written = 0
+        while True:
+            block = stream.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            if received + written + len(block) > size:
+                out.truncate(received)
+                raise UploadError("分片超出声明的文件大小", code=413, offset=received)
+            out.write(block)
+            written += len(block)
+        out.flush()
+    metrics.UPLOAD_BYTES.inc(written, "chunked")
+    return _session_state(meta, part_path)
+
+
+def complete_upload(user_id, upload_id):
+    """全部字节到齐后计算内容哈希并移入存储，返回 (相对路径, 原文件名)"""
+    meta, part_path = _load_session(upload_id, user_id)
+    ensure_dirs()
+    try:
+        part = open(part_path, "rb")
+    except FileNotFoundError:
+        raise UploadError("上传会话不存在或已过期", code=404)
+    with part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("该上传会话正有分片在写入", code=409)
+        received = os.fstat(part.fileno()).st_size
+        if received != meta["size"]:
+            raise UploadError("文件尚未上传完整", code=409, offset=received)
+        path = store_file(part_path, meta["file_name"])
+    _session_paths(upload_id)[0].unlink(missing_ok=True)
+    metrics.UPLOADS.inc(1, "chunked")
+    return path, meta["file_name"]
+
+
+def abort_upload(user_id, upload_id):
+    meta, part_path = _load_session(upload_id, user_id)
+    part_path.unlink(missing_ok=True)
+    _session_paths(upload_id)[0].unlink(missing_ok=True)
+
+
+def gc_upload_sessions(max_age_hours=UPLOAD_SESSION_TTL_HOURS):
+    """删除超过 max_age_hours 未写入的上传会话（按 .part / .json 的修改时间），返回删除的会话数"""
+    if not UPLOAD_TMP_DIR.exists():
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for meta_path in UPLOAD_TMP_DIR.glob("*.json"):
+        part_path = meta_path.with_suffix(".part")
+        try:
+            last_write = max(p.stat().st_mtime for p in (meta_path, part_path) if p.exists())
+        except (OSError, ValueError):
+            continue
+        if last_write < cutoff:
+            part_path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+            removed += 1
+    # 没有元数据的残留分片，以及写入存储中途中断留下的临时文件
+    for part_path in [*UPLOAD_TMP_DIR.glob("*.part"), *UPLOAD_TMP_DIR.glob("*.blob")]:
+        try:
+            if not part_path.with_suffix(".json").exists() and part_path.stat().st_mtime < cutoff:
+                part_path.unlink(missing_ok=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def maybe_gc_upload_sessions():
+    """创建会话时顺带清理（进程内限频）；也可由 flask --app app gc-uploads 定时执行"""
+    global _last_gc
+    now = time.time()
+    if now - _last_gc < GC_INTERVAL_SECONDS:
+        return
+    _last_gc = now
+    gc_upload_sessions()
+
+
+# ---------- 旧文件迁移：uploads/、avatars/ -> 内容寻址存储 ----------
+
+def _legacy_reference_columns():
+    from models.message import Message
+    from models.user import User
+    from models.group import Group
+    return (Message.file_path, User.avatar, Group.group_avatar)
+
+
+def _migrate_batch(batch, stats):
+    """batch: [(旧路径, 磁盘文件, sha256, size)]。改写引用、登记别名与引用计数后提交，再删除原文件"""
+    mapping = {legacy: blob_path(sha256, legacy) for legacy, _, sha256, _ in batch}
+    sha_of = {legacy: sha256 for legacy, _, sha256, _ in batch}
+    refs = Counter()
+    for column in _legacy_reference_columns():
+        rows = db.session.query(column, db.func.count()).filter(column.in_(mapping)).group_by(column).all()
+        for legacy, n in rows:
+            refs[sha_of[legacy]] += n
+            stats["references"] += n
+        if rows:
+            db.session.query(column.class_).filter(column.in_(mapping)).update(
+                {column: db.case(mapping, value=column)}, synchronize_session=False
+            )
+    seen = set()
+    for legacy, _, sha256, size in batch:
+        if sha256 not in seen:
+            seen.add(sha256)
+            _touch_blob(sha256, size)
+        if BlobAlias.query.filter(BlobAlias.path == legacy).first() is None:
+            db.session.add(BlobAlias(path=legacy, sha256=sha256))
+    db.session.flush()
+    for sha256, n in refs.items():
+        Blob.query.filter(Blob.sha256 == sha256).update(
+            {"ref_count": Blob.ref_count + n}, synchronize_session=False
+        )
+    db.session.commit()
+    for _, source, _, _ in batch:
+        source.unlink(missing_ok=True)
+
+
+def migrate_legacy_files(batch_size=200):
+    """
+    把 uploads/、avatars/ 平铺目录中的文件迁入内容寻址存储：
+    逐个流式计算哈希并硬链接（跨设备时复制）进分片目录，按批改写 messages.file_path、
+    users.avatar、groups.group_avatar 中的旧路径并累加引用计数，提交后才删除原文件；
+    旧路径登记到 blob_aliases，迁移后旧链接仍可访问。可重复执行，中断后重跑即可继续。
+    返回统计 {"files", "deduplicated", "bytes_saved", "references"}。
+    """
+    ensure_dirs()
+    stats = {"files": 0, "deduplicated": 0, "bytes_saved": 0, "references": 0}
+    batch = []
+    for prefix, folder in LEGACY_DIRS.items():
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                source = Path(entry.path)
+                sha256, size = _hash_file(source)
+                target = _blob_file(sha256)
+                if target.exists():
+                    stats["deduplicated"] += 1
+                    stats["bytes_saved"] += size
+                else:
+                    tmp_path = _tmp_file()
+                    try:
+                        os.link(source, tmp_path)
+                    except OSError:
+                        shutil.copyfile(source, tmp_path)
+                    _place_blob(tmp_path, sha256)
+                batch.append((f"{prefix}/{entry.name}", source, sha256, size))
+                stats["files"] += 1
+                if len(batch) >= batch_size:
+                    _migrate_batch(batch, stats)
+                    batch = []
+    if batch:
+        _migrate_batch(batch, stats)
+    return stats
@@ -0,0 +1,133 @@
+"""
+消息写入的组提交（group commit）：把短时间窗口内到达的多条消息合并到一个事务中提交
+
+SQLite 每次 commit 一次 fsync，逐条提交时吞吐受限于磁盘同步次数。开启后由单个写协程按到达顺序
+执行写入任务，窗口（GROUP_COMMIT_WINDOW_MS）到期或攒满 GROUP_COMMIT_MAX_ROWS 条后统一提交，
+提交成功后才唤醒各调用方，因此调用方拿到的消息已持久化，且同一会话内的 id 顺序与到达顺序一致。
+"""
+import time
+
+from config.database import db
+from services import tracing
+from config.settings import GROUP_COMMIT_ENABLED, GROUP_COMMIT_WINDOW_MS, GROUP_COMMIT_MAX_ROWS
+
+_writer = None
+
+
+class _Job:
+    __slots__ = ("fn", "event", "result", "error")
+
+    def __init__(self, fn, event):
+        self.fn = fn
+        self.event = event
+        self.result = None
+        self.error = None
+
+
+class GroupCommitWriter:
+    def __init__(self, app, socketio, window_ms=GROUP_COMMIT_WINDOW_MS, max_rows=GROUP_COMMIT_MAX_ROWS):
+        self.app = app
+        self.socketio = socketio
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        eio = socketio.server.eio
+        self._eio = eio
+        self._queue = eio.create_queue()
+        self._empty = eio.get_queue_empty_exception()
+        self.batches = 0
+        self.rows = 0
+        socketio.start_background_task(self._run)
+
+    def submit(self, fn):
+        """
+        提交写入任务并等待其所在批次提交完成。
+        fn 在写协程的应用上下文中执行，使用 db.session 写入，返回值原样返回给调用方
+        （ORM 对象已与写协程会话分离，属性已加载）。
+        """
+        job = _Job(fn, self._eio.create_event())
+        self._queue.put(job)
+        job.event.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except self._empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self.app.app_context():
+                try:
+                    self._execute(batch)
+                except Exception:
+                    # 批次中任一任务失败：整体回滚后逐条重试，只让失败的任务报错
+                    db.session.rollback()
+                    for job in batch:
+                        job.result, job.error = None, None
+                        try:
+                            self._execute([job])
+                        except Exception as e:
+                            db.session.rollback()
+                            job.error = e
+                finally:
+                    db.session.remove()
+            self.batches += 1
+            self.rows += len(batch)
+            for job in batch:
+                job.event.set()
+
+    def _execute(self, batch):
+        for job in batch:
+            job.result = job.fn()
+        db.session.flush()
+        # 提交前与会话分离，避免 commit 后属性过期，调用方可直接读取
+        db.session.expunge_all()
+        db.session.commit()
+
+    def stats(self):
+        return {"batches": self.batches, "rows": self.rows}
+
+
+def get_writer():
+    """开启组提交且处于带 SocketIO 的应用中时返回写协程，否则返回 None（调用方直接提交）"""
+    global _writer
+    if not GROUP_COMMIT_ENABLED:
+        return None
+    if _writer is None:
+        from flask import current_app
+        socketio = getattr(current_app, "socketio", None)
+        if socketio is None:
+            return None
+        _writer = GroupCommitWriter(current_app._get_current_object(), socketio)
+    return _writer
+
+
+def stats():
+    """写协程已启动时返回 {"batches", "rows"}，否则返回 None"""
+    return _writer.stats() if _writer is not None else None
+
+
+def write(fn):
+    """执行写入任务：开启组提交时交给写协程批量提交，否则在当前会话中直接提交。返回附着在当前会话上的结果。"""
+    writer = get_writer()
+    if writer is None:
+        with tracing.span("db.commit", group_commit=False):
+            result = fn()
+            db.session.commit()
+        return result
+    # 等待批次提交期间归还当前会话占用的连接，避免大量等待中的请求占满连接池
+    db.session.close()
+    with tracing.span("db.commit", group_commit=True):
+        result = writer.submit(fn)
+    return db.session.merge(result, load=False)
@@ -0,0 +1,168 @@
+"""
+图片变体：缩略图（thumb，居中裁成正方形，用于头像与列表）与预览图（preview，按最长边缩放，用于聊天中的图片消息）
+
+上传完成后由后台线程池生成（eventlet 下解码与缩放在 tpool 原生线程中执行），不占用上传请求；变体按内容哈希存放，相同图片只生成一次。
+尚未生成的变体在首次请求时按需生成，同时进行的按需生成数不超过 IMAGE_LAZY_MAX_CONCURRENT，
+超出时先回退到原图。依赖 Pillow（pip install pillow），未安装时只提供原图。
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from config.database import db
+from config.settings import (
+    IMAGE_VARIANTS,
+    IMAGE_WORKERS,
+    IMAGE_MAX_PENDING,
+    IMAGE_LAZY_MAX_CONCURRENT,
+    IMAGE_MAX_PIXELS,
+)
+from models.blob import ImageVariant
+from services.file_service import content_file, parse_blob_path, variant_file, variant_path
+
+try:
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+except ImportError:
+    Image = ImageOps = None
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:  # 非 eventlet 部署：请求线程本身即原生线程，直接生成
+    patcher = tpool = None
+
+logger = logging.getLogger(__name__)
+
+# JPEG 变体的压缩质量
+JPEG_QUALITY = 82
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+_pending = set()
+_pending_lock = threading.Lock()
+_lazy_slots = threading.BoundedSemaphore(IMAGE_LAZY_MAX_CONCURRENT)
+
+
+def available():
+    return Image is not None
+
+
+def _render(sha256):
+    """
+    解码原图并写出全部变体（纯 CPU 与文件操作，不访问数据库，在原生线程中执行）。
+    返回 ImageVariant 字段列表；原图无法解码时各变体的 mimetype 为 None。
+    """
+    try:
+        with Image.open(content_file(sha256)) as im:
+            im = ImageOps.exif_transpose(im)
+            has_alpha = im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info)
+            base = im.convert("RGBA" if has_alpha else "RGB")
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return [{"variant": name, "mimetype": None} for name in IMAGE_VARIANTS]
+
+    # 带透明通道的图片输出 PNG，其余输出 JPEG
+    fmt, mimetype, options = ("PNG", "image/png", {"optimize": True}) if has_alpha else \
+        ("JPEG", "image/jpeg", {"quality": JPEG_QUALITY, "optimize": True, "progressive": True})
+    results = []
+    for name, (size, mode) in IMAGE_VARIANTS.items():
+        if mode == "crop":
+            out = ImageOps.fit(base, (size, size), Image.LANCZOS)
+        else:
+            out = base.copy()
+            out.thumbnail((size, size), Image.LANCZOS)
+        target = variant_file(sha256, name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+        out.save(tmp, fmt, **options)
+        os.replace(tmp, target)
+        results.append({"variant": name, "width": out.width, "height": out.height,
+                        "size": target.stat().st_size, "mimetype": mimetype})
+    return results
+
+
+def _record(sha256, results):
+    """登记变体元数据（已存在的行保持不变）"""
+    for fields in results:
+        if ImageVariant.query.filter_by(sha256=sha256, variant=fields["variant"]).first() is not None:
+            continue
+        db.session.add(ImageVariant(sha256=sha256, **fields))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # 后台任务与按需生成同时完成
+
+
+def _recorded(sha256):
+    return ImageVariant.query.filter(ImageVariant.sha256 == sha256).count() >= len(IMAGE_VARIANTS)
+
+
+def _render_in_background(sha256):
+    """
+    后台线程池中生成：多机部署下 app.py 会 monkey patch，池中的“线程”实为协程，
+    解码与缩放须交给 tpool 的原生线程，否则整个 hub 被阻塞；未打补丁时池中即原生线程，直接生成。
+    """
+    if tpool is not None and patcher.is_monkey_patched("thread"):
+        return tpool.execute(_render, sha256)
+    return _render(sha256)
+
+
+def _generate(app, sha256):
+    try:
+        with app.app_context():
+            if not _recorded(sha256):
+                _record(sha256, _render_in_background(sha256))
+    except Exception:
+        logger.exception("生成图片变体失败: %s", sha256)
+    finally:
+        with _pending_lock:
+            _pending.discard(sha256)
+
+
+def enqueue(path):
+    """上传完成后调用：图片在后台线程池生成全部变体，立即返回；排队已满时留给按需生成"""
+    if Image is None or variant_path(path, "thumb") is None:
+        return
+    sha256 = parse_blob_path(path)
+    with _pending_lock:
+        if sha256 in _pending or len(_pending) >= IMAGE_MAX_PENDING:
+            return
+        _pending.add(sha256)
+    _executor.submit(_generate, current_app._get_current_object(), sha256)
+
+
+def get_variant(sha256, variant):
+    """
+    返回 (变体文件, mimetype)。尚未生成时按需生成；无法提供（未安装 Pillow、原图无法解码、
+    按需生成并发已满）时返回 None，由调用方回退到原图。
+    """
+    row = ImageVariant.query.filter_by(sha256=sha256, variant=variant).first()
+    if row is not None:
+        target = variant_file(sha256, variant)
+        if row.mimetype is None:
+            return None
+        if target.is_file():
+            return target, row.mimetype
+        db.session.delete(row)  # 文件已丢失：重新生成
+        db.session.commit()
+    if Image is None:
+        return None
+    if not _lazy_slots.acquire(blocking=False):
+        return None
+    try:
+        # eventlet 下在原生线程中解码与缩放，不阻塞其他协程
+        results = tpool.execute(_render, sha256) if tpool is not None else _render(sha256)
+    finally:
+        _lazy_slots.release()
+    _record(sha256, results)
+    for fields in results:
+        if fields["variant"] == variant and fields["mimetype"]:
+            return variant_file(sha256, variant), fields["mimetype"]
+    return None
+
+
+def stats():
+    return {"pending": len(_pending), "available": available()}
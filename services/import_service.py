@@ -0,0 +1,279 @@
+"""
+批量导入（组织开通）：从 CSV / JSONL 流式读取用户、好友关系与群组，每批在一个事务内按集合写入，
+不经过逐行 commit 的 create_user / add_friend / create_group。
+
+  users        nickname，link_id（可空，自动分配），password（明文，多进程并行 bcrypt）或 password_hash（已有 bcrypt 哈希）
+  friendships  user, friend：双方通讯码，写入双向 Friendship 与双方会话
+  groups       group_name, owner, members：通讯码；members 在 CSV 中以 ; 分隔，在 JSONL 中为数组。
+               由管理员开通，不要求成员是群主的好友
+
+已存在的用户（通讯码相同）、好友关系、群（群主与群名相同）与群成员跳过，可重复执行；
+引用了不存在通讯码的行跳过并计数。
+"""
+import csv
+import json
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import bcrypt
+
+from config.database import db
+from config.settings import BCRYPT_ROUNDS
+from models.conversation import Conversation
+from models.friendship import Friendship
+from models.group import Group, GroupMember
+from models.user import User
+from services import relation_cache
+from utils.id_generator import generate_link_ids
+from utils.validators import is_valid_link_id, is_valid_nickname
+
+DEFAULT_BATCH_SIZE = 5000
+# IN 查询单条语句的参数个数
+_QUERY_CHUNK = 500
+
+
+def read_rows(path, fmt=None):
+    """逐行读取 CSV（首行为表头）或 JSONL，fmt 为空时按扩展名判断"""
+    fmt = fmt or ("jsonl" if str(path).endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _batches(rows, size):
+    it = iter(rows)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ""
+
+
+def _hash_passwords(passwords, rounds):
+    """在子进程中执行：bcrypt 哈希一组密码"""
+    return [bcrypt.hashpw(p.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8") for p in passwords]
+
+
+def _resolve(link_ids):
+    """通讯码 -> user_id"""
+    link_ids = list(set(link_ids))
+    mapping = {}
+    for i in range(0, len(link_ids), _QUERY_CHUNK):
+        chunk = link_ids[i:i + _QUERY_CHUNK]
+        mapping.update(db.session.query(User.link_id, User.id).filter(User.link_id.in_(chunk)).all())  # type: ignore
+    return mapping
+
+
+def _existing(columns, keys):
+    """
+    keys 中已存在于表内的 (列值...) 组合。按首列 IN 查询（走唯一约束索引的前缀）后在内存中比对：
+    旧版 SQLite 对多列行值 IN 会扫描整个索引
+    """
+    keys = set(keys)
+    firsts = list({k[0] for k in keys})
+    found = set()
+    for i in range(0, len(firsts), _QUERY_CHUNK):
+        chunk = firsts[i:i + _QUERY_CHUNK]
+        rows = db.session.query(*columns).filter(columns[0].in_(chunk)).all()
+        found.update(key for key in map(tuple, rows) if key in keys)
+    return found
+
+
+class _Progress:
+    def __init__(self, label, callback):
+        self.label = label
+        self.callback = callback
+        self.start = time.perf_counter()
+        self.stats = {"rows": 0, "imported": 0, "skipped": 0}
+
+    def update(self, rows, imported):
+        self.stats["rows"] += rows
+        self.stats["imported"] += imported
+        self.stats["skipped"] += rows - imported
+        self.stats["seconds"] = time.perf_counter() - self.start
+        if self.callback:
+            self.callback(self.label, self.stats)
+
+
+class _UserWriter:
+    def __init__(self, id_map):
+        self.id_map = id_map
+        self.row_no = 0
+
+    def write(self, batch, hashes):
+        """写入一批用户，返回导入行数。hashes 与 batch 中需要哈希的行依次对应"""
+        hashes = iter(hashes)
+        start_row = self.row_no
+        self.row_no += len(batch)
+        custom, auto = {}, []
+        for offset, row in enumerate(batch):
+            password = _text(row.get("password"))
+            password_hash = next(hashes) if password and not row.get("password_hash") else \
+                (_text(row.get("password_hash")) or None)
+            nickname = _text(row.get("nickname"))
+            link_id = _text(row.get("link_id"))
+            if not is_valid_nickname(nickname) or (link_id and not is_valid_link_id(link_id)):
+                continue
+            values = {"nickname": nickname, "password_hash": password_hash}
+            if link_id:
+                custom.setdefault(link_id, values)
+            else:
+                auto.append((start_row + offset + 1, values))
+        for link_id in _resolve(custom):
+            del custom[link_id]
+        # 号段在独立事务中预留，须在本批写入之前分配；与本批自选通讯码相同的号丢弃重分
+        assigned = []
+        while len(assigned) < len(auto):
+            assigned += [x for x in generate_link_ids(len(auto) - len(assigned)) if x not in custom]
+        for (row_no, values), link_id in zip(auto, assigned):
+            values["link_id"] = link_id
+            if self.id_map is not None:
+                self.id_map.writerow([row_no, values["nickname"], link_id])
+        rows = [{"link_id": link_id, **values} for link_id, values in custom.items()] + [v for _, v in auto]
+        if rows:
+            db.session.execute(db.insert(User), rows)
+        db.session.commit()
+        return len(rows)
+
+
+def import_users(rows, batch_size=DEFAULT_BATCH_SIZE, workers=1, rounds=BCRYPT_ROUNDS, id_map=None, progress=None):
+    """
+    导入用户。明文密码在 workers 个子进程中并行哈希，同时主进程写入上一批。
+    id_map 为 csv.writer 时写出自动分配的通讯码（行号, 昵称, 通讯码）。返回统计。
+    """
+    report = _Progress("users", progress)
+    writer = _UserWriter(id_map)
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    pending = deque()  # (batch, [future 或 哈希列表])
+
+    def flush_one():
+        batch, parts = pending.popleft()
+        hashes = [h for part in parts for h in (part if isinstance(part, list) else part.result())]
+        report.update(len(batch), writer.write(batch, hashes))
+
+    try:
+        for batch in _batches(rows, batch_size):
+            passwords = [_text(r.get("password")) for r in batch
+                         if _text(r.get("password")) and not r.get("password_hash")]
+            if pool is None:
+                parts = [_hash_passwords(passwords, rounds)]
+            else:
+                step = -(-len(passwords) // workers) or 1
+                parts = [pool.submit(_hash_passwords, passwords[i:i + step], rounds)
+                         for i in range(0, len(passwords), step)]
+            pending.append((batch, parts))
+            # 保留一批在子进程中哈希，主进程写入前一批
+            if len(pending) > 1:
+                flush_one()
+        while pending:
+            flush_one()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return report.stats
+
+
+def import_friendships(rows, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """导入好友关系：每行写入双向 Friendship 与双方的私聊会话"""
+    report = _Progress("friendships", progress)
+    for batch in _batches(rows, batch_size):
+        ids = _resolve(_text(r.get(k)) for r in batch for k in ("user", "friend"))
+        edges = set()
+        for row in batch:
+            a, b = ids.get(_text(row.get("user"))), ids.get(_text(row.get("friend")))
+            if a and b and a != b:
+                edges.add((min(a, b), max(a, b)))
+        edges -= _existing((Friendship.user_id, Friendship.friend_id), edges)
+        pairs = edges | {(b, a) for a, b in edges}
+        if pairs:
+            db.session.execute(db.insert(Friendship), [{"user_id": a, "friend_id": b} for a, b in pairs])
+            opened = {(a, "user", b) for a, b in pairs}
+            opened -= _existing((Conversation.user_id, Conversation.chat_type, Conversation.chat_id), opened)
+            if opened:
+                db.session.execute(db.insert(Conversation), [
+                    {"user_id": a, "chat_type": t, "chat_id": b} for a, t, b in opened
+                ])
+        db.session.commit()
+        relation_cache.invalidate_friends(*{a for a, _ in pairs})
+        report.update(len(batch), len(edges))
+    return report.stats
+
+
+def _members(value):
+    if isinstance(value, list):
+        return [_text(v) for v in value]
+    return [v.strip() for v in _text(value).split(";") if v.strip()]
+
+
+def import_groups(rows, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    导入群组：群主为 owner 角色，其余为 member，并为每个成员建立群会话。
+    同一群主下同名的群视为同一个群：已存在时不再建群，只补充缺少的成员与会话（文件内重复的行合并）。
+    """
+    report = _Progress("groups", progress)
+    for batch in _batches(rows, batch_size):
+        ids = _resolve(
+            link_id for r in batch for link_id in [_text(r.get("owner"))] + _members(r.get("members"))
+        )
+        wanted = {}  # (群主, 群名) -> 成员 user_id 集合
+        for row in batch:
+            name, owner_id = _text(row.get("group_name"))[:128], ids.get(_text(row.get("owner")))
+            if not name or not owner_id:
+                continue
+            members = wanted.setdefault((owner_id, name), set())
+            members.update(ids[m] for m in _members(row.get("members")) if m in ids)
+        group_ids = _existing_groups(wanted)
+        groups = [Group(group_name=name, owner_id=owner_id) for owner_id, name in wanted
+                  if (owner_id, name) not in group_ids]
+        db.session.add_all(groups)
+        db.session.flush()
+        group_ids.update(((g.owner_id, g.group_name), g.id) for g in groups)
+
+        roles = {}
+        for key, member_ids in wanted.items():
+            group_id, owner_id = group_ids[key], key[0]
+            roles.update(((group_id, uid), "member") for uid in member_ids - {owner_id})
+            roles[(group_id, owner_id)] = "owner"
+        for key in _existing((GroupMember.group_id, GroupMember.user_id), roles):
+            del roles[key]
+        opened = {(uid, "group", gid) for gid, uid in roles}
+        opened -= _existing((Conversation.user_id, Conversation.chat_type, Conversation.chat_id), opened)
+        if roles:
+            db.session.execute(db.insert(GroupMember), [
+                {"group_id": gid, "user_id": uid, "role": role} for (gid, uid), role in roles.items()
+            ])
+        if opened:
+            db.session.execute(db.insert(Conversation), [
+                {"user_id": uid, "chat_type": t, "chat_id": gid} for uid, t, gid in opened
+            ])
+        db.session.commit()
+        # 新群的 ID 可能复用已解散群的 ID，已有群补充了成员，均清除旧条目
+        touched = {gid for gid, _ in roles} | {g.id for g in groups}
+        if touched:
+            relation_cache.invalidate_group(*touched)
+        db.session.expunge_all()
+        report.update(len(batch), len(groups))
+    return report.stats
+
+
+def _existing_groups(keys):
+    """(群主, 群名) -> 已存在的群 ID（同一群主下有多个同名群时取最早的一个）"""
+    owners = list({owner_id for owner_id, _ in keys})
+    found = {}
+    for i in range(0, len(owners), _QUERY_CHUNK):
+        chunk = owners[i:i + _QUERY_CHUNK]
+        rows = db.session.query(Group.owner_id, Group.group_name, Group.id).filter(
+            Group.owner_id.in_(chunk)  # type: ignore
+        ).order_by(Group.id.desc()).all()
+        found.update(((owner_id, name), group_id) for owner_id, name, group_id in rows if (owner_id, name) in keys)
+    return found
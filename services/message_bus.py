@@ -0,0 +1,292 @@
+"""
+Socket.IO 多进程消息总线：让任意进程的 emit 送达其他进程持有的连接
+
+    SOCKETIO_MESSAGE_QUEUE=unix:///tmp/linkin-bus.sock   单机：本地 Unix socket 代理
+    SOCKETIO_MESSAGE_QUEUE=redis://127.0.0.1:6379/0      多机：Redis 兼容服务（Redis / Valkey / KeyDB）
+
+单机代理需先启动：python -m services.message_bus --path /tmp/linkin-bus.sock
+"""
+import argparse
+import json
+import os
+import queue
+import socket as std_socket
+import struct
+import threading
+import time
+from urllib.parse import urlparse
+
+from socketio import PubSubManager, RedisManager
+
+# 跨进程房间同步（把某用户所有连接加入/移出群房间）借用 emit 通道广播
+ROOM_SYNC_EVENT = "__linkin_room_sync__"
+# 跨进程缓存失效（好友关系、群成员）同样借用 emit 通道
+CACHE_INVALIDATE_EVENT = "__linkin_cache_invalidate__"
+
+_FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+
+class RoomSyncMixin:
+    """
+    python-socketio 只能对本进程持有的 sid 操作房间；邀请、踢人时目标用户的连接可能在任意进程。
+    sync_rooms 把“source 房间内的所有连接加入/移出 target 房间”广播给所有进程，各自处理本地连接。
+    """
+
+    def sync_rooms(self, op, source_room, target_room, namespace="/"):
+        self.emit(ROOM_SYNC_EVENT, {"op": op, "source": source_room, "target": target_room}, namespace=namespace)
+
+    def _handle_emit(self, message):
+        if message.get("event") != ROOM_SYNC_EVENT:
+            return super()._handle_emit(message)
+        data = message["data"][0]
+        apply_room_sync(self, data["op"], data["source"], data["target"], message.get("namespace") or "/")
+
+
+class CacheInvalidationMixin:
+    """
+    进程内缓存（好友关系、群成员、认证用户快照）的跨进程失效：写路径提交后广播，各进程（包括自身）清除本地条目。
+    payload: {"users": [好友关系], "groups": [群成员], "profiles": [用户快照]}
+    """
+
+    def invalidate_caches(self, payload, namespace="/"):
+        self.emit(CACHE_INVALIDATE_EVENT, payload, namespace=namespace)
+
+    def _handle_emit(self, message):
+        if message.get("event") != CACHE_INVALIDATE_EVENT:
+            return super()._handle_emit(message)
+        from services import auth_cache, relation_cache
+        payload = message["data"][0]
+        relation_cache.apply_invalidation(payload)
+        auth_cache.apply_invalidation(payload)
+
+
+def broadcast_cache_invalidation(payload):
+    """经当前应用的消息总线把缓存失效广播到所有进程；单进程（无消息总线）时什么也不做"""
+    from flask import current_app, has_app_context
+
+    socketio = getattr(current_app, "socketio", None) if has_app_context() else None
+    manager = socketio.server.manager if socketio is not None else None
+    if isinstance(manager, CacheInvalidationMixin):
+        manager.invalidate_caches(payload)
+
+
+def apply_room_sync(manager, op, source_room, target_room, namespace="/"):
+    """在本进程内执行房间同步"""
+    for sid, eio_sid in list(manager.get_participants(namespace, source_room)):
+        if op == "join":
+            manager.basic_enter_room(sid, namespace, target_room, eio_sid=eio_sid)
+        else:
+            manager.basic_leave_room(sid, namespace, target_room)
+
+
+def _send_frame(sock, payload):
+    sock.sendall(_FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("bus connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_frame(sock):
+    (size,) = _FRAME_HEADER.unpack(_recv_exact(sock, _FRAME_HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ConnectionError(f"frame too large: {size}")
+    return _recv_exact(sock, size)
+
+
+class UnixSocketManager(CacheInvalidationMixin, RoomSyncMixin, PubSubManager):
+    """单机多进程：经本地 Unix socket 代理转发的 pub/sub 管理器"""
+
+    name = "unix"
+
+    def __init__(self, url="unix:///tmp/linkin-bus.sock", channel="linkin", write_only=False, logger=None,
+                 json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = urlparse(url).path
+        # 发布帧交给单个写任务按顺序发送：发送方不持锁等待 socket（eventlet 下真实锁跨 yield 持有会卡死整个 hub）
+        self._outbox = None
+        self._outbox_lock = threading.Lock()
+
+    def _socket_module(self):
+        if self.server is not None and self.server.async_mode == "eventlet":
+            from eventlet.green import socket
+            return socket
+        return std_socket
+
+    def _connect(self):
+        socket = self._socket_module()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def _encode(self, data):
+        return json.dumps({"channel": self.channel, "data": data}, separators=(",", ":")).encode("utf-8")
+
+    def _publish(self, data):
+        if self._outbox is None:
+            self._start_writer()
+        self._outbox.put(self._encode(data))
+
+    def _start_writer(self):
+        """首次发布时创建发送队列与写任务：挂在 SocketIO 服务上时用其 async_mode 对应的队列与后台任务"""
+        with self._outbox_lock:  # 只保护创建本身，其间不会让出
+            if self._outbox is not None:
+                return
+            if self.server is not None:
+                outbox = self.server.eio.create_queue()
+                self.server.start_background_task(self._writer, outbox)
+            else:
+                outbox = queue.Queue()
+                threading.Thread(target=self._writer, args=(outbox,), daemon=True).start()
+            self._outbox = outbox
+
+    def _writer(self, outbox):
+        sock = None
+        while True:
+            payload = outbox.get()
+            for retries_left in (1, 0):
+                try:
+                    if sock is None:
+                        sock = self._connect()
+                    _send_frame(sock, payload)
+                    break
+                except OSError as e:
+                    if sock is not None:
+                        sock.close()
+                    sock = None
+                    if not retries_left:
+                        self._get_logger().error(f"无法发布到消息总线 {self.path}，丢弃一帧: {e}")
+
+    def _listen(self):
+        backoff = 0.5
+        while True:
+            try:
+                sock = self._connect()
+                backoff = 0.5
+                while True:
+                    message = json.loads(_recv_frame(sock))
+                    if message.get("channel") == self.channel:
+                        yield message["data"]
+            except (OSError, ConnectionError, ValueError) as e:
+                self._get_logger().error(f"消息总线连接断开，{backoff}s 后重连: {e}")
+                if self.server is not None:
+                    self.server.sleep(backoff)
+                else:
+                    time.sleep(backoff)
+                backoff = min(backoff * 2, 5)
+
+
+class LinkInRedisManager(CacheInvalidationMixin, RoomSyncMixin, RedisManager):
+    """多机部署：Redis 兼容的 pub/sub（需在 eventlet 下 monkey patch，见 app.py）"""
+
+
+def create_client_manager(url, channel="linkin"):
+    """按消息队列 URL 创建 Socket.IO 客户端管理器；url 为空时返回 None（单进程内存模式）"""
+    if not url:
+        return None
+    scheme = urlparse(url).scheme
+    if scheme == "unix":
+        return UnixSocketManager(url, channel=channel)
+    if scheme in ("redis", "rediss", "valkey", "valkeys", "redis+sentinel", "valkey+sentinel"):
+        return LinkInRedisManager(url, channel=channel)
+    raise ValueError(f"不支持的消息队列: {url}")
+
+
+# ---------- 单机代理：把任一连接发来的帧转发给所有连接（包括发送方） ----------
+
+class _BrokerClient:
+    def __init__(self, sock):
+        self.sock = sock
+        self.outbox = queue.Queue(maxsize=10000)
+        self.alive = True
+
+    def writer(self):
+        try:
+            while self.alive:
+                payload = self.outbox.get()
+                if payload is None:
+                    break
+                _send_frame(self.sock, payload)
+        except OSError:
+            pass
+        self.alive = False
+
+    def disconnect(self):
+        """断开慢消费者：shutdown 让阻塞在 sendall / recv 中的写线程与读线程返回（仅 close 不会唤醒它们），
+        再清空发送队列放入结束标记（队列已满时 put 会永久阻塞）；socket 由该连接自己的读线程关闭"""
+        self.alive = False
+        try:
+            self.sock.shutdown(std_socket.SHUT_RDWR)
+        except OSError:
+            pass
+        while True:
+            try:
+                self.outbox.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self.outbox.put_nowait(None)
+        except queue.Full:  # 期间又有帧入队：写线程取到后发送失败同样会退出
+            pass
+
+
+def run_broker(path):
+    """运行本地 Unix socket 代理（阻塞）。每个连接一个读线程与一个写线程，慢消费者被断开而不拖慢其他进程。"""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = std_socket.socket(std_socket.AF_UNIX, std_socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(128)
+    clients = set()
+    lock = threading.Lock()
+
+    def drop(client):
+        # 先在锁内移出 clients，之后不会再有读线程向其队列转发；多个读线程同时发现队列已满时只断开一次
+        with lock:
+            if client not in clients:
+                return
+            clients.discard(client)
+        client.disconnect()
+
+    def reader(client):
+        try:
+            while client.alive:
+                payload = _recv_frame(client.sock)
+                with lock:
+                    targets = list(clients)
+                for c in targets:
+                    try:
+                        c.outbox.put_nowait(payload)
+                    except queue.Full:
+                        drop(c)
+        except (OSError, ConnectionError):
+            pass
+        drop(client)
+        client.sock.close()
+
+    print(f"[MessageBus] 代理监听 {path}")
+    while True:
+        sock, _ = server.accept()
+        client = _BrokerClient(sock)
+        with lock:
+            clients.add(client)
+        threading.Thread(target=client.writer, daemon=True).start()
+        threading.Thread(target=reader, args=(client,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LinkIn 单机 Socket.IO 消息总线代理")
+    parser.add_argument("--path", default="/tmp/linkin-bus.sock")
+    args = parser.parse_args()
+    run_broker(args.path)
+
+
+if __name__ == "__main__":
+    main()
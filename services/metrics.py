@@ -0,0 +1,281 @@
+"""
+进程内指标（Prometheus 文本格式，GET /metrics）
+
+  linkin_http_request_duration_seconds   每个路由（URL 规则）、方法、状态码的请求耗时直方图
+  linkin_http_request_db_queries         每个请求执行的 SQL 条数直方图（按路由）
+  linkin_http_request_db_seconds         每个请求的 SQL 累计耗时直方图（按路由）
+  linkin_db_queries_total / linkin_db_query_seconds_total   全部 SQL（含后台任务、组提交写协程）
+  linkin_socketio_connected_clients / linkin_socketio_rooms  抓取时从 Socket.IO 房间表读取
+  linkin_socketio_emits_total / linkin_socketio_emit_bytes_total  按事件名统计编码下发的包数与字节数
+  linkin_upload_bytes_total / linkin_uploads_total           上传字节数与完成的上传数（direct / chunked）
+  以及各缓存命中、组提交批次、图片变体队列、通讯码号段等已有 stats() 的快照
+
+记录路径只做字典查找与加法（每个指标一把不竞争的锁），直方图桶在抓取时才累加；
+多进程部署时每个 worker 各自暴露自己的指标，由 Prometheus 分别抓取。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from flask import g, request
+from socketio.packet import Packet, EVENT, BINARY_EVENT
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+_registry = []
+_collectors = []
+# 当前请求的 SQL [条数, 累计秒数]；请求之外为 None
+_request_db = ContextVar("metrics_request_db", default=None)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # 标签值 -> [各桶计数（不累加，末位为 +Inf）..., 总和]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        names = self.labels + ("le",)
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {series[-1]!r}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}"
+
+
+def register_collector(fn):
+    """抓取时调用 fn()，返回 [(名称, 类型, 说明, [(标签 dict, 值), ...]), ...]"""
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception:  # 某个数据源异常时不影响其余指标
+            continue
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- 指标 ----------
+
+HTTP_DURATION = Histogram("linkin_http_request_duration_seconds", "HTTP 请求耗时", ("method", "route", "status"))
+HTTP_DB_QUERIES = Histogram("linkin_http_request_db_queries", "每个 HTTP 请求执行的 SQL 条数", ("route",),
+                            buckets=COUNT_BUCKETS)
+HTTP_DB_SECONDS = Histogram("linkin_http_request_db_seconds", "每个 HTTP 请求的 SQL 累计耗时", ("route",))
+DB_QUERIES = Counter("linkin_db_queries_total", "执行的 SQL 条数")
+DB_SECONDS = Counter("linkin_db_query_seconds_total", "SQL 累计耗时")
+EMITS = Counter("linkin_socketio_emits_total", "编码下发的 Socket.IO 事件数（一次 emit 计一次，与接收方数量无关）",
+                ("event",))
+EMIT_BYTES = Counter("linkin_socketio_emit_bytes_total", "编码后的 Socket.IO 事件字节数", ("event",))
+UPLOAD_BYTES = Counter("linkin_upload_bytes_total", "写入的上传字节数", ("kind",))
+UPLOADS = Counter("linkin_uploads_total", "完成的上传数", ("kind",))
+
+
+class MeteredPacket(Packet):
+    """Socket.IO 包：编码事件包时按事件名计数（作为 serializer 传给 SocketIO，广播时每个 emit 只编码一次）"""
+
+    def encode(self):
+        encoded = super().encode()
+        if self.packet_type in (EVENT, BINARY_EVENT) and self.data:
+            event = self.data[0]
+            if isinstance(encoded, list):
+                size = sum(len(part) for part in encoded)
+            else:
+                size = len(encoded)
+            EMITS.inc(1, event)
+            EMIT_BYTES.inc(size, event)
+        return encoded
+
+
+# ---------- 接入 ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.metrics_start
+    DB_QUERIES.inc(1)
+    DB_SECONDS.inc(elapsed)
+    acc = _request_db.get()
+    if acc is not None:
+        acc[0] += 1
+        acc[1] += elapsed
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def init_app(app, db):
+    """为应用注册请求计时钩子、SQL 事件与内置数据源"""
+    from sqlalchemy import event
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+                event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.before_request
+    def metrics_start():
+        g.metrics_start = time.perf_counter()
+        _request_db.set([0, 0.0])
+
+    def record(status):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return
+        route = _route()
+        HTTP_DURATION.observe(time.perf_counter() - start, request.method, route, str(status))
+        queries, seconds = _request_db.get() or (0, 0.0)
+        _request_db.set(None)
+        HTTP_DB_QUERIES.observe(queries, route)
+        HTTP_DB_SECONDS.observe(seconds, route)
+
+    @app.after_request
+    def metrics_finish(response):
+        record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def metrics_teardown(exc):
+        # 未处理异常时 after_request 不会执行
+        record(500)
+
+    _register_builtin_collectors(app)
+
+
+def _register_builtin_collectors(app):
+    @register_collector
+    def socketio_rooms():
+        socketio = getattr(app, "socketio", None)
+        if socketio is None:
+            return []
+        rooms = socketio.server.manager.rooms.get("/", {})
+        connected = rooms.get(None, {})
+        kinds = {"user": 0, "group": 0, "other": 0}
+        for room in rooms:
+            if room is None or room in connected:  # 每个连接自身的 sid 房间不计
+                continue
+            kind = room.split("_", 1)[0] if isinstance(room, str) else "other"
+            kinds[kind if kind in kinds else "other"] += 1
+        return [
+            ("linkin_socketio_connected_clients", "gauge", "本进程持有的 Socket.IO 连接数", [({}, len(connected))]),
+            ("linkin_socketio_rooms", "gauge", "本进程的 Socket.IO 房间数（不含每个连接自身的房间）",
+             [({"kind": kind}, n) for kind, n in kinds.items()]),
+        ]
+
+    @register_collector
+    def caches():
+        from services import auth_cache, relation_cache
+        samples = {"hits": [], "misses": [], "size": []}
+        for prefix, stats in (("auth", auth_cache.stats()), ("relation", relation_cache.stats())):
+            for cache, values in stats.items():
+                for key in samples:
+                    samples[key].append(({"cache": f"{prefix}_{cache}"}, values[key]))
+        return [
+            ("linkin_cache_hits_total", "counter", "进程内缓存命中次数", samples["hits"]),
+            ("linkin_cache_misses_total", "counter", "进程内缓存未命中次数", samples["misses"]),
+            ("linkin_cache_entries", "gauge", "进程内缓存条目数", samples["size"]),
+        ]
+
+    @register_collector
+    def group_commit():
+        from services import group_commit as gc
+        stats = gc.stats()
+        if stats is None:
+            return []
+        return [
+            ("linkin_group_commit_batches_total", "counter", "组提交的事务数", [({}, stats["batches"])]),
+            ("linkin_group_commit_rows_total", "counter", "组提交写入的任务数", [({}, stats["rows"])]),
+        ]
+
+    @register_collector
+    def images():
+        from services import image_service
+        stats = image_service.stats()
+        return [("linkin_image_variants_pending", "gauge", "排队等待生成变体的图片数", [({}, stats["pending"])])]
+
+    @register_collector
+    def link_ids():
+        from utils import id_generator
+        families = {"reservations": [], "skipped": [], "ready": []}
+        for length, stats in id_generator.stats().items():
+            for key, value in stats.items():
+                families[key].append(({"length": str(length)}, value))
+        return [
+            ("linkin_link_id_reservations_total", "counter", "通讯码号段预留次数", families["reservations"]),
+            ("linkin_link_id_skipped_total", "counter", "预留号段中因已被占用而跳过的通讯码数", families["skipped"]),
+            ("linkin_link_id_ready", "gauge", "本进程已预留、尚未分配的通讯码数", families["ready"]),
+        ]
@@ -1,8 +1,10 @@
 """
 通知服务：未读数量、推送（与 WebSocket 配合由 api/websocket 使用）
 """
-from models.message import Message
-from models.group import UserGroupRead
+from config.database import db
+from models.message import Message, MessageSegment
+from models.group import Group, GroupMember, UserGroupRead
+from models.conversation import Conversation
 
 
 def get_unread_count(user_id, chat_type="user", chat_id=None):
@@ -21,38 +23,138 @@ def get_unread_count(user_id, chat_type="user", chat_id=None):
 
 
 def get_group_unread_count(user_id, group_id):
-    """群聊未读数：该群中 id 大于用户 last_read_message_id 的消息数"""
-    rec = UserGroupRead.query.filter(
+    """群聊未读数：群最新序号 - 用户已读序号 - 已读位置之后自己发送的条数（两次主键/唯一索引查找，与积压量无关）"""
+    last_seq = db.session.query(Group.last_seq).filter(Group.id == group_id).scalar() or 0
+    rec = db.session.query(UserGroupRead.last_read_seq, UserGroupRead.own_since_read).filter(
         UserGroupRead.user_id == user_id,
         UserGroupRead.group_id == group_id,
     ).first()
-    last_id = rec.last_read_message_id if rec else 0
-    return Message.query.filter(
-        Message.group_id == group_id,
-        Message.id > last_id,
-        Message.sender_id != user_id,
-    ).count()
+    read_seq, own = rec if rec else (0, 0)
+    return max(0, last_seq - read_seq - own)
 
 
 def get_unread_summary(user_id):
     """
-    返回当前用户所有会话的未读汇总。
+    返回当前用户所有会话的未读汇总（读取会话读模型中维护好的未读数，单次查询）。
     列表项: { "chat_type": "user"|"group", "chat_id": int, "unread": int }
     """
-    from controllers import friend_controller
-    from controllers.group import get_user_groups
-
-    summary = []
-    for f in friend_controller.get_friends(user_id):
-        fid = f["id"] if isinstance(f, dict) else getattr(f, "id", None)
-        if fid is None:
-            continue
-        cnt = get_unread_count(user_id, "user", fid)
-        if cnt > 0:
-            summary.append({"chat_type": "user", "chat_id": fid, "unread": cnt})
-    for g in get_user_groups(user_id):
-        gid = g["id"] if isinstance(g, dict) else g.id
-        cnt = get_group_unread_count(user_id, gid)
-        if cnt > 0:
-            summary.append({"chat_type": "group", "chat_id": gid, "unread": cnt})
-    return summary
+    rows = db.session.query(Conversation.chat_type, Conversation.chat_id, Conversation.unread).filter(
+        Conversation.user_id == user_id,
+        Conversation.unread > 0,
+    ).all()
+    return [{"chat_type": t, "chat_id": cid, "unread": n} for t, cid, n in rows]
+
+
+# ---------- 群内序号与已读位置（在调用方事务内执行，随调用方 commit 生效） ----------
+
+def next_group_seq(group_id):
+    """为新群消息分配群内序号：递增 Group.last_seq 并返回新值（写锁保证同一群内连续且不重复）"""
+    Group.query.filter(Group.id == group_id).update(
+        {"last_seq": Group.last_seq + 1}, synchronize_session=False
+    )
+    return db.session.query(Group.last_seq).filter(Group.id == group_id).scalar()
+
+
+def incr_own_group_message(user_id, group_id):
+    """用户在群内发送消息：已读位置之后的自有消息数 +1（该消息不计入其本人的未读）"""
+    updated = UserGroupRead.query.filter(
+        UserGroupRead.user_id == user_id,
+        UserGroupRead.group_id == group_id,
+    ).update({"own_since_read": UserGroupRead.own_since_read + 1}, synchronize_session=False)
+    if not updated:
+        db.session.add(UserGroupRead(user_id=user_id, group_id=group_id, own_since_read=1))
+
+
+def advance_group_read(user_id, group_id, last_message_id=0):
+    """群聊标记已读：已读序号推进到群最新序号（同一条语句内读取，不会漏掉并发发送的消息）"""
+    group_seq = db.select(Group.last_seq).where(Group.id == group_id).scalar_subquery()
+    updated = UserGroupRead.query.filter(
+        UserGroupRead.user_id == user_id,
+        UserGroupRead.group_id == group_id,
+    ).update({
+        "last_read_seq": group_seq,
+        "own_since_read": 0,
+        "last_read_message_id": db.case(
+            (UserGroupRead.last_read_message_id > last_message_id, UserGroupRead.last_read_message_id),
+            else_=last_message_id,
+        ),
+    }, synchronize_session=False)
+    if not updated:
+        last_seq = db.session.query(Group.last_seq).filter(Group.id == group_id).scalar() or 0
+        db.session.add(UserGroupRead(
+            user_id=user_id, group_id=group_id, last_read_message_id=last_message_id, last_read_seq=last_seq
+        ))
+
+
+def rebuild_group_sequences():
+    """
+    按 id 顺序为已有群消息补齐群内序号，并据 last_read_message_id 换算各成员的已读序号与自有消息数。
+    升级已有数据库时执行（init_db 新增 seq 列后自动调用）。返回处理的群消息条数。
+    已归档的消息（均早于热数据且视为已读）占用序号 1..归档条数，热数据从其后继续编号。
+    """
+    def archived(group_id):
+        return db.select(db.func.coalesce(db.func.sum(MessageSegment.count), 0)).where(
+            MessageSegment.chat_type == "group", MessageSegment.chat_id == group_id
+        ).scalar_subquery()
+
+    # 一次窗口函数编号（ROW_NUMBER，SQLite >= 3.25）+ UPDATE ... FROM，整体 O(n log n)；
+    # 先清空再写入，避免逐行更新时与 (group_id, seq) 唯一索引中尚未改写的旧序号冲突
+    offsets = db.select(
+        MessageSegment.chat_id.label("group_id"),
+        db.func.sum(MessageSegment.count).label("archived"),
+    ).where(MessageSegment.chat_type == "group").group_by(MessageSegment.chat_id).subquery()
+    numbered = db.select(
+        Message.id.label("id"),
+        (db.func.coalesce(offsets.c.archived, 0)
+         + db.func.row_number().over(partition_by=Message.group_id, order_by=Message.id)).label("seq"),
+    ).outerjoin(offsets, offsets.c.group_id == Message.group_id).where(
+        Message.group_id.isnot(None)  # type: ignore
+    ).subquery()
+    Message.query.filter(Message.group_id.isnot(None)).update(  # type: ignore
+        {"seq": None}, synchronize_session=False
+    )
+    db.session.execute(
+        db.update(Message).where(Message.id == numbered.c.id).values(seq=numbered.c.seq)
+    )
+    Group.query.update({
+        "last_seq": db.func.coalesce(
+            db.select(db.func.max(Message.seq)).where(Message.group_id == Group.id).scalar_subquery(),
+            archived(Group.id),
+        )
+    }, synchronize_session=False)
+
+    # 发过言但没有已读记录的成员补建记录，使其自有消息能从未读中扣除
+    has_read = db.select(UserGroupRead.id).where(
+        UserGroupRead.user_id == GroupMember.user_id,
+        UserGroupRead.group_id == GroupMember.group_id,
+    ).exists()
+    db.session.execute(
+        db.insert(UserGroupRead).from_select(
+            ["user_id", "group_id", "last_read_message_id"],
+            db.select(GroupMember.user_id, GroupMember.group_id, db.literal(0)).where(~has_read),
+        )
+    )
+    last_read_id = UserGroupRead.last_read_message_id
+    UserGroupRead.query.update({
+        # 序号随 id 递增：已读位置之前最新一条的序号，走 (group_id, id) 索引定位而不扫描范围
+        "last_read_seq": db.func.coalesce(
+            db.select(Message.seq).where(
+                Message.group_id == UserGroupRead.group_id, Message.id <= last_read_id
+            ).order_by(Message.id.desc()).limit(1).scalar_subquery(),
+            archived(UserGroupRead.group_id),
+        ),
+        "own_since_read": 0,
+    }, synchronize_session=False)
+    # 自有消息数：一条分组计数按发送者索引只读各成员自己发的消息，而不是每个成员各扫一遍所在群的全部消息
+    # （成员数 × 消息数）。group_id + 0 让 SQLite 在没有统计信息的新库上也不选 (group_id, id) 索引。
+    own = db.select(
+        UserGroupRead.id.label("id"), db.func.count(Message.id).label("n"),
+    ).select_from(Message).join(UserGroupRead, db.and_(
+        UserGroupRead.user_id == Message.sender_id,
+        UserGroupRead.group_id == Message.group_id + 0,
+    )).where(Message.id > UserGroupRead.last_read_message_id).group_by(UserGroupRead.id).subquery()
+    db.session.execute(
+        db.update(UserGroupRead).where(UserGroupRead.id == own.c.id).values(own_since_read=own.c.n)
+    )
+    db.session.commit()
+    return Message.query.filter(Message.group_id.isnot(None)).count()  # type: ignore
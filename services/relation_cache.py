@@ -0,0 +1,85 @@
+"""
+好友关系与群成员缓存：user_id -> 好友 ID 集合，group_id -> {user_id: role}
+供发送消息、拉取群历史、邀请/踢人等鉴权判断使用，命中时不查询数据库。
+写路径（加/删好友、建群、邀请、踢人、解散）提交后调用 invalidate_*；
+多进程部署时失效消息经 Socket.IO 消息总线广播到所有进程（见 services/message_bus.py）。
+"""
+import threading
+
+from config.database import db
+from config.settings import RELATION_CACHE_MAX_ENTRIES, RELATION_CACHE_TTL_SECONDS
+from services.auth_cache import TTLCache
+
+_friends = TTLCache(RELATION_CACHE_MAX_ENTRIES, ttl=RELATION_CACHE_TTL_SECONDS)
+_members = TTLCache(RELATION_CACHE_MAX_ENTRIES, ttl=RELATION_CACHE_TTL_SECONDS)
+
+# 失效代数：加载期间发生过失效则不写回缓存，避免把失效前读到的旧数据重新放进去
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _load(cache, key, loader):
+    value = cache.get(key)
+    if value is not None:
+        return value
+    generation = _generation
+    value = loader()
+    if generation == _generation:
+        cache.set(key, value)
+    return value
+
+
+def friend_ids(user_id):
+    """用户的好友 ID 集合（frozenset）"""
+    from models.friendship import Friendship
+
+    def load():
+        rows = db.session.query(Friendship.friend_id).filter(Friendship.user_id == user_id).all()
+        return frozenset(fid for (fid,) in rows)
+
+    return _load(_friends, user_id, load)
+
+
+def member_roles(group_id):
+    """群成员 {user_id: role}；群不存在时为空"""
+    from models.group import GroupMember
+
+    def load():
+        rows = db.session.query(GroupMember.user_id, GroupMember.role).filter(GroupMember.group_id == group_id).all()
+        return dict(rows)
+
+    return _load(_members, group_id, load)
+
+
+def apply_invalidation(payload):
+    """清除本进程的缓存条目。payload: {"users": [...], "groups": [...]}"""
+    global _generation
+    with _generation_lock:
+        _generation += 1
+    for user_id in payload.get("users", ()):
+        _friends.pop(user_id)
+    for group_id in payload.get("groups", ()):
+        _members.pop(group_id)
+
+
+def _broadcast(payload):
+    from services.message_bus import broadcast_cache_invalidation
+    broadcast_cache_invalidation(payload)
+
+
+def invalidate_friends(*user_ids):
+    """好友关系变更（在 commit 之后调用）"""
+    payload = {"users": list(user_ids)}
+    apply_invalidation(payload)
+    _broadcast(payload)
+
+
+def invalidate_group(*group_ids):
+    """群成员变更、建群或解散（在 commit 之后调用）"""
+    payload = {"groups": list(group_ids)}
+    apply_invalidation(payload)
+    _broadcast(payload)
+
+
+def stats():
+    return {"friends": _friends.stats(), "members": _members.stats()}
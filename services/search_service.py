@@ -0,0 +1,136 @@
+"""
+消息全文检索：SQLite FTS5 索引（trigram 分词，中文无需分词即可做子串匹配）
+"""
+import html
+import re
+
+from config.database import db
+
+FTS_TABLE = "messages_fts"
+# trigram 分词要求关键字至少 3 个字符，更短的关键字走 LIKE 路径
+FTS_MIN_KEYWORD_LENGTH = 3
+SNIPPET_TOKENS = 32
+
+# snippet() 的高亮标记：先用控制字符占位，转义后再替换为 <mark>，避免消息内容注入 HTML
+_HL_OPEN, _HL_CLOSE = "\x02", "\x03"
+
+_fts_enabled = False
+
+_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        content, content='messages', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+
+def init_search_index(engine):
+    """
+    建立 FTS5 索引与同步触发器（仅 SQLite，且需支持 trigram 分词，即 SQLite >= 3.34）。
+    首次建立时从 messages 表全量构建。不可用时保持 LIKE 检索。
+    """
+    global _fts_enabled
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conn:
+            existed = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+            ).first() is not None
+            for ddl in _DDL:
+                conn.exec_driver_sql(ddl)
+            if not existed:
+                conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except Exception as e:  # 旧版 SQLite 不支持 fts5 / trigram
+        print(f"[Search] FTS5 索引不可用，使用 LIKE 检索: {e}")
+        _fts_enabled = False
+        return False
+    _fts_enabled = True
+    return True
+
+
+def fts_enabled():
+    return _fts_enabled
+
+
+def can_use_fts(keyword):
+    return _fts_enabled and len(keyword) >= FTS_MIN_KEYWORD_LENGTH
+
+
+def rebuild_search_index():
+    """从 messages 表重建全文索引（用于已有数据库或索引损坏时）"""
+    if not _fts_enabled:
+        return False
+    db.session.execute(db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    db.session.commit()
+    return True
+
+
+def optimize_search_index():
+    """合并全文索引的 b-tree 段（批量删除消息后回收空间）"""
+    if not _fts_enabled:
+        return False
+    db.session.execute(db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+    db.session.commit()
+    return True
+
+
+def _visible_clause():
+    """当前用户可见的消息：与好友的私聊 + 所在群的群消息（子查询，不展开 ID 列表）"""
+    return """(
+        (m.group_id IS NULL AND (
+            (m.sender_id = :uid AND m.receiver_id IN (SELECT friend_id FROM friendships WHERE user_id = :uid))
+            OR (m.receiver_id = :uid AND m.sender_id IN (SELECT friend_id FROM friendships WHERE user_id = :uid))
+        ))
+        OR m.group_id IN (SELECT group_id FROM group_members WHERE user_id = :uid)
+    )"""
+
+
+def search_fts(user_id, keyword, limit=50):
+    """
+    全文检索当前用户可见的文本消息，按相关度（bm25）排序，相同相关度按新到旧。
+    返回 [(message_id, snippet_html), ...]
+    """
+    phrase = '"' + keyword.replace('"', '""') + '"'
+    sql = db.text(f"""
+        SELECT m.id AS id, snippet({FTS_TABLE}, 0, :hl_open, :hl_close, '…', :tokens) AS snippet
+        FROM {FTS_TABLE} JOIN messages m ON m.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH :phrase
+          AND m.message_type = 'text'
+          AND {_visible_clause()}
+        ORDER BY {FTS_TABLE}.rank, m.id DESC
+        LIMIT :limit
+    """).columns(db.column("id", db.Integer), db.column("snippet", db.String))  # 声明为 SELECT，可走只读连接
+    rows = db.session.execute(sql, {
+        "phrase": phrase,
+        "uid": user_id,
+        "limit": limit,
+        "hl_open": _HL_OPEN,
+        "hl_close": _HL_CLOSE,
+        "tokens": SNIPPET_TOKENS,
+    }).all()
+    return [(mid, _render_snippet(snip)) for mid, snip in rows]
+
+
+def _render_snippet(raw):
+    return html.escape(raw or "").replace(_HL_OPEN, "<mark>").replace(_HL_CLOSE, "</mark>")
+
+
+def highlight(content, keyword):
+    """LIKE 路径的高亮：大小写不敏感地标记所有命中（HTML 已转义）"""
+    if not content:
+        return ""
+    if not keyword:
+        return _render_snippet(content)
+    # 在原文上匹配取偏移：lower() 可能改变字符串长度（如 "İ"），按小写串的偏移切原文会错位
+    marked = re.sub(re.escape(keyword), lambda m: _HL_OPEN + m.group(0) + _HL_CLOSE, content, flags=re.IGNORECASE)
+    return _render_snippet(marked)
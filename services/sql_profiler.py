@@ -0,0 +1,182 @@
+"""
+请求级 SQL 分析：统计每个请求执行的语句条数、耗时与重复出现的语句形状，标记疑似 N+1
+
+  SQL_PROFILE_MODE=off     默认；未设置 SQL_PROFILE_TOKEN 时不注册任何钩子
+  SQL_PROFILE_MODE=sample  按 SQL_PROFILE_SAMPLE_RATE 抽样分析，发现疑似 N+1 或超出查询预算时写 WARNING 日志
+  SQL_PROFILE_MODE=strict  分析每个请求，超出查询预算时抛出 QueryBudgetExceeded（开发与测试环境使用：
+                           app.testing 下异常直接抛给测试客户端的调用方，否则返回 500）
+  设置 SQL_PROFILE_TOKEN 后，任何模式下携带 X-SQL-Profile: <token> 的请求都会被分析，
+  摘要写入响应头（X-SQL-Queries、X-SQL-Time-Ms、X-SQL-Repeated、Server-Timing），完整报告写 INFO 日志。
+
+语句形状：展开的 IN (?, ?, ...) 合并为 IN (?...)，数字字面量替换为 ?。同一请求内某个 SELECT 形状
+出现 SQL_N_PLUS_ONE_THRESHOLD 次及以上即视为疑似 N+1（典型为循环中懒加载关系）。
+查询预算：路由函数用 @query_budget(n) 声明（放在 @app.route 之下），未声明时为 SQL_QUERY_BUDGET。
+分析结果同时计入 /metrics（linkin_sql_profiled_requests_total 等，按路由）。
+"""
+import hmac
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+
+from flask import current_app, request
+
+from config.settings import (
+    SQL_PROFILE_MODE,
+    SQL_PROFILE_SAMPLE_RATE,
+    SQL_PROFILE_TOKEN,
+    SQL_QUERY_BUDGET,
+    SQL_N_PLUS_ONE_THRESHOLD,
+)
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+HEADER = "X-SQL-Profile"
+
+PROFILED = metrics.Counter("linkin_sql_profiled_requests_total", "经过 SQL 分析的请求数", ("route",))
+N_PLUS_ONE = metrics.Counter("linkin_sql_n_plus_one_total", "出现疑似 N+1 语句形状的已分析请求数", ("route",))
+BUDGET_EXCEEDED = metrics.Counter("linkin_sql_budget_exceeded_total", "超出查询预算的已分析请求数", ("route",))
+
+_IN_LIST = re.compile(r"\b(IN\s*)\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+# 当前请求的 Profile；未分析的请求为 None
+_current = ContextVar("sql_profile", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """strict 模式下路由执行的 SQL 条数超出预算"""
+
+
+def query_budget(limit):
+    """声明路由的查询预算（条数）"""
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+
+def shape(statement):
+    """语句形状：合并 IN 列表、替换数字字面量、压缩空白"""
+    statement = _IN_LIST.sub(r"\1(?...)", statement)
+    statement = _NUMBER.sub("?", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class Profile:
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}  # 原始语句 -> [次数, 秒数]；形状在出报告时才计算
+
+    def add(self, statement, elapsed):
+        self.count += 1
+        self.seconds += elapsed
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def shapes(self):
+        """[(形状, 次数, 秒数)]，按次数降序"""
+        merged = {}
+        for statement, (count, seconds) in self.statements.items():
+            entry = merged.setdefault(shape(statement), [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+        return sorted(((s, c, t) for s, (c, t) in merged.items()), key=lambda x: -x[1])
+
+    def repeated(self, threshold=SQL_N_PLUS_ONE_THRESHOLD):
+        """疑似 N+1：出现 threshold 次及以上的 SELECT 形状"""
+        return [(s, c, t) for s, c, t in self.shapes() if c >= threshold and s.upper().startswith("SELECT")]
+
+    def report(self, route, budget):
+        lines = [f"{request.method} {route}: {self.count} 条 SQL（预算 {budget}），{self.seconds * 1000:.1f}ms"]
+        for s, c, t in self.shapes()[:10]:
+            lines.append(f"  {c:>4}× {t * 1000:>7.1f}ms  {s[:300]}")
+        return "\n".join(lines)
+
+
+def current_profile():
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        context.profile_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None and hasattr(context, "profile_start"):
+        profile.add(statement, time.perf_counter() - context.profile_start)
+
+
+def _header_triggered():
+    value = request.headers.get(HEADER)
+    return bool(SQL_PROFILE_TOKEN and value and hmac.compare_digest(value, SQL_PROFILE_TOKEN))
+
+
+def _budget():
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    return getattr(view, "query_budget", SQL_QUERY_BUDGET)
+
+
+def init_app(app, db):
+    """按配置注册请求钩子与 SQL 事件；关闭且未设置 token 时什么也不做"""
+    if SQL_PROFILE_MODE == "off" and not SQL_PROFILE_TOKEN:
+        return
+    from sqlalchemy import event
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+                event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.before_request
+    def sql_profile_start():
+        triggered = _header_triggered()
+        if triggered or SQL_PROFILE_MODE == "strict" or (
+            SQL_PROFILE_MODE == "sample" and random.random() < SQL_PROFILE_SAMPLE_RATE
+        ):
+            request.environ["linkin.sql_profile_header"] = triggered
+            _current.set(Profile())
+
+    @app.after_request
+    def sql_profile_finish(response):
+        profile = _current.get()
+        if profile is None:
+            return response
+        _current.set(None)
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        budget = _budget()
+        repeated = profile.repeated()
+        over = profile.count > budget
+        PROFILED.inc(1, route)
+        if repeated:
+            N_PLUS_ONE.inc(1, route)
+        if over:
+            BUDGET_EXCEEDED.inc(1, route)
+        if request.environ.get("linkin.sql_profile_header"):
+            response.headers["X-SQL-Queries"] = str(profile.count)
+            response.headers["X-SQL-Time-Ms"] = f"{profile.seconds * 1000:.2f}"
+            response.headers["X-SQL-Repeated"] = "; ".join(f"{c}x {s[:120]}" for s, c, _ in repeated[:3])
+            response.headers.add("Server-Timing", f'db;dur={profile.seconds * 1000:.2f};desc="{profile.count} queries"')
+            logger.info("SQL 分析\n%s", profile.report(route, budget))
+        elif repeated or over:
+            logger.warning("疑似 N+1 或超出查询预算\n%s", profile.report(route, budget))
+        if over and SQL_PROFILE_MODE == "strict":
+            raise QueryBudgetExceeded(profile.report(route, budget))
+        return response
+
+    @app.teardown_request
+    def sql_profile_teardown(exc):
+        _current.set(None)
@@ -0,0 +1,125 @@
+"""
+/storage 文件下发：缓存校验、Range 与零拷贝发送
+
+内容寻址路径（blobs/...、图片变体 variants/...）的内容永不改变：以 SHA-256 作强 ETag，允许客户端长期缓存（immutable）；
+迁移前的旧路径（uploads/、avatars/）每次向服务端校验，未变化时返回 304。
+条件请求与单段 Range 由 werkzeug 的 send_file 处理；在 eventlet 服务器的明文连接上，
+较大的 200/206 响应体改用 os.sendfile 由内核从页缓存直接写入客户端 socket，不经过 Python 缓冲。
+"""
+import os
+import socket
+import time
+from wsgiref.handlers import format_date_time
+
+from flask import Response, redirect, request, send_file
+
+from config.settings import STORAGE_SENDFILE_ENABLED, STORAGE_SENDFILE_MIN_BYTES, IMAGE_VARIANTS
+from services.file_service import resolve_path, guess_mimetype, parse_variant_path, content_file, blob_path
+
+# 内容寻址文件的缓存时长（一年）
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# 零拷贝发送时等待 socket 可写的超时（秒），慢客户端超时后断开
+SENDFILE_WRITE_TIMEOUT = 60
+
+
+def _client_socket(environ):
+    """eventlet 服务器上的明文客户端 socket（与 eventlet.websocket 取 socket 的方式相同）；其他情况返回 None"""
+    if not hasattr(os, "sendfile") or environ.get("wsgi.url_scheme") != "http":
+        return None
+    get_socket = getattr(environ.get("eventlet.input"), "get_socket", None)
+    return get_socket() if get_socket is not None else None
+
+
+class SendfileResponse(Response):
+    """
+    响应头由本对象直接写入客户端 socket，响应体用 os.sendfile 发送，随后关闭连接
+    （绕过了 eventlet 的响应写出，无法保持长连接，因此只用于大文件）。
+    """
+
+    def __init__(self, path, offset, count, status, headers):
+        super().__init__(status=status, headers=headers)
+        self.file_range = (path, offset, count)
+
+    def __call__(self, environ, start_response):
+        import eventlet.wsgi
+        from eventlet.hubs import trampoline
+
+        sock = environ["eventlet.input"].get_socket()
+        path, offset, count = self.file_range
+        headers = self.get_wsgi_headers(environ)
+        headers["Connection"] = "close"
+        headers.setdefault("Date", format_date_time(time.time()))
+        head = f"HTTP/1.1 {self.status}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.to_wsgi_list())
+        # 告知 eventlet 响应已自行写出（eventlet.websocket 使用的同一机制），其随后关闭连接
+        eventlet.wsgi.WSGI_LOCAL.already_handled = True
+        try:
+            sock.sendall((head + "\r\n").encode("latin-1"))
+            with open(path, "rb") as f:
+                while count > 0:
+                    try:
+                        sent = os.sendfile(sock.fileno(), f.fileno(), offset, count)
+                    except BlockingIOError:
+                        trampoline(sock, write=True, timeout=SENDFILE_WRITE_TIMEOUT)
+                        continue
+                    if sent == 0:
+                        break
+                    offset += sent
+                    count -= sent
+        except OSError:
+            pass  # 客户端中途断开或写超时
+        return []
+
+
+def _send_variant(variant, sha256, ext):
+    """
+    图片变体：已生成的按内容长期缓存；暂时无法提供时临时重定向到带原扩展名的原图
+    （不带扩展名的原图路径只能按 application/octet-stream 下发，且会被长期缓存）。
+    早期不带扩展名的变体路径无从得知扩展名，此时返回 404。
+    """
+    from services.image_service import get_variant
+
+    if variant not in IMAGE_VARIANTS or not content_file(sha256).is_file():
+        return "", 404
+    found = get_variant(sha256, variant)
+    if found is None:
+        if ext is None:
+            return "", 404
+        return redirect("/storage/" + blob_path(sha256, f"original.{ext}"))
+    path, mimetype = found
+    response = send_file(path, mimetype=mimetype, etag=f"{sha256}-{variant}", max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+
+def send_stored_file(subpath):
+    """/storage/<subpath> 的响应"""
+    variant = parse_variant_path(subpath)
+    if variant is not None:
+        return _send_variant(*variant)
+    resolved = resolve_path(subpath)
+    if resolved is None:
+        return "", 404
+    path, name, sha256 = resolved
+    if sha256 is not None and subpath.startswith("blobs/"):
+        response = send_file(path, mimetype=guess_mimetype(name), download_name=name, etag=sha256,
+                             max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.immutable = True
+    else:
+        # 旧路径：已迁移的以内容哈希作 ETag，未迁移的由 werkzeug 按修改时间与大小生成
+        response = send_file(path, mimetype=guess_mimetype(name), download_name=name, etag=sha256 or True,
+                             max_age=0)
+        response.cache_control.no_cache = True
+
+    sock = _client_socket(request.environ)
+    if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+        # eventlet 的 16KB 写缓冲使响应头与响应体分两次 send，Nagle 算法会扣住后一段
+        # 直到客户端的延迟 ACK（约 40ms）；下发文件的连接关闭 Nagle
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    length = response.content_length or 0
+    if (STORAGE_SENDFILE_ENABLED and sock is not None and request.method == "GET"
+            and response.status_code in (200, 206) and length >= STORAGE_SENDFILE_MIN_BYTES):
+        offset = response.content_range.start if response.status_code == 206 else 0
+        headers = response.headers.copy()
+        response.close()
+        return SendfileResponse(path, offset or 0, length, response.status, headers)
+    return response
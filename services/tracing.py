@@ -0,0 +1,199 @@
+"""
+请求到推送的轻量链路追踪：每个被采样的 HTTP 请求生成一个 trace_id，记录各阶段的耗时（span）
+
+  http                       整个请求（根 span，属性含方法、路由、状态码）
+  auth                       require_auth（认证缓存查找）
+  controller.<函数名>        以 @traced 标注的控制器调用
+  check.*                    发送前的好友 / 群成员校验
+  db.commit                  group_commit.write：组提交时包含排队等待批次提交的时间
+  serialize                  消息 to_dict
+  emit                       Socket.IO 推送 new_message（编码并放入各连接的发送队列）
+
+被采样请求推送的 new_message 载荷带 trace_id 字段，客户端可据此把收到消息的时刻与服务端链路对上；
+响应头 X-Trace-Id 返回同一 ID。
+
+  TRACING_SAMPLE_RATE   采样比例（默认 0，关闭：不注册请求钩子，span() 直接返回空操作对象）
+  TRACING_EXPORTER      memory：保留最近 TRACING_BUFFER_SIZE 条，GET /debug/traces 查看（须设置 METRICS_TOKEN）
+                        file：每条链路一行 JSON 追加写入 TRACING_FILE
+未采样的请求只多一次 ContextVar 读取；写协程等其他协程中没有链路上下文，其中的 span 同样为空操作。
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from config.settings import TRACING_SAMPLE_RATE, TRACING_EXPORTER, TRACING_FILE, TRACING_BUFFER_SIZE
+
+# 当前请求的 Trace；未采样或请求之外为 None
+_current = ContextVar("trace", default=None)
+
+_recent = deque(maxlen=TRACING_BUFFER_SIZE)
+_file_lock = threading.Lock()
+_file = None
+
+
+class Trace:
+    __slots__ = ("trace_id", "started_at", "origin", "spans", "stack")
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []  # [名称, 父 span 下标, 开始偏移秒, 耗时秒, 属性]
+        self.stack = []
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "spans": [
+                {
+                    "name": name,
+                    "parent": parent,
+                    "start_ms": round(start * 1000, 3),
+                    "duration_ms": round(duration * 1000, 3) if duration is not None else None,
+                    **({"attrs": attrs} if attrs else {}),
+                }
+                for name, parent, start, duration, attrs in self.spans
+            ],
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "index")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        parent = trace.stack[-1] if trace.stack else None
+        self.index = len(trace.spans)
+        trace.spans.append([name, parent, 0.0, None, attrs])
+
+    def __enter__(self):
+        self.trace.spans[self.index][2] = time.perf_counter() - self.trace.origin
+        self.trace.stack.append(self.index)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.trace.spans[self.index]
+        span[3] = time.perf_counter() - self.trace.origin - span[2]
+        if exc_type is not None:
+            span[4]["error"] = exc_type.__name__
+        self.trace.stack.pop()
+        return False
+
+    def set(self, key, value):
+        self.trace.spans[self.index][4][key] = value
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, **attrs):
+    """with span("emit", rooms=2): ...；当前请求未采样时返回空操作对象"""
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name, attrs)
+
+
+def traced(f):
+    """把函数调用记录为 controller.<函数名> span"""
+    name = f"controller.{f.__name__}"
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if _current.get() is None:
+            return f(*args, **kwargs)
+        with span(name):
+            return f(*args, **kwargs)
+    return wrapper
+
+
+def current_trace_id():
+    trace = _current.get()
+    return trace.trace_id if trace is not None else None
+
+
+def inject(payload):
+    """被采样时在推送载荷中加入 trace_id（原地修改并返回）"""
+    trace = _current.get()
+    if trace is not None:
+        payload["trace_id"] = trace.trace_id
+    return payload
+
+
+def recent(limit=50):
+    """memory 导出器中最近的链路，新的在前"""
+    return list(reversed(_recent))[:limit]
+
+
+def _export(trace):
+    record = trace.to_dict()
+    if TRACING_EXPORTER == "file":
+        global _file
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with _file_lock:
+            if _file is None:
+                Path(TRACING_FILE).parent.mkdir(parents=True, exist_ok=True)
+                _file = open(TRACING_FILE, "a", encoding="utf-8")
+            _file.write(line)
+            _file.flush()
+    else:
+        _recent.append(record)
+
+
+def init_app(app):
+    """TRACING_SAMPLE_RATE > 0 时注册请求钩子"""
+    if TRACING_SAMPLE_RATE <= 0:
+        return
+    from flask import request
+
+    @app.before_request
+    def trace_start():
+        if random.random() >= TRACING_SAMPLE_RATE:
+            return
+        trace = Trace()
+        root = _Span(trace, "http", {"method": request.method})
+        root.__enter__()
+        _current.set(trace)
+
+    @app.after_request
+    def trace_response(response):
+        trace = _current.get()
+        if trace is not None:
+            trace.spans[0][4]["status"] = response.status_code
+            response.headers["X-Trace-Id"] = trace.trace_id
+        return response
+
+    @app.teardown_request
+    def trace_finish(exc):
+        trace = _current.get()
+        if trace is None:
+            return
+        _current.set(None)
+        root = trace.spans[0]
+        root[3] = time.perf_counter() - trace.origin - root[2]
+        root[4]["route"] = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        root[4].setdefault("status", 500)
+        try:
+            _export(trace)
+        except OSError as e:
+            print(f"[Tracing] 导出失败: {e}")
@@ -0,0 +1,69 @@
+"""
+测试公共夹具：配置在导入 app 时从环境变量读取，须在导入前指向临时数据库与存储目录
+"""
+import os
+import sys
+import tempfile
+from itertools import count
+from pathlib import Path
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix="linkin-test-")
+os.environ["DATABASE_URI"] = f"sqlite:///{_workdir}/test.db"
+os.environ["STORAGE_DIR"] = f"{_workdir}/storage"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# 严格模式：任一请求超出其路由的查询预算即抛出 QueryBudgetExceeded，让测试失败
+os.environ["SQL_PROFILE_MODE"] = "strict"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_nicknames = count(1)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+    flask_app.testing = True
+    return flask_app
+
+
+@pytest.fixture()
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture()
+def register(client):
+    """注册新用户，返回 (用户 dict, 认证头)"""
+    def register_user():
+        r = client.post("/api/register", json={"nickname": f"t{next(_nicknames)}", "password": "pw"}).json
+        assert r["code"] == 0, r
+        return r["data"]["user"], {"Authorization": "Bearer " + r["data"]["token"]}
+    return register_user
+
+
+@pytest.fixture()
+def count_queries(app):
+    """with count_queries() as n: ...；n[0] 为期间执行的 SQL 条数（所有引擎）"""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+    from config.database import db
+
+    @contextmanager
+    def counting():
+        n = [0]
+
+        def on_execute(*_args):
+            n[0] += 1
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", on_execute)
+        try:
+            yield n
+        finally:
+            for engine in engines:
+                event.remove(engine, "before_cursor_execute", on_execute)
+    return counting
@@ -0,0 +1,58 @@
+"""
+归档读取与 archive-messages 并发：读到的分段文件被合并删除时重新查询分段列表
+"""
+import threading
+
+from config.database import db
+from models.message import Message
+from services import archive_service
+
+
+def _archive(key):
+    # 保留最新一条：SQLite 的 messages 表没有 AUTOINCREMENT，归档掉全表最大 id 后新消息会复用该 id
+    cutoff_id = db.session.query(db.func.max(Message.id)).scalar() - 1
+    stats = {"chats": 0, "messages": 0, "segments": 0}
+    obsolete = archive_service._archive_chat(key, cutoff_id, stats)
+    db.session.commit()
+    archive_service.unlink_segments(obsolete)
+
+
+def test_history_survives_segment_merge(app, client, register, monkeypatch):
+    a, a_headers = register()
+    b, b_headers = register()
+    assert client.post("/api/friends/add", json={"friend_id": b["id"]}, headers=a_headers).json["code"] == 0
+    key = archive_service.private_key(a["id"], b["id"])
+
+    def send(n):
+        for i in range(n):
+            r = client.post("/api/messages/private", json={"to_user": b["id"], "content": f"m{i}"},
+                            headers=a_headers).json
+            assert r["code"] == 0, r
+
+    send(5)
+    with app.app_context():
+        _archive(key)
+    send(5)
+
+    load = archive_service._load
+    merged = []
+
+    def archive_in_context():
+        with app.app_context():
+            _archive(key)
+
+    def load_during_merge(path):
+        # 历史请求刚查到末段时，archive-messages 把新消息合并进末段并删除旧文件
+        # （在另一线程中执行，如同独立的 archive-messages 进程，其 SQL 不计入本请求的查询预算）
+        if not merged:
+            merged.append(path)
+            worker = threading.Thread(target=archive_in_context)
+            worker.start()
+            worker.join()
+        return load(path)
+
+    monkeypatch.setattr(archive_service, "_load", load_during_merge)
+    r = client.get(f"/api/messages/private/{b['id']}", query_string={"limit": 20}, headers=a_headers).json
+    assert r["code"] == 0, r
+    assert merged
+    assert [m["content"] for m in r["data"]["messages"]] == [f"m{i}" for i in range(5)] * 2
@@ -0,0 +1,63 @@
+"""
+单机消息总线代理：慢消费者被断开，其余连接照常收发
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from services.message_bus import _recv_frame, _send_frame, run_broker
+
+
+def _connect(path):
+    deadline = time.monotonic() + 5
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            return sock
+        except OSError:
+            sock.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def test_slow_consumer_is_disconnected():
+    path = os.path.join(tempfile.mkdtemp(prefix="linkin-bus-"), "bus.sock")
+    threading.Thread(target=run_broker, args=(path,), daemon=True).start()
+
+    slow = _connect(path)
+    slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    publisher = _connect(path)
+    received = []
+
+    def drain():  # 代理也会把帧转发回发送方，发送方须持续读取
+        try:
+            while True:
+                received.append(_recv_frame(publisher))
+        except (OSError, ConnectionError):
+            pass
+
+    threading.Thread(target=drain, daemon=True).start()
+    payload = b"x" * 1024
+    for _ in range(12000):  # 超过每个连接 10000 帧的发送队列
+        _send_frame(publisher, payload)
+
+    # 慢消费者读完已缓冲的数据后应看到 EOF，而不是一直阻塞
+    slow.settimeout(10)
+    total = 0
+    while True:
+        chunk = slow.recv(65536)
+        if not chunk:
+            break
+        total += len(chunk)
+    assert total < 12000 * len(payload)
+
+    _send_frame(publisher, b"after")
+    deadline = time.monotonic() + 10
+    while (not received or received[-1] != b"after") and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert received[-1] == b"after"
+    assert len(received) == 12001
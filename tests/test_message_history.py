@@ -0,0 +1,61 @@
+"""
+历史消息接口的 SQL 条数与每页条数、发送者数量无关（发送者一次批量取出，不逐条懒加载）
+"""
+import pytest
+
+PAGE_SIZES = (1, 20, 100)
+
+
+@pytest.fixture()
+def busy_group(client, register):
+    """100 个成员各发一条群消息的群，返回 (群 ID, 群主认证头)"""
+    _, owner_headers = register()
+    members = [register() for _ in range(100)]
+    for user, _ in members:
+        r = client.post("/api/friends/add", json={"friend_id": user["id"]}, headers=owner_headers).json
+        assert r["code"] == 0, r
+    group = client.post("/api/groups", json={
+        "group_name": "history", "member_ids": [user["id"] for user, _ in members],
+    }, headers=owner_headers).json["data"]
+    for user, headers in members:
+        r = client.post("/api/messages/group", json={"group_id": group["id"], "content": f"from {user['id']}"},
+                        headers=headers).json
+        assert r["code"] == 0, r
+    return group["id"], owner_headers
+
+
+def _page_queries(client, count_queries, url, headers, size):
+    client.get(url, query_string={"limit": size}, headers=headers)  # 预热认证与关系缓存
+    with count_queries() as n:
+        r = client.get(url, query_string={"limit": size}, headers=headers).json
+    assert r["code"] == 0, r
+    return n[0], r["data"]["messages"]
+
+
+def test_group_history_query_count_is_constant(client, count_queries, busy_group):
+    group_id, headers = busy_group
+    url = f"/api/messages/group/{group_id}"
+    counts = {}
+    for size in PAGE_SIZES:
+        counts[size], messages = _page_queries(client, count_queries, url, headers, size)
+        assert len(messages) == size
+        assert len({m["sender_id"] for m in messages}) == size
+        assert all(m["sender"]["id"] == m["sender_id"] for m in messages)
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_private_history_query_count_is_constant(client, register, count_queries):
+    a, a_headers = register()
+    b, b_headers = register()
+    assert client.post("/api/friends/add", json={"friend_id": b["id"]}, headers=a_headers).json["code"] == 0
+    for i in range(100):
+        sender_headers, to_user = (a_headers, b["id"]) if i % 2 else (b_headers, a["id"])
+        r = client.post("/api/messages/private", json={"to_user": to_user, "content": f"m{i}"},
+                        headers=sender_headers).json
+        assert r["code"] == 0, r
+    url = f"/api/messages/private/{b['id']}"
+    counts = {}
+    for size in PAGE_SIZES:
+        counts[size], messages = _page_queries(client, count_queries, url, a_headers, size)
+        assert len(messages) == size
+    assert len(set(counts.values())) == 1, counts
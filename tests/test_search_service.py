@@ -0,0 +1,13 @@
+"""
+LIKE 路径的关键字高亮
+"""
+from services.search_service import highlight
+
+
+def test_highlight_offsets_survive_case_folding_length_changes():
+    # "İ".lower() 为两个字符，按小写串的偏移切原文会错位
+    assert highlight("İstanbul abc", "abc") == "İstanbul <mark>abc</mark>"
+
+
+def test_highlight_is_case_insensitive_and_escapes_html():
+    assert highlight("ABC <b>abc</b>", "aBc") == "<mark>ABC</mark> &lt;b&gt;<mark>abc</mark>&lt;/b&gt;"
@@ -0,0 +1,91 @@
+"""
+SQL 分析（strict 模式）：声明了查询预算的路由在冷缓存下不超预算；超预算抛出 QueryBudgetExceeded；重复语句标记为疑似 N+1
+"""
+import pytest
+
+from services import auth_cache, relation_cache, sql_profiler
+from services.sql_profiler import Profile, QueryBudgetExceeded
+
+
+@pytest.fixture()
+def chat(client, register):
+    """一个有好友、群和私聊 / 群聊消息的用户，返回 {"headers", "friend_id", "group_id"}"""
+    user, headers = register()
+    friends = [register() for _ in range(6)]
+    for friend, _ in friends:
+        assert client.post("/api/friends/add", json={"friend_id": friend["id"]}, headers=headers).json["code"] == 0
+    group = client.post("/api/groups", json={
+        "group_name": "budget", "member_ids": [f["id"] for f, _ in friends],
+    }, headers=headers).json["data"]
+    for friend, friend_headers in friends:
+        client.post("/api/messages/group", json={"group_id": group["id"], "content": "进度 hello"},
+                    headers=friend_headers)
+        client.post("/api/messages/private", json={"to_user": user["id"], "content": "进度 hi"},
+                    headers=friend_headers)
+    return {"headers": headers, "friend_id": friends[0][0]["id"], "group_id": group["id"]}
+
+
+def _clear_caches():
+    for cache in (auth_cache._claims_cache, auth_cache._user_cache, relation_cache._friends, relation_cache._members):
+        cache.clear()
+
+
+def _budgeted_urls(chat):
+    return {
+        "friends": "/api/friends",
+        "groups": "/api/groups",
+        "group_members": f"/api/groups/{chat['group_id']}/members",
+        "get_private": f"/api/messages/private/{chat['friend_id']}",
+        "get_group_messages_route": f"/api/messages/group/{chat['group_id']}",
+        "message_search": "/api/messages/search?q=进度",
+        "unread_summary": "/api/messages/unread-summary",
+        "conversations": "/api/conversations",
+    }
+
+
+def test_strict_mode_is_enabled():
+    assert sql_profiler.SQL_PROFILE_MODE == "strict"
+
+
+def test_budgeted_routes_stay_within_budget(app, client, chat):
+    urls = _budgeted_urls(chat)
+    budgeted = {name for name, view in app.view_functions.items() if hasattr(view, "query_budget")}
+    assert budgeted == set(urls), "新声明预算的路由需加入 _budgeted_urls"
+    for url in urls.values():
+        _clear_caches()  # 冷缓存下认证与关系查询也计入预算
+        r = client.get(url, headers=chat["headers"])  # 超预算时抛出 QueryBudgetExceeded
+        assert r.status_code == 200 and r.json["code"] == 0, (url, r.json)
+
+
+def test_over_budget_raises(app, client, chat, monkeypatch):
+    monkeypatch.setattr(app.view_functions["friends"], "query_budget", 0)
+    _clear_caches()
+    with pytest.raises(QueryBudgetExceeded, match="/api/friends"):
+        client.get("/api/friends", headers=chat["headers"])
+
+
+def test_repeated_select_is_flagged_as_n_plus_one(app, client, chat, monkeypatch):
+    """把好友列表换回逐个懒加载的写法：同一 SELECT 形状重复出现，计入 linkin_sql_n_plus_one_total"""
+    from controllers import friend_controller
+    from models.friendship import Friendship
+
+    def lazy_get_friends(user_id):
+        return [r.friend.to_dict() for r in Friendship.query.filter(Friendship.user_id == user_id).all()]
+
+    monkeypatch.setattr(friend_controller, "get_friends", lazy_get_friends)
+    monkeypatch.setattr(app.view_functions["friends"], "query_budget", 100)
+    before = sql_profiler.N_PLUS_ONE._values.get(("/api/friends",), 0)
+    r = client.get("/api/friends", headers=chat["headers"])
+    assert len(r.json["data"]) == 6
+    assert sql_profiler.N_PLUS_ONE._values.get(("/api/friends",), 0) == before + 1
+
+
+def test_statement_shapes_merge_in_lists_and_literals():
+    profile = Profile()
+    for n in range(1, 7):
+        placeholders = ", ".join("?" * n)
+        profile.add(f"SELECT users.id FROM users WHERE users.id IN ({placeholders}) LIMIT {n}", 0.001)
+    profile.add("UPDATE users SET nickname = ? WHERE users.id = ?", 0.001)
+    repeated = profile.repeated(threshold=5)
+    assert [(shape, n) for shape, n, _ in repeated] == [("SELECT users.id FROM users WHERE users.id IN (?...) LIMIT ?", 6)]
+    assert profile.repeated(threshold=7) == []
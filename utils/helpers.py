@@ -4,6 +4,7 @@
 from functools import wraps
 from flask import request, jsonify
 from typing import Optional, Any
+from services import auth_cache, tracing
 
 
 def api_response(data=None, message="", code=0):
@@ -28,21 +29,18 @@ def require_json(*keys):
 
 
 def require_auth(f):
-    """要求用户已认证，自动从认证头获取用户并注入参数"""
+    """要求用户已认证，自动从认证头获取用户并注入参数（经认证缓存，命中时不解码 JWT、不查库）"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        # 动态导入避免循环依赖
-        from services.auth_service import decode_token
-        from controllers.user_controller import get_user_by_id
-        
         auth = request.headers.get("Authorization")
         if not auth or not auth.startswith("Bearer "):
             return api_response(message="未登录", code=401)
         token = auth[7:]
-        payload = decode_token(token)
+        with tracing.span("auth"):
+            payload = auth_cache.get_claims(token)
+            user = auth_cache.get_user(payload.get("user_id")) if payload else None
         if not payload:
             return api_response(message="无效的令牌", code=401)
-        user = get_user_by_id(payload.get("user_id"))
         if not user:
             return api_response(message="用户不存在", code=401)
         return f(*args, user=user, **kwargs)
@@ -1,24 +1,152 @@
 """
 8 位数字通讯码（LinkID）生成器
+
+通讯码 = 对递增序号做带密钥的置换（Feistel 网络 + 循环折返，值域恰为全部 8 位数字），
+序号各不相同，通讯码就各不相同，无需"随机生成 - 查询 - 冲突重试"；对外看起来仍是随机的。
+序号由各进程按号段（LINK_ID_BLOCK_SIZE）在数据库中原子预留，多进程并发注册也不会拿到同一个号。
+预留号段时用一次查询剔除已被占用的号（旧版随机生成的、用户自选的），注册本身只需一次 INSERT。
 """
-import random
+import hashlib
+import secrets
+import threading
+from collections import deque
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
 from config.database import db
-from models.user import User
+from config.settings import LINK_ID_LENGTH, LINK_ID_BLOCK_SIZE
+from models.user import User, LinkIdSequence
+
+# Feistel 轮数
+ROUNDS = 4
+# 剔除已占用号时单条 IN 查询的参数个数
+_CHECK_CHUNK = 500
+# 号段几乎全被占用（旧库接近填满）时逐次加倍预留，单次上限
+_MAX_RESERVE = 65536
+
+
+class LinkIdExhausted(RuntimeError):
+    """该长度的通讯码已全部分配"""
+
 
+class _Permutation:
+    """[0, size) 上的带密钥置换：在 2^bits 上做平衡 Feistel，结果越界时继续置换直到落回 [0, size)"""
 
-def generate_link_id(length=8):
+    def __init__(self, key, size):
+        bits = max((size - 1).bit_length(), 2)
+        bits += bits % 2
+        self.half = bits // 2
+        self.mask = (1 << self.half) - 1
+        self.key = key
+        self.size = size
+
+    def _round(self, i, value):
+        digest = hashlib.blake2b(bytes((i,)) + value.to_bytes(8, "big"), digest_size=8, key=self.key).digest()
+        return int.from_bytes(digest, "big") & self.mask
+
+    def __call__(self, x):
+        while True:
+            left, right = x >> self.half, x & self.mask
+            for i in range(ROUNDS):
+                left, right = right, left ^ self._round(i, right)
+            x = (left << self.half) | right
+            if x < self.size:
+                return x
+
+
+class LinkIdAllocator:
     """
-    生成唯一的 8 位数字 LinkID。
-    若与已有用户冲突则递归重试。
+    某一长度通讯码的分配器（进程内共享，线程安全）。
+    号段在独立的短事务中预留并立即提交，应在调用方事务写入之前调用（production 配置下写连接只有一个）。
     """
-    digits = "0123456789"
-    # 首位不为 0，避免与数字歧义
-    first = random.choice(digits[1:])
-    rest = "".join(random.choices(digits, k=length - 1))
-    link_id = first + rest
-    if link_id_exists(link_id):
-        return generate_link_id(length)
-    return link_id
+
+    def __init__(self, length=LINK_ID_LENGTH, block_size=LINK_ID_BLOCK_SIZE):
+        self.length = length
+        self.low = 10 ** (length - 1)  # 首位不为 0
+        self.size = 9 * self.low
+        self.block_size = block_size
+        self._permute = None
+        self._ready = deque()
+        self._lock = threading.Lock()
+        self.reservations = 0
+        self.skipped = 0
+
+    def allocate(self, count=1):
+        """分配 count 个未被占用的通讯码"""
+        with self._lock:
+            while len(self._ready) < count:
+                self._refill(max(count - len(self._ready), self.block_size))
+            return [self._ready.popleft() for _ in range(count)]
+
+    def _ensure_sequence(self):
+        with db.engine.begin() as conn:
+            row = conn.execute(select(LinkIdSequence.key).where(LinkIdSequence.length == self.length)).first()
+        if row is None:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(LinkIdSequence).values(
+                        length=self.length, key=secrets.token_hex(16), next_value=0))
+            except IntegrityError:
+                pass  # 其他进程已创建
+
+    def _refill(self, count):
+        """预留 count 个序号，剔除已被占用的通讯码后放入待分配队列；一个都没剩下时加倍再预留"""
+        if self._permute is None:
+            self._ensure_sequence()
+        while True:
+            with db.engine.begin() as conn:
+                # UPDATE 先取得写锁，随后读到的 next_value 即本进程独占的号段终点
+                conn.execute(update(LinkIdSequence).where(LinkIdSequence.length == self.length)
+                             .values(next_value=LinkIdSequence.next_value + count))
+                key, end = conn.execute(select(LinkIdSequence.key, LinkIdSequence.next_value)
+                                        .where(LinkIdSequence.length == self.length)).one()
+                start = end - count
+                if start >= self.size:
+                    raise LinkIdExhausted(f"{self.length} 位通讯码已全部分配")
+                if self._permute is None:
+                    self._permute = _Permutation(bytes.fromhex(key), self.size)
+                candidates = [str(self.low + self._permute(n)) for n in range(start, min(end, self.size))]
+                taken = set()
+                for i in range(0, len(candidates), _CHECK_CHUNK):
+                    chunk = candidates[i:i + _CHECK_CHUNK]
+                    taken.update(conn.execute(select(User.link_id).where(User.link_id.in_(chunk))).scalars())
+            self.reservations += 1
+            self.skipped += len(taken)
+            self._ready.extend(c for c in candidates if c not in taken)
+            if len(candidates) > len(taken):
+                return
+            count = min(count * 2, _MAX_RESERVE)
+
+    def stats(self):
+        return {"reservations": self.reservations, "skipped": self.skipped, "ready": len(self._ready)}
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def get_allocator(length=LINK_ID_LENGTH):
+    with _allocators_lock:
+        if length not in _allocators:
+            _allocators[length] = LinkIdAllocator(length)
+        return _allocators[length]
+
+
+def stats():
+    """{通讯码位数: 分配器统计}（仅本进程已创建的分配器）"""
+    with _allocators_lock:
+        return {length: allocator.stats() for length, allocator in _allocators.items()}
+
+
+def generate_link_id(length=LINK_ID_LENGTH):
+    """分配一个唯一的通讯码（首位不为 0）"""
+    return get_allocator(length).allocate()[0]
+
+
+def generate_link_ids(count, length=LINK_ID_LENGTH):
+    """批量分配 count 个唯一的通讯码（批量注册、导入用）"""
+    return get_allocator(length).allocate(count)
 
 
 def link_id_exists(link_id):